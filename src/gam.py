@@ -22,13 +22,18 @@ For more information, see https://github.com/taers232c/GAMADV-X
 """
 
 __author__ = u'Ross Scroggs <ross.scroggs@gmail.com>'
-__version__ = u'4.65.68'
+__version__ = u'4.65.93'
 __license__ = u'Apache License 2.0 (http://www.apache.org/licenses/LICENSE-2.0)'
 
+import array
+import atexit
 import base64
+import calendar
 import codecs
 import collections
 import ConfigParser as configparser
+import copy
+import cPickle
 import cStringIO
 import csv
 import datetime
@@ -41,6 +46,7 @@ from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formatdate
+import errno
 import hashlib
 from htmlentitydefs import name2codepoint
 from HTMLParser import HTMLParser, HTMLParseError
@@ -55,6 +61,7 @@ import Queue
 import random
 import re
 import shlex
+import shutil
 import signal
 import socket
 import ssl
@@ -63,7 +70,7 @@ import StringIO
 import struct
 import subprocess
 import sys
-from tempfile import TemporaryFile
+from tempfile import mkdtemp, TemporaryFile
 import threading
 import time
 from traceback import print_exc
@@ -86,7 +93,9 @@ from gamlib import glgdata as GDATA
 from gamlib import glglobals as GM
 from gamlib import glindent
 from gamlib import glmsgs as Msg
+from gamlib import glratelimit
 from gamlib import glskus as SKU
+from gamlib import glthreadlocal
 from gamlib import gluprop as UProp
 
 import atom
@@ -129,6 +138,13 @@ Act = glaction.GamAction()
 Cmd = glclargs.GamCLArgs()
 Ent = glentity.GamEntity()
 Ind = glindent.GamIndent()
+RateLimit = glratelimit.GamRateLimiter()
+# Queues to the CSV/stdout/stderr handlers in gam batch/csv processes
+PoolQueues = {}
+# Settings saved by a gam batch/csv process after its first command
+PoolWorkerState = {}
+# Serializes the loading/prefetching of the user ID/email address maps
+UserMapLock = threading.Lock()
 
 GM.Globals[GM.GAM_PATH] = os.path.dirname(os.path.realpath(__file__)) if not getattr(sys, u'frozen', False) else os.path.dirname(sys.executable)
 
@@ -266,12 +282,13 @@ VX_PARENTS_ID = u'parents(id)'
 VX_TRASHED = u'labels(trashed)'
 
 VX_COPY_FOLDER_FIELDS = u'{0},copyRequiresWriterPermission,description,folderColorRgb,mimeType,modifiedDate,properties,labels(starred),lastViewedByMeDate,writersCanShare'.format(VX_PARENTS_ID)
-VX_DOWNLOAD_FIELDS = u'{0},fileExtension,mimeType,{1}'.format(VX_FILENAME, VX_SIZE)
+VX_DOWNLOAD_FIELDS = u'{0},fileExtension,mimeType,{1},md5Checksum'.format(VX_FILENAME, VX_SIZE)
 VX_FILENAME_MIMETYPE = u'{0},mimeType'.format(VX_FILENAME)
 VX_FILENAME_MIMETYPE_EXPORTLINKS = u'{0},mimeType,exportLinks'.format(VX_FILENAME)
 VX_FILENAME_PARENTS = u'{0},{1}'.format(VX_FILENAME, VX_PARENTS_ID)
 VX_FILENAME_PARENTS_COPY_FILE_FIELDS = u'id,{0},{1},capabilities,copyRequiresWriterPermission,description,mimeType,modifiedDate,properties,labels(starred),lastViewedByMeDate,writersCanShare'.format(VX_FILENAME, VX_PARENTS_ID)
 VX_FILENAME_PARENTS_MIMETYPE = u'{0},{1},mimeType'.format(VX_FILENAME, VX_PARENTS_ID)
+VX_FILENAME_PARENTS_TEAMDRIVEID = u'{0},{1},teamDriveId'.format(VX_FILENAME, VX_PARENTS_ID)
 VX_FILES_ID_FILENAME = u'{0}(id,{1})'.format(VX_PAGES_FILES, VX_FILENAME)
 VX_ID_FILENAME = u'id,{0}'.format(VX_FILENAME)
 VX_ID_FILENAME_MIMETYPE = u'id,{0},mimeType'.format(VX_FILENAME)
@@ -424,11 +441,6 @@ def escapeCRsNLs(value):
 def unescapeCRsNLs(value):
   return value.replace(u'\\r', u'\r').replace(u'\\n', u'\n')
 
-def executeBatch(dbatch):
-  dbatch.execute()
-  if GC.Values[GC.INTER_BATCH_WAIT] > 0:
-    time.sleep(GC.Values[GC.INTER_BATCH_WAIT])
-
 def StringIOobject(initbuff=None):
   if initbuff is None:
     return StringIO.StringIO()
@@ -2081,6 +2093,28 @@ def writeFileReturnError(filename, data, mode=DEFAULT_FILE_WRITE_MODE):
   except IOError as e:
     return (False, e)
 
+AtomicWriteLock = threading.Lock()
+
+# Write a file that is only readable by the user; the data is written to a temporary file that is renamed
+# so that other processes never read a partial file. The lock keeps the threads from writing the same temporary file
+def writeFileAtomic(filename, data):
+  if isinstance(data, text_type):
+    data = data.encode(UTF8)
+  tempFilename = u'{0}.{1}'.format(filename, os.getpid())
+  with AtomicWriteLock:
+    try:
+      fd = os.open(tempFilename, os.O_WRONLY|os.O_CREAT|os.O_TRUNC, 0o600)
+      with os.fdopen(fd, u'wb') as f:
+        f.write(data)
+      try:
+        os.rename(tempFilename, filename)
+      except OSError:
+        os.remove(filename)
+        os.rename(tempFilename, filename)
+      return True
+    except (IOError, OSError):
+      return False
+
 # Delete a file
 def deleteFile(filename, continueOnError=False, displayError=True):
   if os.path.isfile(filename):
@@ -2294,26 +2328,29 @@ def incrAPICallsRetryData(errMsg, delta):
   GM.Globals[GM.API_CALLS_RETRY_DATA][errMsg][1] += delta
 
 def initAPICallsRateCheck():
-  GM.Globals[GM.RATE_CHECK_COUNT] = 0
-  GM.Globals[GM.RATE_CHECK_START] = time.time()
-
-def checkAPICallsRate():
-  GM.Globals[GM.RATE_CHECK_COUNT] += 1
-  if GM.Globals[GM.RATE_CHECK_COUNT] >= GC.Values[GC.API_CALLS_RATE_LIMIT]:
-    current = time.time()
-    delta = int(current-GM.Globals[GM.RATE_CHECK_START])
-    if 0 <= delta < 100:
-      delta = (100-delta)+3
+  if GC.Values[GC.API_CALLS_RATE_CHECK]:
+    RateLimit.Initialize(API.getAPIversionList(), GC.Values[GC.API_CALLS_RATE_LIMIT])
+
+def getAPICallsRateKey(service):
+  return u'{0}-{1}'.format(service._rootDesc.get(u'name', u''), service._rootDesc.get(u'version', u''))
+
+def checkAPICallsRate(key, count=1):
+  delta = RateLimit.Acquire(key, count)
+  if delta > 0:
+    if delta >= 1:
       error_message = u'API calls per 100 seconds limit {0} exceeded'.format(GC.Values[GC.API_CALLS_RATE_LIMIT])
-      writeStderr(u'{0}{1}: Backing off: {2} seconds\n'.format(WARNING_PREFIX, error_message, delta))
+      writeStderr(u'{0}{1}: Backing off: {2} seconds\n'.format(WARNING_PREFIX, error_message, int(delta)))
       flushStderr()
-      time.sleep(delta)
       if GC.Values[GC.SHOW_API_CALLS_RETRY_DATA]:
         incrAPICallsRetryData(error_message, delta)
-      GM.Globals[GM.RATE_CHECK_START] = time.time()
-    else:
-      GM.Globals[GM.RATE_CHECK_START] = current
-    GM.Globals[GM.RATE_CHECK_COUNT] = 0
+    time.sleep(delta)
+
+# Called in each gam batch/csv process; the queues to the CSV/stdout/stderr handlers are inherited by the process
+# rather than being passed with each command and all processes share the API call rate buckets
+def initializeMultiprocessPoolProcess(mpQueues, rateLimitState):
+  PoolQueues.update(mpQueues)
+  if rateLimitState is not None:
+    RateLimit.Attach(*rateLimitState)
 
 # Set global variables from config file
 # Check for GAM updates based on status of no_update_check in config file
@@ -2580,7 +2617,7 @@ def SetGlobalVariables():
                                          u'\n'))
           status[u'errors'] = True
 
-  def _setCSVFile(filename, mode, encoding, writeHeader, multi):
+  def _setCSVFile(filename, mode, encoding, writeHeader, multi, streaming=False, columns=None):
     if filename != u'-':
       if filename.startswith(u'./') or filename.startswith(u'.\\'):
         filename = os.path.join(os.getcwd(), filename[2:])
@@ -2595,6 +2632,8 @@ def SetGlobalVariables():
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUOTE_CHAR] = GC.Values[GC.CSV_OUTPUT_QUOTE_CHAR]
     GM.Globals[GM.CSVFILE][GM.REDIRECT_WRITE_HEADER] = writeHeader
     GM.Globals[GM.CSVFILE][GM.REDIRECT_MULTIPROCESS] = multi
+    GM.Globals[GM.CSVFILE][GM.REDIRECT_STREAMING] = streaming
+    GM.Globals[GM.CSVFILE][GM.REDIRECT_STREAMING_COLUMNS] = columns
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE] = None
 
   def _setSTDFile(stdtype, filename, mode, multi):
@@ -2605,7 +2644,7 @@ def SetGlobalVariables():
       GM.Globals[stdtype][GM.REDIRECT_FD] = open(os.devnull, mode)
     elif filename == u'-':
       GM.Globals[stdtype][GM.REDIRECT_STD] = True
-      GM.Globals[stdtype][GM.REDIRECT_FD] = [sys.stderr, sys.stdout][stdtype == GM.STDOUT]
+      GM.Globals[stdtype][GM.REDIRECT_FD] = [sys.stderr, getSysStdout()][stdtype == GM.STDOUT]
     else:
       if filename.startswith(u'./') or filename.startswith(u'.\\'):
         filename = os.path.join(os.getcwd(), filename[2:])
@@ -2619,8 +2658,8 @@ def SetGlobalVariables():
       GM.Globals[stdtype][GM.REDIRECT_FD] = openFile(filename, mode)
     GM.Globals[stdtype][GM.REDIRECT_MULTI_FD] = GM.Globals[stdtype][GM.REDIRECT_FD] if not multi else StringIOobject()
     if (stdtype == GM.STDOUT) and (GC.Values[GC.DEBUG_LEVEL] > 0):
-      GM.Globals[GM.SAVED_STDOUT] = sys.stdout
-      sys.stdout = GM.Globals[stdtype][GM.REDIRECT_MULTI_FD]
+      GM.Globals[GM.SAVED_STDOUT] = getSysStdout()
+      setSysStdout(GM.Globals[stdtype][GM.REDIRECT_MULTI_FD])
     GM.Globals[stdtype][GM.REDIRECT_NAME] = filename
     GM.Globals[stdtype][GM.REDIRECT_MODE] = mode
     GM.Globals[stdtype][GM.REDIRECT_MULTIPROCESS] = multi
@@ -2735,6 +2774,16 @@ def SetGlobalVariables():
   if status[u'errors']:
     sys.exit(CONFIG_ERROR_RC)
   GC.Values[GC.DOMAIN] = GC.Values[GC.DOMAIN].lower()
+# Set directory for service account access tokens
+  if GC.Values[GC.SVCACCT_TOKEN_CACHE]:
+    GM.Globals[GM.SVCACCT_TOKEN_DIR] = os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_OAUTH2SERVICE_TOKENS)
+    if not os.path.isdir(GM.Globals[GM.SVCACCT_TOKEN_DIR]):
+      try:
+        os.mkdir(GM.Globals[GM.SVCACCT_TOKEN_DIR], 0o700)
+      except OSError as e:
+        systemErrorExit(FILE_ERROR_RC, e)
+  else:
+    GM.Globals[GM.SVCACCT_TOKEN_DIR] = GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR]
 # Create/set mode for oauth2.txt.lock
   if not GM.Globals[GM.OAUTH2_TXT_LOCK]:
     fileName = u'{0}.lock'.format(GC.Values[GC.OAUTH2_TXT])
@@ -2756,7 +2805,7 @@ def SetGlobalVariables():
     GM.Globals[GM.OAUTH2SERVICE_CLIENT_ID] = None
   Cmd.SetEncoding(GM.Globals[GM.SYS_ENCODING])
   GM.Globals[GM.DATETIME_NOW] = datetime.datetime.now(GC.Values[GC.TIMEZONE])
-# redirect csv <FileName> [multiprocess] [append] [noheader] [charset <CharSet>] [columndelimiter <Character>] [quotechar <Character>]]
+# redirect csv <FileName> [multiprocess] [append] [noheader] [charset <CharSet>] [columndelimiter <Character>] [quotechar <Character>] [streaming [columns <FieldNameList>]]
 # redirect stdout <FileName> [multiprocess] [append]
 # redirect stdout null
 # redirect stderr <FileName> [multiprocess] [append]
@@ -2774,7 +2823,11 @@ def SetGlobalVariables():
         GC.Values[GC.CSV_OUTPUT_COLUMN_DELIMITER] = getCharacter()
       if checkArgumentPresent(u'quotechar'):
         GC.Values[GC.CSV_OUTPUT_QUOTE_CHAR] = getCharacter()
-      _setCSVFile(filename, mode, encoding, writeHeader, multi)
+      streaming = checkArgumentPresent(u'streaming')
+      columns = None
+      if streaming and checkArgumentPresent(u'columns'):
+        columns = shlexSplitList(getString(Cmd.OB_FIELD_NAME_LIST))
+      _setCSVFile(filename, mode, encoding, writeHeader, multi, streaming, columns)
     elif myarg == u'stdout':
       if filename.lower() == u'null':
         multi = checkArgumentPresent(u'multiprocess')
@@ -2835,6 +2888,718 @@ def getHttpObj(cache=None):
                        ca_certs=GC.Values[GC.CACERTS_PEM],
                        disable_ssl_certificate_validation=GC.Values[GC.NO_VERIFY_SSL])
 
+# Persistent HTTP objects; httplib2 keeps one keep-alive connection per host in each object,
+# so reusing the objects across users/services avoids a TLS handshake per service object.
+# Each thread gets its own object as httplib2.Http is not thread safe; threads beyond gam.cfg/http_pool_size
+# get unpooled objects. Objects inherited across a fork are discarded, the connections belong to the parent.
+class HttpObjPool(object):
+  def __init__(self):
+    self.Reset()
+
+  def Reset(self):
+    self.pid = os.getpid()
+    self.lock = threading.Lock()
+    self.httpObjs = {}
+
+  def _pruneDeadThreads(self):
+    liveThreads = set([t.ident for t in threading.enumerate()])
+    for ident in list(self.httpObjs):
+      if ident not in liveThreads:
+        del self.httpObjs[ident]
+
+  def Get(self, cache=None):
+    if GC.Values[GC.HTTP_POOL_SIZE] == 0:
+      return getHttpObj(cache=cache)
+    if self.pid != os.getpid():
+      self.Reset()
+    ident = threading.current_thread().ident
+    with self.lock:
+      httpObj = self.httpObjs.get(ident)
+      if (httpObj is None or httpObj.ca_certs != GC.Values[GC.CACERTS_PEM] or
+          httpObj.disable_ssl_certificate_validation != GC.Values[GC.NO_VERIFY_SSL]):
+        if httpObj is None and len(self.httpObjs) >= GC.Values[GC.HTTP_POOL_SIZE]:
+          self._pruneDeadThreads()
+          if len(self.httpObjs) >= GC.Values[GC.HTTP_POOL_SIZE]:
+            return getHttpObj(cache=cache)
+        httpObj = self.httpObjs[ident] = getHttpObj()
+    httpObj.cache = httplib2.FileCache(cache) if cache else None
+    return httpObj
+
+HttpPool = HttpObjPool()
+
+# Batch requests are sent as parts of at most the current part size for the batch API, num_batch_threads parts at a time.
+# Parts of a batch with rate limit or transient errors are resent with backoff; the part size is halved
+# when rate limits are exceeded and grows back to the batch size when they are not.
+# The callbacks are called in the calling thread in the order that the requests were added to the batch.
+BATCH_RETRY_STATUSES = [429, 500, 502, 503, 504]
+BatchPartSizes = {}
+
+# Callers flush their batches at this size so that there are parts to be sent concurrently.
+# When the caller waits between batches, wait: seconds, default inter_batch_wait, the batches are not enlarged
+# so that no more than batchSize requests are sent between waits
+def getBatchFlushSize(batchSize, wait=None):
+  if (GC.Values[GC.INTER_BATCH_WAIT] if wait is None else wait) > 0:
+    return batchSize
+  return min(batchSize*GC.Values[GC.NUM_BATCH_THREADS], googleapiclient.http.MAX_BATCH_LIMIT)
+
+# Each thread needs its own HTTP object, authorized with the same credentials as httpObj; httplib2.Http is not thread safe
+# HTTP objects authorized by oauth2client credentials in each thread; credentials.authorize modifies the object
+# so each thread keeps one per credentials rather than using its object from HttpPool
+ThreadAuthorizedHttpObjs = threading.local()
+MAX_THREAD_AUTHORIZED_HTTP_OBJS = 10
+
+def getThreadHttpObj(httpObj):
+  if isinstance(httpObj, google_auth_httplib2.AuthorizedHttp):
+    return google_auth_httplib2.AuthorizedHttp(httpObj.credentials, http=HttpPool.Get())
+  credentials = getattr(httpObj.request, u'credentials', None)
+  if credentials is not None:
+    authorizedHttpObjs = getattr(ThreadAuthorizedHttpObjs, u'httpObjs', None)
+    if authorizedHttpObjs is None or len(authorizedHttpObjs) >= MAX_THREAD_AUTHORIZED_HTTP_OBJS:
+      authorizedHttpObjs = ThreadAuthorizedHttpObjs.httpObjs = {}
+# The credentials are kept with the object so that their id isn't reused while they are in the dictionary
+    entry = authorizedHttpObjs.get(id(credentials))
+    if entry is None or entry[0] is not credentials:
+      entry = authorizedHttpObjs[id(credentials)] = (credentials, credentials.authorize(getHttpObj()))
+    return entry[1]
+  return HttpPool.Get()
+
+def _getBatchResponseError(resp, content):
+  reason = message = u''
+  try:
+    error = json.loads(content)[u'error']
+    message = error.get(u'message', u'')
+    if error.get(u'errors'):
+      reason = error[u'errors'][0].get(u'reason', u'')
+  except (ValueError, KeyError, TypeError, AttributeError):
+    pass
+  return (resp.status, reason or str(resp.status), message or resp.reason)
+
+def _sendBatchPart(dbatch, order, httpObj, results):
+  part = googleapiclient.http.BatchHttpRequest(batch_uri=dbatch._batch_uri)
+  try:
+    part._execute(httpObj, order, dbatch._requests)
+    redo = [request_id for request_id in order if part._responses[request_id][0].status == 401]
+    if redo:
+      for request_id in redo:
+        part._refresh_and_apply_credentials(dbatch._requests[request_id], httpObj)
+      part._execute(httpObj, redo, dbatch._requests)
+    results.append((order, part._responses, None))
+  except Exception as e:
+    results.append((order, None, e))
+
+# Persistent threads that send the parts of batch requests; the threads, and so their HTTP objects from HttpPool
+# and the connections in them, are reused from batch to batch. Threads inherited across a fork don't exist in the child.
+class BatchPartThreadPool(object):
+  def __init__(self):
+    self.Reset()
+
+  def Reset(self):
+    self.pid = os.getpid()
+    self.lock = threading.Lock()
+    self.taskQueue = Queue.Queue()
+    self.numThreads = 0
+
+  def _worker(self):
+    while True:
+      function, args, doneQueue = self.taskQueue.get()
+      try:
+        function(*args)
+      finally:
+        doneQueue.put(None)
+
+# Call function(*args) for each args in argsList in at least numThreads threads; return when all of the calls have completed
+  def Run(self, function, argsList, numThreads):
+    with self.lock:
+      if self.pid != os.getpid():
+        self.Reset()
+      while self.numThreads < numThreads:
+        thread = threading.Thread(target=self._worker)
+        thread.daemon = True
+        thread.start()
+        self.numThreads += 1
+    doneQueue = Queue.Queue()
+    for args in argsList:
+      self.taskQueue.put((function, args, doneQueue))
+    for _ in argsList:
+      doneQueue.get()
+
+BatchPartThreads = BatchPartThreadPool()
+
+def _sendBatchParts(dbatch, parts, httpObj, numThreads):
+  def _sendBatchPartInThread(order):
+    _sendBatchPart(dbatch, order, getThreadHttpObj(httpObj), results)
+
+  results = []
+  if numThreads <= 1 or len(parts) == 1:
+    for order in parts:
+      _sendBatchPart(dbatch, order, httpObj, results)
+  else:
+    BatchPartThreads.Run(_sendBatchPartInThread, [(order,) for order in parts], min(numThreads, len(parts)))
+  return results
+
+def _sendBatchRequests(dbatch, batchSize):
+  batchUri = dbatch._batch_uri
+  rateKey = batchUri[batchUri.find(u'/batch/')+7:].replace(u'/', u'-')
+  httpObj = dbatch._requests[dbatch._order[0]].http
+  numThreads = GC.Values[GC.NUM_BATCH_THREADS]
+  position = dict((request_id, k) for k, request_id in enumerate(dbatch._order))
+  pending = dbatch._order
+  retries = 10
+  for n in range(1, retries+1):
+    partSize = min(BatchPartSizes.get(batchUri, batchSize), batchSize)
+    if GC.Values[GC.API_CALLS_RATE_CHECK]:
+      checkAPICallsRate(rateKey, len(pending))
+    results = _sendBatchParts(dbatch, [pending[k:k+partSize] for k in range(0, len(pending), partSize)], httpObj, numThreads)
+    pending = []
+    rateLimited = False
+    lastError = None
+    for order, responses, e in results:
+      if e is None:
+        for request_id in order:
+          resp, content = dbatch._responses[request_id] = responses[request_id]
+          if resp.status in BATCH_RETRY_STATUSES or resp.status == 403:
+            status, reason, message = _getBatchResponseError(resp, content)
+            if status == 429 or reason in GAPI.RATE_LIMIT_REASONS:
+              rateLimited = True
+            elif status == 403:
+              continue
+            pending.append(request_id)
+            retryReason, retryMessage = reason, message
+      elif isinstance(e, googleapiclient.errors.HttpError) and e.resp.status in BATCH_RETRY_STATUSES:
+        _, retryReason, retryMessage = _getBatchResponseError(e.resp, e.content)
+        lastError = e
+        pending.extend(order)
+      elif isinstance(e, (http_client.ResponseNotReady, httplib2.SSLHandshakeError, socket.error)):
+        retryReason, retryMessage = SOCKET_ERROR_RC, u'Connection error: {0}'.format(convertSysToUTF8(str(e) or repr(e)))
+        lastError = e
+        pending.extend(order)
+      else:
+        raise e
+    if rateLimited:
+      BatchPartSizes[batchUri] = max(partSize//2, 1)
+      if GC.Values[GC.API_CALLS_RATE_CHECK]:
+        RateLimit.Penalize(rateKey)
+    elif partSize < batchSize:
+      BatchPartSizes[batchUri] = min(partSize*2, batchSize)
+    if not pending:
+      return
+    if n == retries:
+      break
+    pending.sort(key=lambda request_id: position[request_id])
+    waitOnFailure(n, retries, retryReason, retryMessage)
+# Requests still failing are passed to their callbacks as errors; requests without responses raise the last error
+  if lastError is not None:
+    raise lastError
+
+def _callBatchCallbacks(dbatch):
+  for request_id in dbatch._order:
+    resp, content = dbatch._responses[request_id]
+    request = dbatch._requests[request_id]
+    response = exception = None
+    try:
+      if resp.status >= 300:
+        raise googleapiclient.errors.HttpError(resp, content, uri=request.uri)
+      response = request.postproc(resp, content)
+    except googleapiclient.errors.HttpError as e:
+      exception = e
+    callback = dbatch._callbacks[request_id]
+    if callback is not None:
+      callback(request_id, response, exception)
+    if dbatch._callback is not None:
+      dbatch._callback(request_id, response, exception)
+
+# batchSize: maximum number of requests per part, default gam.cfg/batch_size
+# final: don't wait inter_batch_wait seconds after the last batch
+def executeBatch(dbatch, batchSize=None, final=False):
+  if dbatch._order:
+    _sendBatchRequests(dbatch, batchSize or GC.Values[GC.BATCH_SIZE])
+    _callBatchCallbacks(dbatch)
+  if not final and GC.Values[GC.INTER_BATCH_WAIT] > 0:
+    time.sleep(GC.Values[GC.INTER_BATCH_WAIT])
+
+# Copies of service for threads other than the one that built it
+class ThreadGAPIObjects(object):
+  def __init__(self, service):
+    self.service = service
+    self.thread = threading.current_thread()
+    self.local = threading.local()
+
+  def Get(self):
+    if threading.current_thread() is self.thread:
+      return self.service
+    service = getattr(self.local, u'service', None)
+    if service is None:
+      service = self.local.service = getGAPIServiceFromSkeleton(self.service._rootDesc[u'name'], self.service._rootDesc[u'version'],
+                                                                getThreadHttpObj(self.service._http))
+    return service
+
+# Under gam tbatch, GM.Globals, GC.Values, Act, Cmd, Ent and Ind are per thread; threads started by a command see those of the command
+def getThreadSettings():
+  if not isinstance(GM.Globals, glthreadlocal.GamThreadLocal):
+    return []
+  return [(threadLocal, glthreadlocal.GetThreadValue(threadLocal)) for threadLocal in [GM.Globals, GC.Values, Act, Cmd, Ent, Ind]]
+
+def setThreadSettings(threadSettings):
+  for threadLocal, value in threadSettings:
+    glthreadlocal.SetThreadValue(threadLocal, value)
+
+# Make GM.Globals, GC.Values, Act, Cmd, Ent and Ind per thread; the current values are the values of threads that haven't set them.
+# Returns the values to pass to endThreadLocalSettings, None if they are already per thread
+def startThreadLocalSettings():
+  global Act, Cmd, Ent, Ind
+  if isinstance(GM.Globals, glthreadlocal.GamThreadLocal):
+    return None
+  savedSettings = (GM.Globals, GC.Values, Act, Cmd, Ent, Ind)
+  GM.Globals = glthreadlocal.GamThreadLocalDict(GM.Globals)
+  GC.Values = glthreadlocal.GamThreadLocalDict(GC.Values)
+  Act = glthreadlocal.GamThreadLocal(Act)
+  Cmd = glthreadlocal.GamThreadLocal(Cmd)
+  Ent = glthreadlocal.GamThreadLocal(Ent)
+  Ind = glthreadlocal.GamThreadLocal(Ind)
+  return savedSettings
+
+def endThreadLocalSettings(savedSettings):
+  global Act, Cmd, Ent, Ind
+  if savedSettings is not None:
+    GM.Globals, GC.Values, Act, Cmd, Ent, Ind = savedSettings
+
+def isMainThread():
+  return isinstance(threading.current_thread(), threading._MainThread)
+
+# During gam tbatch sys.stdout is a thread local proxy so that a command that redirects stdout
+# with debug_level > 0 only redirects its own thread
+def getSysStdout():
+  if isinstance(sys.stdout, glthreadlocal.GamThreadLocal):
+    return glthreadlocal.GetThreadValue(sys.stdout)
+  return sys.stdout
+
+def setSysStdout(fd):
+  if isinstance(sys.stdout, glthreadlocal.GamThreadLocal):
+    glthreadlocal.SetThreadValue(sys.stdout, fd)
+  else:
+    sys.stdout = fd
+
+# Call function(item) for items in num_api_threads threads; yield (item, result) in the order of the items.
+# At most THREADED_CALLS_AHEAD results per thread wait to be yielded so that items can be a long generator.
+# An exception raised by function, including SystemExit from systemErrorExit, is raised when its item is reached.
+THREADED_CALLS_AHEAD = 4
+
+def yieldThreadedCalls(function, items, numThreads=None):
+  if numThreads is None:
+    numThreads = GC.Values[GC.NUM_API_THREADS]
+  if numThreads <= 1:
+    for item in items:
+      yield (item, function(item))
+    return
+
+  def _worker():
+    setThreadSettings(threadSettings)
+    while True:
+      task = taskQueue.get()
+      if task is None or stopping.is_set():
+        return
+      k, item = task
+      try:
+        result = (item, function(item), None)
+      except BaseException:
+        result = (item, None, sys.exc_info())
+      with resultReady:
+        results[k] = result
+        resultReady.notify()
+
+  threadSettings = getThreadSettings()
+  taskQueue = Queue.Queue()
+  results = {}
+  resultReady = threading.Condition()
+  stopping = threading.Event()
+  for _ in range(numThreads):
+    thread = threading.Thread(target=_worker)
+    thread.daemon = True
+    thread.start()
+  items = iter(items)
+  submitted = k = 0
+  exhausted = False
+  try:
+    while True:
+      while not exhausted and submitted-k < numThreads*THREADED_CALLS_AHEAD:
+        try:
+          taskQueue.put((submitted, next(items)))
+          submitted += 1
+        except StopIteration:
+          exhausted = True
+      if k == submitted:
+        return
+      with resultReady:
+        while k not in results:
+          resultReady.wait(1.0)
+        item, result, excInfo = results.pop(k)
+      k += 1
+      if excInfo is not None:
+        raise excInfo[0], excInfo[1], excInfo[2]
+      yield (item, result)
+  finally:
+    stopping.set()
+    for _ in range(numThreads):
+      taskQueue.put(None)
+
+# Output written by a thread to stdout/stderr; the writes to both are kept in order
+class ThreadOutput(object):
+  def __init__(self, output, stream):
+    self.output = output
+    self.stream = stream
+
+  def write(self, data):
+    self.output.append((self.stream, data))
+
+  def flush(self):
+    pass
+
+# Call function(item) with its stdout/stderr output, exit status and Ent/Ind state local to the thread
+def _callWithThreadOutput(function, item):
+  output = []
+  gmGlobals = glthreadlocal.GetThreadValue(GM.Globals).copy()
+  for stream in [GM.STDOUT, GM.STDERR]:
+    gmGlobals[stream] = gmGlobals[stream].copy()
+    gmGlobals[stream][GM.REDIRECT_MULTI_FD] = ThreadOutput(output, stream)
+  gmGlobals[GM.SYSEXITRC] = 0
+  glthreadlocal.SetThreadValue(GM.Globals, gmGlobals)
+  glthreadlocal.SetThreadValue(Act, copy.copy(glthreadlocal.GetThreadValue(Act)))
+  glthreadlocal.SetThreadValue(Ent, copy.copy(glthreadlocal.GetThreadValue(Ent)))
+  glthreadlocal.SetThreadValue(Ind, copy.copy(glthreadlocal.GetThreadValue(Ind)))
+  try:
+    result = function(item)
+    excInfo = None
+  except BaseException:
+    result = None
+    excInfo = sys.exc_info()
+  return (result, output, gmGlobals[GM.SYSEXITRC], excInfo)
+
+# Like yieldThreadedCalls for functions that write to stdout/stderr, e.g., one that processes a user;
+# the output of each call is written when its item is yielded so that the output is in the order of the items.
+def yieldThreadedCallsWithOutput(function, items, numThreads=None):
+  if numThreads is None:
+    numThreads = GC.Values[GC.NUM_API_THREADS]
+  if numThreads <= 1:
+    for item in items:
+      yield (item, function(item))
+    return
+  savedSettings = startThreadLocalSettings()
+  try:
+    for item, callResult in yieldThreadedCalls(lambda item: _callWithThreadOutput(function, item), items, numThreads):
+      result, output, sysRC, excInfo = callResult
+      for stream, data in output:
+        if stream == GM.STDOUT:
+          writeStdout(data)
+        else:
+          writeStderr(data)
+      if sysRC:
+        setSysExitRC(sysRC)
+      if excInfo is not None:
+        raise excInfo[0], excInfo[1], excInfo[2]
+      yield (item, result)
+  finally:
+    endThreadLocalSettings(savedSettings)
+
+# Iterate over iterable in another thread, up to ahead items in advance of the caller, so that getting the next item,
+# e.g., an API call for the next page of a list, overlaps the caller's processing of the current item.
+# An exception raised by iterable is raised in the caller.
+def yieldPrefetched(iterable, ahead=1):
+  def _put(entry):
+    while not stopping.is_set():
+      try:
+        itemQueue.put(entry, timeout=1.0)
+        return True
+      except Queue.Full:
+        pass
+    return False
+
+  def _producer():
+    setThreadSettings(threadSettings)
+    try:
+      for item in iterable:
+        if not _put((item, None, False)):
+          return
+    except BaseException:
+      _put((None, sys.exc_info(), False))
+      return
+    _put((None, None, True))
+
+  threadSettings = getThreadSettings()
+  itemQueue = Queue.Queue(maxsize=ahead)
+  stopping = threading.Event()
+  thread = threading.Thread(target=_producer)
+  thread.daemon = True
+  thread.start()
+  try:
+    while True:
+      item, excInfo, done = itemQueue.get()
+      if done:
+        return
+      if excInfo is not None:
+        raise excInfo[0], excInfo[1], excInfo[2]
+      yield item
+  finally:
+    stopping.set()
+
+# Files whose sizes are known are downloaded as ranges of download_chunk_size megabytes, num_download_threads ranges at a time,
+# into files that are preallocated to their full sizes; the files are started in order and several can be in progress at a time.
+# The ranges of a file are hashed in order as they are received so that its MD5 is verified without reading the file again;
+# ranges received ahead of the one being waited for are kept in memory, at most DOWNLOAD_RANGES_AHEAD per thread.
+# The offset up to which a file has been received and hashed is saved in <FileName>.gamdownload so that
+# a download that is interrupted is resumed from that offset by the next download of the file.
+DOWNLOAD_JOURNAL_SUFFIX = u'.gamdownload'
+DOWNLOAD_RANGES_AHEAD = 2
+DOWNLOAD_RETRIES = 10
+
+class MediaDownload(object):
+  def __init__(self, uri, filename, size=None, md5Hash=None, item=None):
+    self.uri = uri
+    self.filename = filename
+    self.size = size
+    self.md5Hash = md5Hash
+    self.item = item
+    self.md5 = hashlib.md5()
+    self.offset = self.nextOffset = 0
+    self.ranges = {}
+    self.fd = None
+    self.created = False
+    self.error = None
+    self.starting = self.started = False
+    self.lock = threading.Lock()
+
+  def Progress(self):
+    return float(self.offset)/self.size if self.size else 1.0
+
+  def Verified(self):
+    return not self.md5Hash or self.md5.hexdigest() == self.md5Hash.lower()
+
+# Returns (resp, content); a server that doesn't support ranges returns the whole file with status 200
+def _getMediaRange(httpObj, uri, start, end):
+  for n in range(1, DOWNLOAD_RETRIES+1):
+    try:
+      resp, content = httpObj.request(uri, u'GET', headers={u'range': u'bytes={0}-{1}'.format(start, end)})
+    except (http_client.ResponseNotReady, httplib2.SSLHandshakeError, socket.error) as e:
+      errMsg = u'Connection error: {0}'.format(convertSysToUTF8(str(e) or repr(e)))
+      if n != DOWNLOAD_RETRIES:
+        waitOnFailure(n, DOWNLOAD_RETRIES, SOCKET_ERROR_RC, errMsg)
+        continue
+      raise IOError(errMsg)
+    if resp.status in [200, 206, 416]:
+      return (resp, content)
+    if resp.status in BATCH_RETRY_STATUSES and n != DOWNLOAD_RETRIES:
+      _, reason, message = _getBatchResponseError(resp, content)
+      waitOnFailure(n, DOWNLOAD_RETRIES, reason, message)
+      continue
+# The HttpError includes the reason from the API's error response
+    raise googleapiclient.errors.HttpError(resp, content, uri=uri)
+
+class MediaDownloader(object):
+  def __init__(self, httpObj, downloads, numThreads=None, chunkSize=None):
+    self.httpObj = httpObj
+    self.downloads = list(downloads)
+    self.pending = list(self.downloads)
+    self.numThreads = numThreads or GC.Values[GC.NUM_DOWNLOAD_THREADS]
+    self.chunkSize = chunkSize or GC.Values[GC.DOWNLOAD_CHUNK_SIZE]*1024*1024
+    self.lock = threading.Lock()
+    self.ready = threading.Condition(self.lock)
+    self.slots = threading.Semaphore(self.numThreads*DOWNLOAD_RANGES_AHEAD)
+    self.events = Queue.Queue()
+    self.stopping = threading.Event()
+    self.threadSettings = getThreadSettings()
+
+# Returns (download, None) for a download to be started, (download, (start, end)) for a range to get,
+# None when there is nothing left to do
+  def _nextTask(self):
+    with self.lock:
+      while self.pending and not self.stopping.is_set():
+        for download in self.pending:
+          if not download.started:
+            if not download.starting:
+              download.starting = True
+              return (download, None)
+          elif download.nextOffset < download.size:
+            start = download.nextOffset
+            download.nextOffset = min(start+self.chunkSize, download.size)
+            if download.nextOffset == download.size:
+              self.pending.remove(download)
+            return (download, (start, download.nextOffset-1))
+# The remaining downloads are being started by other threads
+        self.ready.wait(1.0)
+      return None
+
+  def _readJournal(self, download):
+    try:
+      with open(download.filename+DOWNLOAD_JOURNAL_SUFFIX, u'rb') as f:
+        journal = json.load(f)
+      if (journal[u'size'] == download.size and journal[u'md5Hash'] == download.md5Hash and
+          os.path.getsize(download.filename) == download.size):
+        return journal[u'offset']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+      pass
+    return 0
+
+  def _writeJournal(self, download):
+    with open(download.filename+DOWNLOAD_JOURNAL_SUFFIX, u'wb') as f:
+      json.dump({u'size': download.size, u'md5Hash': download.md5Hash, u'offset': download.offset}, f)
+
+  def _removeJournal(self, download):
+    try:
+      os.remove(download.filename+DOWNLOAD_JOURNAL_SUFFIX)
+    except OSError:
+      pass
+
+  def _start(self, download, httpObj):
+    try:
+      if download.size is None:
+        resp, content = _getMediaRange(httpObj, download.uri, 0, 0)
+        if resp.status == 206:
+          download.size = int(resp[u'content-range'].rsplit(u'/', 1)[1])
+        elif resp.status == 416:
+          download.size = 0
+        else:
+          download.size = len(content)
+      offset = self._readJournal(download)
+      if offset:
+        download.fd = open(download.filename, u'r+b')
+# Hash the part of the file received by the previous download
+        while download.offset < offset:
+          data = download.fd.read(min(offset-download.offset, 1024*1024))
+          if not data:
+            break
+          download.md5.update(data)
+          download.offset += len(data)
+      else:
+        download.fd = open(download.filename, u'wb')
+        download.created = True
+        download.fd.truncate(download.size)
+      download.nextOffset = download.offset
+    except Exception as e:
+      self._fail(download, str(e))
+    with self.lock:
+      download.started = True
+      if download.error is None and download.nextOffset >= download.size:
+        self.pending.remove(download)
+      self.ready.notify_all()
+    if download.error is None and download.offset == download.size:
+      self._finish(download)
+
+  def _getRange(self, download, byteRange, httpObj):
+    start, end = byteRange
+    if download.error is not None:
+      self.slots.release()
+      return
+    try:
+      resp, content = _getMediaRange(httpObj, download.uri, start, end)
+      if resp.status == 416 or len(content) != end-start+1:
+        raise IOError(Msg.DOWNLOAD_RANGE_SIZE_MISMATCH.format(start, end, len(content)))
+      with download.lock:
+        if download.error is not None:
+          self.slots.release()
+          return
+        download.fd.seek(start)
+        download.fd.write(content)
+        download.ranges[start] = content
+        offset = download.offset
+        while download.offset in download.ranges:
+          data = download.ranges.pop(download.offset)
+          download.md5.update(data)
+          download.offset += len(data)
+          self.slots.release()
+        if download.offset != offset:
+          download.fd.flush()
+          self._writeJournal(download)
+        finished = download.offset == download.size
+    except Exception as e:
+      self.slots.release()
+      self._fail(download, str(e))
+      return
+    if finished:
+      self._finish(download)
+    elif download.offset != offset:
+      self.events.put((download, False))
+
+  def _finish(self, download):
+    try:
+# Necessary to make sure file is flushed by both Python and OS
+# https://stackoverflow.com/a/13762137/1503886
+      download.fd.flush()
+      os.fsync(download.fd.fileno())
+      closeFile(download.fd)
+      download.fd = None
+      self._removeJournal(download)
+    except IOError as e:
+      download.error = str(e)
+    self.events.put((download, True))
+
+  def _fail(self, download, error):
+    with download.lock:
+      if download.error is not None:
+        return
+      download.error = error
+      for _ in download.ranges:
+        self.slots.release()
+      download.ranges = {}
+      if download.fd is not None:
+        try:
+          download.fd.close()
+        except IOError:
+          pass
+        download.fd = None
+# A preallocated file with no ranges in the journal is all zeros, don't leave it under the real name
+      if download.created and download.offset == 0:
+        try:
+          os.remove(download.filename)
+        except OSError:
+          pass
+        self._removeJournal(download)
+    with self.lock:
+      if download in self.pending:
+        self.pending.remove(download)
+      self.ready.notify_all()
+    self.events.put((download, True))
+
+  def _worker(self):
+    setThreadSettings(self.threadSettings)
+    httpObj = getThreadHttpObj(self.httpObj)
+    while not self.stopping.is_set():
+      self.slots.acquire()
+      task = self._nextTask()
+      if task is None:
+        self.slots.release()
+        return
+      download, byteRange = task
+      if byteRange is None:
+        self.slots.release()
+        self._start(download, httpObj)
+      else:
+        self._getRange(download, byteRange, httpObj)
+
+# Yield (download, finished) as the downloads progress; a finished download has an error or has been completely received
+  def Run(self):
+    if not self.downloads:
+      return
+    threads = []
+    for _ in range(self.numThreads):
+      thread = threading.Thread(target=self._worker)
+      thread.daemon = True
+      thread.start()
+      threads.append(thread)
+    remaining = len(self.downloads)
+    try:
+      while remaining:
+        download, finished = self.events.get()
+        if finished:
+          remaining -= 1
+        yield (download, finished)
+    finally:
+      self.stopping.set()
+      for _ in range(self.numThreads):
+        self.slots.release()
+# When all of the downloads have finished the threads have nothing left to do; wait for them so that they aren't running at exit
+      if not remaining:
+        for thread in threads:
+          thread.join()
+
 def doGAMCheckForUpdates(forceCheck=False):
   def _gamLatestVersionNotAvailable():
     if forceCheck:
@@ -2940,6 +3705,51 @@ def getSvcAcctCredentials(scopes, act_as):
   except (ValueError, IndexError, KeyError):
     invalidOauth2serviceJsonExit()
 
+# Service account access tokens are reused until they are within this many seconds of expiring
+SVCACCT_TOKEN_REFRESH_MARGIN = 300
+SvcAcctTokens = {}
+
+def _getSvcAcctTokenFileName(key):
+  return os.path.join(GM.Globals[GM.SVCACCT_TOKEN_DIR], hashlib.sha1(key.encode(UTF8)).hexdigest())
+
+def _checkSvcAcctToken(token):
+  return token and token[u'expiry']-time.time() > SVCACCT_TOKEN_REFRESH_MARGIN
+
+# Tokens saved by another process are read when this process has no valid token;
+# a file that is not a token for this key with a string token and a numeric expiry is ignored
+def _getSvcAcctToken(key):
+  token = SvcAcctTokens.get(key)
+  if not _checkSvcAcctToken(token) and GM.Globals[GM.SVCACCT_TOKEN_DIR]:
+    try:
+      token = json.loads(readFile(_getSvcAcctTokenFileName(key), continueOnError=True, displayError=False) or u'null')
+    except ValueError:
+      return None
+    if ((not isinstance(token, dict)) or (token.get(u'key') != key) or
+        (not isinstance(token.get(u'token'), basestring)) or (not token[u'token']) or
+        (not isinstance(token.get(u'expiry'), (int, long, float))) or isinstance(token[u'expiry'], bool)):
+      return None
+  return token
+
+# Tokens are written to a temporary file that is renamed so that other processes never read a partial file
+def _saveSvcAcctToken(key, token):
+  SvcAcctTokens[key] = token
+  if not GM.Globals[GM.SVCACCT_TOKEN_DIR]:
+    return
+  writeFileAtomic(_getSvcAcctTokenFileName(key), json.dumps(token))
+
+# Set a cached access token for the service account subject/scopes or get and cache a new token
+def refreshSvcAcctCredentials(credentials, httpObj):
+  key = u'{0} {1} {2}'.format(credentials.service_account_email, credentials._subject, u' '.join(sorted(credentials.scopes)))
+  token = _getSvcAcctToken(key)
+  if _checkSvcAcctToken(token):
+    SvcAcctTokens[key] = token
+    credentials.token = token[u'token']
+    credentials.expiry = datetime.datetime.utcfromtimestamp(token[u'expiry'])
+    return
+  credentials.refresh(google_auth_httplib2.Request(httpObj))
+  if credentials.expiry:
+    _saveSvcAcctToken(key, {u'key': key, u'token': credentials.token, u'expiry': calendar.timegm(credentials.expiry.utctimetuple())})
+
 def getGDataOAuthToken(gdataObj, credentials=None):
   if not credentials:
     credentials = getClientCredentials(API.FAM2_SCOPES)
@@ -3078,7 +3888,7 @@ def callGData(service, function,
   method = getattr(service, function)
   retries = 10
   if GC.Values[GC.API_CALLS_RATE_CHECK]:
-    checkAPICallsRate()
+    checkAPICallsRate(RateLimit.OTHER)
   for n in range(1, retries+1):
     try:
       return method(**kwargs)
@@ -3264,7 +4074,8 @@ def callGAPI(service, function,
   method = getattr(service, function)
   svcparms = dict(kwargs.items()+GM.Globals[GM.EXTRA_ARGS_LIST])
   if GC.Values[GC.API_CALLS_RATE_CHECK]:
-    checkAPICallsRate()
+    rateKey = getAPICallsRateKey(service)
+    checkAPICallsRate(rateKey)
   for n in range(1, retries+1):
     try:
       return method(**svcparms).execute()
@@ -3274,6 +4085,8 @@ def callGAPI(service, function,
         continue
       if http_status == 0:
         return None
+      if (reason in GAPI.RATE_LIMIT_REASONS) and GC.Values[GC.API_CALLS_RATE_CHECK]:
+        RateLimit.Penalize(rateKey)
       if (n != retries) and (reason in all_retry_reasons):
         if reason == GAPI.INTERNAL_ERROR and bailOnInternalError and n == 2:
           raise GAPI.REASON_EXCEPTION_MAP[reason](message)
@@ -3381,6 +4194,34 @@ def callGAPIpages(service, function, items,
       return allResults
     kwargs[u'pageToken'] = pageToken
 
+# Like callGAPIpages but yields the items of each page as it is received
+def yieldGAPIpages(service, function, items,
+                   page_message=None, message_attribute=None, maxItems=0,
+                   throw_reasons=None, retry_reasons=None,
+                   **kwargs):
+  if throw_reasons is None:
+    throw_reasons = []
+  if retry_reasons is None:
+    retry_reasons = []
+  totalItems = 0
+  maxResults = kwargs.get(u'maxResults', 0)
+  tweakMaxResults = maxItems and maxResults
+  entityType = Ent.Getting() if page_message else None
+  while True:
+    if tweakMaxResults and maxItems-totalItems < maxResults:
+      kwargs[u'maxResults'] = maxItems-totalItems
+    results = callGAPI(service, function,
+                       throw_reasons=throw_reasons, retry_reasons=retry_reasons,
+                       **kwargs)
+    pageResults = []
+    pageToken, totalItems = _processGAPIpagesResult(results, items, pageResults, totalItems, page_message, message_attribute, entityType)
+    if not pageToken or maxItems and totalItems >= maxItems:
+      _finalizeGAPIpagesResult(page_message)
+      yield pageResults
+      return
+    yield pageResults
+    kwargs[u'pageToken'] = pageToken
+
 def callGAPIitems(service, function, items,
                   throw_reasons=None, retry_reasons=None,
                   **kwargs):
@@ -3435,12 +4276,55 @@ def readDiscoveryFile(api_version):
   except ValueError:
     invalidDiscoveryJsonExit(disc_file)
 
-def getAPIversionHttpService(api):
+# Service objects built by build_from_document are kept as skeletons and cloned for each request for a service object.
+# build_from_document creates a method for every method in the discovery document; a clone rebinds the skeleton's
+# methods to a new Resource with its own http. Nested resources, e.g. users(), are handled the same way;
+# googleapiclient rebuilds them on each reference.
+class GAPIServiceSkeleton(object):
+  def __init__(self, resource):
+    self.resource = resource
+    self.resource._http = None
+    self.nested = {}
+
+  def _nestedResourceMethod(self, attr, resource):
+    def nestedResource():
+      skeleton = self.nested.get(attr)
+      if skeleton is None:
+        skeleton = self.nested[attr] = GAPIServiceSkeleton(getattr(self.resource, attr)())
+      return skeleton.Clone(resource._http)
+    return nestedResource
+
+  def Clone(self, httpObj):
+    resource = object.__new__(googleapiclient.discovery.Resource)
+    resource.__dict__.update(self.resource.__dict__)
+    resource._http = httpObj
+    resource._dynamic_attrs = self.resource._dynamic_attrs[:]
+    for attr in self.resource._dynamic_attrs:
+      method = getattr(self.resource.__dict__[attr], u'__func__', None)
+      if method is None:
+        continue
+      if getattr(method, u'__is_resource__', False):
+        resource.__dict__[attr] = self._nestedResourceMethod(attr, resource)
+      else:
+        resource.__dict__[attr] = method.__get__(resource, resource.__class__)
+    return resource
+
+GAPIServiceSkeletons = {}
+
+def getGAPIServiceFromSkeleton(api, version, httpObj):
+  skeleton = GAPIServiceSkeletons.get((api, version))
+  if skeleton is None:
+    skeleton = GAPIServiceSkeletons[(api, version)] = GAPIServiceSkeleton(
+      googleapiclient.discovery.build_from_document(GM.Globals[GM.CURRENT_API_SERVICES][api][version], http=httpObj))
+  return skeleton.Clone(httpObj)
+
+# pooled: use a persistent HTTP object; not for oauth2client credentials.authorize which modifies the object
+def getAPIversionHttpService(api, pooled=False):
   hasLocalJSON = API.hasLocalJSON(api)
   api, version, api_version, cred_family = API.getVersion(api)
-  httpObj = getHttpObj(cache=GM.Globals[GM.CACHE_DIR])
+  httpObj = getHttpObj(cache=GM.Globals[GM.CACHE_DIR]) if not pooled else HttpPool.Get(cache=GM.Globals[GM.CACHE_DIR])
   if api in GM.Globals[GM.CURRENT_API_SERVICES] and version in GM.Globals[GM.CURRENT_API_SERVICES][api]:
-    service = googleapiclient.discovery.build_from_document(GM.Globals[GM.CURRENT_API_SERVICES][api][version], http=httpObj)
+    service = getGAPIServiceFromSkeleton(api, version, httpObj)
     if GM.Globals[GM.CACHE_DISCOVERY_ONLY]:
       httpObj.cache = None
     return (api_version, httpObj, service, cred_family)
@@ -3535,14 +4419,13 @@ google_auth_httplib2.AuthorizedHttp.request = _request_with_user_agent(google_au
 
 def buildGAPIServiceObject(api, user, i, count, displayError=True):
   userEmail = convertUIDtoEmailAddress(user)
-  _, httpObj, service, _ = getAPIversionHttpService(api)
+  _, httpObj, service, _ = getAPIversionHttpService(api, pooled=True)
   GM.Globals[GM.CURRENT_SVCACCT_API] = api
   GM.Globals[GM.CURRENT_SVCACCT_API_SCOPES] = API.getSvcAcctScopesSet(api)
   GM.Globals[GM.CURRENT_SVCACCT_USER] = userEmail
   credentials = getSvcAcctCredentials(GM.Globals[GM.CURRENT_SVCACCT_API_SCOPES], userEmail)
-  request = google_auth_httplib2.Request(httpObj)
   try:
-    credentials.refresh(request)
+    refreshSvcAcctCredentials(credentials, httpObj)
     service._http = google_auth_httplib2.AuthorizedHttp(credentials, http=httpObj)
   except (httplib2.ServerNotFoundError, google.auth.exceptions.TransportError) as e:
     systemErrorExit(NETWORK_ERROR_RC, str(e))
@@ -3586,9 +4469,8 @@ def getGDataUserCredentials(api, user, i, count):
   if not GM.Globals[GM.CURRENT_SVCACCT_API_SCOPES]:
     systemErrorExit(NO_SCOPES_FOR_API_RC, Msg.NO_SCOPES_FOR_API.format(discovery.get(u'title', api_version)))
   credentials = getSvcAcctCredentials(GM.Globals[GM.CURRENT_SVCACCT_API_SCOPES], userEmail)
-  request = google_auth_httplib2.Request(getHttpObj())
   try:
-    credentials.refresh(request)
+    refreshSvcAcctCredentials(credentials, HttpPool.Get())
     return (userEmail, credentials)
   except (httplib2.ServerNotFoundError, google.auth.exceptions.TransportError) as e:
     systemErrorExit(NETWORK_ERROR_RC, str(e))
@@ -3641,6 +4523,100 @@ def getSitesObject(entityType=Ent.DOMAIN, entityName=None, i=0, count=0):
     sitesObject.debug = True
   return (userEmail, sitesObject)
 
+# The user ID/email address maps are shared by the commands/threads of a process. When the number of lookups not found
+# in the maps reaches user_map_prefetch_threshold, the IDs, primary email addresses and aliases of all users are gotten with users.list.
+# If user_map_cache_minutes > 0, the prefetched maps are saved in usermapcache.json and used by subsequent commands for that many minutes.
+def _addUserToMaps(uid, primaryEmail, aliases=None):
+  GM.Globals[GM.MAP_USER_ID_TO_NAME][uid] = primaryEmail
+  GM.Globals[GM.MAP_USER_NAME_TO_ID][primaryEmail.lower()] = uid
+  for alias in aliases or []:
+    GM.Globals[GM.MAP_USER_NAME_TO_ID][alias.lower()] = uid
+
+def _loadUserMaps(state):
+  state[u'loaded'] = True
+  if not GC.Values[GC.USER_MAP_CACHE_MINUTES]:
+    return
+  fileName = os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_USER_MAP_CACHE_JSON)
+  try:
+    if time.time()-os.path.getmtime(fileName) > GC.Values[GC.USER_MAP_CACHE_MINUTES]*60:
+      return
+  except OSError:
+    return
+  data = readFile(fileName, continueOnError=True, displayError=False)
+  if data:
+    try:
+      users = json.loads(data)
+    except ValueError:
+      return
+    for uid, primaryEmail, aliases in users:
+      _addUserToMaps(uid, primaryEmail, aliases)
+    state[u'complete'] = True
+
+def _prefetchUserMaps(cd, state):
+  state[u'prefetched'] = True
+  try:
+    result = callGAPIpages(cd.users(), u'list', u'users',
+                           throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                           customer=GC.Values[GC.CUSTOMER_ID], fields=u'nextPageToken,users(id,primaryEmail,aliases)',
+                           maxResults=GC.Values[GC.USER_MAX_RESULTS])
+  except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+    return
+  users = []
+  for user in result:
+    aliases = user.get(u'aliases', [])
+    _addUserToMaps(user[u'id'], user[u'primaryEmail'], aliases)
+    users.append([user[u'id'], user[u'primaryEmail'], aliases])
+  state[u'complete'] = True
+  if GC.Values[GC.USER_MAP_CACHE_MINUTES]:
+    writeFileAtomic(os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_USER_MAP_CACHE_JSON),
+                    json.dumps(users, ensure_ascii=False, separators=(u',', u':')))
+
+# Called when a user ID/email address is not in the maps; count the lookup and prefetch the maps when the threshold is reached.
+# The maps are not authoritative: a user created or renamed after they were loaded, e.g., by an earlier command of
+# a gam batch/tbatch, is not in them, so the caller gets a user that is still not in the maps with users.get
+def _checkUserMaps(cd):
+  state = GM.Globals[GM.USER_MAP_STATE]
+  with UserMapLock:
+    if not state[u'loaded']:
+      _loadUserMaps(state)
+    if not state[u'complete'] and not state[u'prefetched']:
+      state[u'lookups'] += 1
+      if GC.Values[GC.USER_MAP_PREFETCH_THRESHOLD] and state[u'lookups'] >= GC.Values[GC.USER_MAP_PREFETCH_THRESHOLD]:
+        _prefetchUserMaps(cd, state)
+
+# Called by commands that change the primary email addresses or aliases of users or delete users; the users, given by ID,
+# primary email address or alias, are dropped from the maps and from usermapcache.json so that they are gotten again when needed.
+# The file keeps its modification time so that the remaining users still expire user_map_cache_minutes after they were saved
+def invalidateUserMaps(users):
+  keys = set([user.lower() for user in users])
+  if not keys:
+    return
+  with UserMapLock:
+    userIdToName = GM.Globals[GM.MAP_USER_ID_TO_NAME]
+    userNameToId = GM.Globals[GM.MAP_USER_NAME_TO_ID]
+    uids = set([uid for uid in userIdToName if uid.lower() in keys])
+    uids.update([uid for name, uid in userNameToId.items() if name in keys])
+    for uid in uids:
+      userIdToName.pop(uid, None)
+    for name in [name for name, uid in userNameToId.items() if uid in uids or name in keys]:
+      del userNameToId[name]
+    if not GC.Values[GC.USER_MAP_CACHE_MINUTES]:
+      return
+    fileName = os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_USER_MAP_CACHE_JSON)
+    try:
+      mtime = os.path.getmtime(fileName)
+      users = json.loads(readFile(fileName, continueOnError=True, displayError=False) or u'[]')
+    except (OSError, ValueError):
+      return
+    keptUsers = [[uid, primaryEmail, aliases] for uid, primaryEmail, aliases in users
+                 if uid not in uids and uid.lower() not in keys and primaryEmail.lower() not in keys and
+                 not [alias for alias in aliases if alias.lower() in keys]]
+    if len(keptUsers) != len(users) and writeFileAtomic(fileName, json.dumps(keptUsers, ensure_ascii=False, separators=(u',', u':'))):
+      try:
+        os.utime(fileName, (mtime, mtime))
+      except OSError:
+        pass
+
 # Convert UID to email address
 def convertUIDtoEmailAddress(emailAddressOrUID, cd=None, emailType=u'user', checkForCustomerId=False):
   if checkForCustomerId and (emailAddressOrUID == GC.Values[GC.CUSTOMER_ID]):
@@ -3651,14 +4627,22 @@ def convertUIDtoEmailAddress(emailAddressOrUID, cd=None, emailType=u'user', chec
   if cd is None:
     cd = buildGAPIObject(API.DIRECTORY)
   if emailType != u'group':
-    try:
-      result = callGAPI(cd.users(), u'get',
-                        throw_reasons=GAPI.USER_GET_THROW_REASONS,
-                        userKey=normalizedEmailAddressOrUID, fields=u'primaryEmail')
-      if u'primaryEmail' in result:
-        return result[u'primaryEmail'].lower()
-    except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
-      pass
+    primaryEmail = GM.Globals[GM.MAP_USER_ID_TO_NAME].get(normalizedEmailAddressOrUID)
+    if primaryEmail is None:
+      _checkUserMaps(cd)
+      primaryEmail = GM.Globals[GM.MAP_USER_ID_TO_NAME].get(normalizedEmailAddressOrUID)
+      if primaryEmail is None:
+        try:
+          result = callGAPI(cd.users(), u'get',
+                            throw_reasons=GAPI.USER_GET_THROW_REASONS,
+                            userKey=normalizedEmailAddressOrUID, fields=u'id,primaryEmail')
+          if u'primaryEmail' in result:
+            _addUserToMaps(result[u'id'], result[u'primaryEmail'])
+            return result[u'primaryEmail'].lower()
+        except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
+          pass
+    if primaryEmail and primaryEmail.find(u'@') > 0:
+      return primaryEmail.lower()
   if emailType != u'user':
     try:
       result = callGAPI(cd.groups(), u'get',
@@ -3678,15 +4662,25 @@ def convertEmailAddressToUID(emailAddressOrUID, cd=None, emailType=u'user', save
   if cd is None:
     cd = buildGAPIObject(API.DIRECTORY)
   if emailType != u'group':
+    uid = GM.Globals[GM.MAP_USER_NAME_TO_ID].get(normalizedEmailAddressOrUID)
+    if uid is not None:
+      return uid
+    _checkUserMaps(cd)
+    uid = GM.Globals[GM.MAP_USER_NAME_TO_ID].get(normalizedEmailAddressOrUID)
+    if uid is not None:
+      return uid
     try:
-      return callGAPI(cd.users(), u'get',
-                      throw_reasons=GAPI.USER_GET_THROW_REASONS,
-                      userKey=normalizedEmailAddressOrUID, fields=u'id')[u'id']
+      result = callGAPI(cd.users(), u'get',
+                        throw_reasons=GAPI.USER_GET_THROW_REASONS,
+                        userKey=normalizedEmailAddressOrUID, fields=u'id,primaryEmail')
+      _addUserToMaps(result[u'id'], result[u'primaryEmail'], [normalizedEmailAddressOrUID])
+      return result[u'id']
     except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
-      if emailType == u'user':
-        if savedLocation is not None:
-          Cmd.SetLocation(savedLocation)
-        entityDoesNotExistExit(Ent.USER, normalizedEmailAddressOrUID, errMsg=getPhraseDNEorSNA(normalizedEmailAddressOrUID))
+      pass
+    if emailType == u'user':
+      if savedLocation is not None:
+        Cmd.SetLocation(savedLocation)
+      entityDoesNotExistExit(Ent.USER, normalizedEmailAddressOrUID, errMsg=getPhraseDNEorSNA(normalizedEmailAddressOrUID))
   try:
     return callGAPI(cd.groups(), u'get',
                     throw_reasons=GAPI.GROUP_GET_THROW_REASONS, retry_reasons=GAPI.GROUP_GET_RETRY_REASONS,
@@ -3702,12 +4696,19 @@ def convertUserIDtoEmail(uid, cd=None):
   if not primaryEmail:
     if cd is None:
       cd = buildGAPIObject(API.DIRECTORY)
+    _checkUserMaps(cd)
+    primaryEmail = GM.Globals[GM.MAP_USER_ID_TO_NAME].get(uid)
+    if primaryEmail:
+      return primaryEmail
     try:
       primaryEmail = callGAPI(cd.users(), u'get',
                               throw_reasons=GAPI.USER_GET_THROW_REASONS,
                               userKey=uid, fields=u'primaryEmail')[u'primaryEmail']
+      _addUserToMaps(uid, primaryEmail)
+      return primaryEmail
     except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
-      primaryEmail = u'uid:{0}'.format(uid)
+      pass
+    primaryEmail = u'uid:{0}'.format(uid)
     GM.Globals[GM.MAP_USER_ID_TO_NAME][uid] = primaryEmail
   return primaryEmail
 
@@ -3718,17 +4719,10 @@ def splitEmailAddressOrUID(emailAddressOrUID):
   atLoc = normalizedEmailAddressOrUID.find(u'@')
   if atLoc > 0:
     return (normalizedEmailAddressOrUID, normalizedEmailAddressOrUID[:atLoc], normalizedEmailAddressOrUID[atLoc+1:])
-  try:
-    cd = buildGAPIObject(API.DIRECTORY)
-    result = callGAPI(cd.users(), u'get',
-                      throw_reasons=GAPI.USER_GET_THROW_REASONS,
-                      userKey=normalizedEmailAddressOrUID, fields=u'primaryEmail')
-    if u'primaryEmail' in result:
-      normalizedEmailAddressOrUID = result[u'primaryEmail'].lower()
-      atLoc = normalizedEmailAddressOrUID.find(u'@')
-      return (normalizedEmailAddressOrUID, normalizedEmailAddressOrUID[:atLoc], normalizedEmailAddressOrUID[atLoc+1:])
-  except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
-    pass
+  primaryEmail = convertUIDtoEmailAddress(u'uid:{0}'.format(normalizedEmailAddressOrUID))
+  atLoc = primaryEmail.find(u'@')
+  if atLoc > 0:
+    return (primaryEmail, primaryEmail[:atLoc], primaryEmail[atLoc+1:])
   return (normalizedEmailAddressOrUID, normalizedEmailAddressOrUID, GC.Values[GC.DOMAIN])
 
 # Convert Org Unit Id to Org Unit Path
@@ -3791,6 +4785,522 @@ def _checkMemberRoleIsSuspended(member, validRoles, isSuspended):
   return ((not validRoles or member.get(u'role', Ent.ROLE_MEMBER) in validRoles) and
           (isSuspended is None or (not isSuspended and memberStatus != u'SUSPENDED') or (isSuspended and memberStatus == u'SUSPENDED')))
 
+# Get the members of groupEmails and, if recursive, of all of their subgroups into groupsMembers, {lower case group email: members},
+# members is None if the group could not be listed. The groups are listed level by level, the groups of a level in num_api_threads threads;
+# a group in groupsMembers is not listed again, so a subgroup in several groups is listed once and cycles of groups end.
+def getGroupsMembers(cd, groupEmails, memberRoles, listRoles, listFields, groupsMembers, recursive, i=0, count=0):
+  def _listGroupMembers(groupEmail):
+    printGettingAllEntityItemsForWhom(memberRoles if memberRoles else Ent.ROLE_MANAGER_MEMBER_OWNER, groupEmail, i, count, entityType=Ent.GROUP)
+    try:
+      return callGAPIpages(cdThreads.Get().members(), u'list', u'members',
+                           page_message=getPageMessageForWhom(forWhom=groupEmail),
+                           throw_reasons=GAPI.MEMBERS_THROW_REASONS, retry_reasons=GAPI.MEMBERS_RETRY_REASONS,
+                           groupKey=groupEmail, roles=listRoles, fields=listFields, maxResults=GC.Values[GC.MEMBER_MAX_RESULTS])
+    except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden):
+      entityUnknownWarning(Ent.GROUP, groupEmail, i, count)
+      return None
+
+  cdThreads = ThreadGAPIObjects(cd)
+  groupsLevel = []
+  for groupEmail in groupEmails:
+    if groupEmail.lower() not in groupsMembers:
+      groupsMembers[groupEmail.lower()] = None
+      groupsLevel.append(groupEmail)
+  while groupsLevel:
+    nextGroupsLevel = []
+    for groupEmail, members in yieldThreadedCallsWithOutput(_listGroupMembers, groupsLevel, min(len(groupsLevel), GC.Values[GC.NUM_API_THREADS])):
+      groupsMembers[groupEmail.lower()] = members
+      if recursive and members:
+        for member in members:
+          if member[u'type'] == u'GROUP' and member[u'email'].lower() not in groupsMembers:
+            groupsMembers[member[u'email'].lower()] = None
+            nextGroupsLevel.append(member[u'email'])
+    groupsLevel = nextGroupsLevel
+
+# Get the delivery settings of groupsMembers, [(groupEmail, member), ...], in batches
+def getGroupsMembersDeliverySettings(cd, groupsMembers):
+  def _callbackGetDeliverySettings(request_id, response, exception):
+    if exception is None:
+      for member in membersToGet[request_id]:
+        member[u'delivery_settings'] = response.get(u'delivery_settings', u'')
+
+  membersToGet = {}
+  for groupEmail, member in groupsMembers:
+    membersToGet.setdefault(u'{0}\n{1}'.format(groupEmail.lower(), member[u'id']), []).append(member)
+  svcargs = dict([(u'groupKey', None), (u'memberKey', None), (u'fields', u'delivery_settings')]+GM.Globals[GM.EXTRA_ARGS_LIST])
+  method = getattr(cd.members(), u'get')
+  dbatch = cd.new_batch_http_request(callback=_callbackGetDeliverySettings)
+  bcount = 0
+  for requestId in membersToGet:
+    svcparms = svcargs.copy()
+    svcparms[u'groupKey'], svcparms[u'memberKey'] = requestId.split(u'\n')
+    dbatch.add(method(**svcparms), request_id=requestId)
+    bcount += 1
+    if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
+      executeBatch(dbatch)
+      dbatch = cd.new_batch_http_request(callback=_callbackGetDeliverySettings)
+      bcount = 0
+  if bcount > 0:
+    executeBatch(dbatch, final=True)
+
+# Group membership graph: the direct members of all of the groups and, derived from them, the groups of each member.
+# The graph is saved in a file next to oauth2.txt; when it is older than group_graph_cache_minutes, the members of all
+# of the groups are relisted. Groups changed by GAM are marked and relisted the next time that the graph is used
+class GroupMembershipGraph(object):
+# Member fields
+  EMAIL = 0
+  ID = 1
+  TYPE = 2
+  ROLE = 3
+  STATUS = 4
+  MEMBER_FIELDS = [u'email', u'id', u'type', u'role', u'status']
+
+  def __init__(self):
+    self.time = 0
+# Modification time of the file when the graph was loaded/saved
+    self.fileTime = None
+# {lower case group email: {u'email': email, u'id': id, u'name': name, u'count': direct members count or None if the group must be relisted,
+#                           u'members': [[email, id, type, role, status], ...]}}
+    self.groups = {}
+# {lower case member email or id: {lower case group email: role}}
+    self.memberGroups = None
+    self.changed = False
+
+  def Load(self, data):
+    try:
+      graph = json.loads(data or u'{}')
+    except ValueError:
+      return False
+    if not isinstance(graph, dict) or not isinstance(graph.get(u'groups'), dict):
+      return False
+    self.time = graph.get(u'time', 0)
+    self.groups = graph[u'groups']
+    self.memberGroups = None
+    self.changed = False
+    return True
+
+  def Dumps(self):
+    return json.dumps({u'time': self.time, u'groups': self.groups}, ensure_ascii=False, separators=(u',', u':'))
+
+  def Save(self, fileName):
+    writeFileAtomic(fileName, self.Dumps())
+    self.fileTime = _getGroupGraphCacheFileTime(fileName)
+    self.changed = False
+
+  def _getGroupKey(self, group):
+    groupKey = group.lower()
+    if groupKey in self.groups:
+      return groupKey
+    for key, entry in iteritems(self.groups):
+      if entry[u'id'] == group:
+        return key
+    return None
+
+# listGroups: list all of the groups to find the groups that are new, deleted or have a changed direct members count;
+# full: relist the members of all of the groups. Groups marked as changed are always relisted
+  def Refresh(self, cd, listGroups=True, full=False):
+    if listGroups:
+      printGettingAllAccountEntities(Ent.GROUP)
+      try:
+        result = callGAPIpages(cd.groups(), u'list', u'groups',
+                               page_message=getPageMessage(),
+                               throw_reasons=[GAPI.RESOURCE_NOT_FOUND, GAPI.DOMAIN_NOT_FOUND, GAPI.FORBIDDEN, GAPI.BAD_REQUEST],
+                               customer=GC.Values[GC.CUSTOMER_ID], orderBy=u'email',
+                               fields=u'nextPageToken,groups(email,id,name,directMembersCount)')
+      except (GAPI.resourceNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest):
+        accessErrorExit(cd)
+      groups = {}
+      for group in result:
+        groupKey = group[u'email'].lower()
+        entry = self.groups.get(groupKey)
+        if (entry is None or entry[u'id'] != group[u'id'] or
+            (entry[u'count'] is not None and entry[u'count'] != int(group.get(u'directMembersCount', 0)))):
+          entry = {u'email': group[u'email'], u'id': group[u'id'], u'count': None, u'members': []}
+        entry[u'name'] = group.get(u'name', u'')
+        groups[groupKey] = entry
+      self.groups = groups
+      self.time = time.time()
+    groupEmails = [entry[u'email'] for entry in self.groups.values() if full or entry[u'count'] is None]
+    groupsMembers = {}
+    getGroupsMembers(cd, groupEmails, None, None, u'nextPageToken,members(email,id,type,role,status)', groupsMembers, False)
+    for groupKey, members in iteritems(groupsMembers):
+      if members is None:
+        self.groups.pop(groupKey, None)
+        continue
+      entry = self.groups[groupKey]
+      entry[u'members'] = [[member.get(u'email', u''), member[u'id'], member.get(u'type', u'USER'),
+                            member.get(u'role', Ent.ROLE_MEMBER), member.get(u'status', u'')] for member in members]
+      entry[u'count'] = len(members)
+    self.memberGroups = None
+    self.changed = True
+
+  def NeedsRefresh(self):
+    for entry in self.groups.values():
+      if entry[u'count'] is None:
+        return True
+    return False
+
+# The group will be relisted the next time that the graph is used; its members are dropped so that they aren't used until then
+  def MarkGroupChanged(self, group):
+    groupKey = self._getGroupKey(group)
+    if groupKey is not None:
+      self.groups[groupKey][u'count'] = None
+      self.groups[groupKey][u'members'] = []
+    elif group.find(u'@') != -1:
+      self.groups[group.lower()] = {u'email': group, u'id': u'', u'name': u'', u'count': None, u'members': []}
+    else:
+      return
+    self.memberGroups = None
+    self.changed = True
+
+# The groups that the member, e.g., a renamed user, is directly a member of will be relisted
+  def MarkMemberGroupsChanged(self, member):
+    for groupKey in list(self._getMemberGroupsMap().get(member.lower(), {})):
+      self.MarkGroupChanged(groupKey)
+
+# The groups that the group is a member of are also marked as changed
+  def DeleteGroup(self, group):
+    groupKey = self._getGroupKey(group)
+    if groupKey is None:
+      return
+    groupId = self.groups.pop(groupKey)[u'id']
+    for entry in self.groups.values():
+      for member in entry[u'members']:
+        if member[self.EMAIL].lower() == groupKey or member[self.ID] == groupId:
+          entry[u'count'] = None
+          entry[u'members'] = []
+          break
+    self.memberGroups = None
+    self.changed = True
+
+  def _getMemberGroupsMap(self):
+    if self.memberGroups is None:
+      self.memberGroups = {}
+      for groupKey, entry in iteritems(self.groups):
+        for member in entry[u'members']:
+          if member[self.EMAIL]:
+            self.memberGroups.setdefault(member[self.EMAIL].lower(), {})[groupKey] = member[self.ROLE]
+          self.memberGroups.setdefault(member[self.ID], {})[groupKey] = member[self.ROLE]
+    return self.memberGroups
+
+  def IsMember(self, member):
+    return member.lower() in self._getMemberGroupsMap()
+
+  def GetMembers(self):
+    members = {}
+    for entry in self.groups.values():
+      for member in entry[u'members']:
+        members.setdefault(member[self.EMAIL].lower() or member[self.ID], member)
+    return [members[key] for key in sorted(members)]
+
+# Return None if the group is not in the graph, otherwise [{u'email': email, u'id': id, u'type': type, u'role': role, u'status': status}, ...]
+# of the members with the roles, members(email,id,role,status,type) as returned by members.list
+  def GetGroupMembers(self, group, roles=None):
+    groupKey = self._getGroupKey(group)
+    if groupKey is None:
+      return None
+    members = []
+    for member in self.groups[groupKey][u'members']:
+      if not roles or member[self.ROLE] in roles:
+        members.append(dict([(field, member[j]) for j, field in enumerate(self.MEMBER_FIELDS) if member[j]]))
+    return members
+
+# Return [{u'email': email, u'name': name, u'role': role}, ...] of the groups that member is directly a member of, ordered by email,
+# groups(email,name) as returned by groups.list(userKey=member)
+  def GetMemberGroups(self, member):
+    memberGroups = self._getMemberGroupsMap().get(member.lower(), {})
+    return [{u'email': self.groups[groupKey][u'email'], u'name': self.groups[groupKey].get(u'name', u''), u'role': role}
+            for groupKey, role in sorted(iteritems(memberGroups))]
+
+# Return [{u'email': email, u'name': name, u'role': role, u'level': level, u'subgroup': subgroup}, ...] of the groups that member is
+# directly (level 0) or indirectly a member of; subgroup is the member of the group through which member is a member.
+# Each group is returned once, at its lowest level, so cycles of groups end
+  def GetAllMemberGroups(self, member):
+    memberGroupsMap = self._getMemberGroupsMap()
+    allGroups = []
+    visited = set()
+    level = 0
+    memberKeys = [(member.lower(), u'')]
+    while memberKeys:
+      nextMemberKeys = []
+      for memberKey, subgroup in memberKeys:
+        for groupKey, role in sorted(iteritems(memberGroupsMap.get(memberKey, {}))):
+          if groupKey in visited:
+            continue
+          visited.add(groupKey)
+          entry = self.groups[groupKey]
+          allGroups.append({u'email': entry[u'email'], u'name': entry.get(u'name', u''), u'role': role, u'level': level, u'subgroup': subgroup})
+          nextMemberKeys.append((groupKey, entry[u'email']))
+      memberKeys = nextMemberKeys
+      level += 1
+    return allGroups
+
+def _getGroupGraphCacheFileName():
+  return os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_GROUP_GRAPH_CACHE_JSON)
+
+def _getGroupGraphCacheFileTime(fileName):
+  try:
+    return os.path.getmtime(fileName)
+  except OSError:
+    return None
+
+GroupMembershipGraphLock = threading.Lock()
+
+# Return the graph of this command/thread if the file hasn't been saved since, e.g., by another thread of gam tbatch
+# or another process of gam batch/csv, otherwise the graph in the file
+def _loadGroupMembershipGraph(fileName):
+  graph = GM.Globals[GM.GROUP_MEMBERSHIP_GRAPH]
+  fileTime = _getGroupGraphCacheFileTime(fileName)
+  if graph is None or graph.fileTime != fileTime:
+    graph = GroupMembershipGraph()
+    if graph.Load(readFile(fileName, continueOnError=True, displayError=False)):
+      graph.fileTime = fileTime
+  return graph
+
+# Return None if group_graph_cache_minutes is 0 and alwaysUse is False.
+# The graph is checked each time that it is used so that a later command of gam batch/tbatch sees the changes made by earlier commands.
+# When group_graph_cache_minutes is 0, gam print groupgraph uses the graph as last refreshed by gam update groupgraph
+def getGroupMembershipGraph(cd, alwaysUse=False):
+  if not GC.Values[GC.GROUP_GRAPH_CACHE_MINUTES] and not alwaysUse:
+    return None
+  fileName = _getGroupGraphCacheFileName()
+  with GroupMembershipGraphLock:
+    graph = _loadGroupMembershipGraph(fileName)
+    if not graph.time or (GC.Values[GC.GROUP_GRAPH_CACHE_MINUTES] and time.time()-graph.time > GC.Values[GC.GROUP_GRAPH_CACHE_MINUTES]*60):
+      graph.Refresh(cd, full=True)
+    elif graph.NeedsRefresh():
+      graph.Refresh(cd, listGroups=False)
+    if graph.changed:
+      graph.Save(fileName)
+    GM.Globals[GM.GROUP_MEMBERSHIP_GRAPH] = graph
+  return graph
+
+# Called by commands that change group members with the normalized group email addresses/IDs
+# and by commands that rename users with the users' previous email addresses/IDs;
+# the groups are relisted the next time that the graph is used
+def invalidateGroupMembershipGraph(groups=None, deleted=False, members=None):
+  if not GC.Values[GC.GROUP_GRAPH_CACHE_MINUTES] or not (groups or members):
+    return
+  fileName = _getGroupGraphCacheFileName()
+  with GroupMembershipGraphLock:
+    graph = _loadGroupMembershipGraph(fileName)
+    if graph.fileTime is None:
+      return
+    for group in groups or []:
+      if deleted:
+        graph.DeleteGroup(group)
+      else:
+        graph.MarkGroupChanged(group)
+    for member in members or []:
+      graph.MarkMemberGroupsChanged(member)
+    if graph.changed:
+      graph.Save(fileName)
+    GM.Globals[GM.GROUP_MEMBERSHIP_GRAPH] = graph
+
+# When directory_cache_minutes > 0, getUsersToModify resolves its entities against a snapshot of the users and CrOS devices
+# of the customer and the results of user/CrOS device queries; the snapshot is saved in directorycache.json in the same
+# directory as oauth2.txt and each section of it is gotten from the API when it is missing or older than directory_cache_minutes.
+# Commands that create, update or delete users, aliases, licenses, org units or CrOS devices discard the snapshot.
+DIRECTORY_CACHE_USERS = u'users'
+DIRECTORY_CACHE_USER_QUERIES = u'userQueries'
+DIRECTORY_CACHE_CROS = u'cros'
+DIRECTORY_CACHE_CROS_QUERIES = u'crosQueries'
+DIRECTORY_CACHE_LICENSES = u'licenses'
+DirectoryCache = {}
+DirectoryCacheLock = threading.Lock()
+
+def _getDirectoryCacheFileName():
+  return os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_DIRECTORY_CACHE_JSON)
+
+# The time of the last change to users/CrOS devices made by GAM is kept in a separate file that only invalidateDirectoryCache writes
+# so that a process saving an entry can't overwrite it; an entry gotten from Google before that time is not used
+def _getDirectoryCacheInvalidatedFileName():
+  return _getDirectoryCacheFileName()+u'.invalidated'
+
+def _readDirectoryCacheInvalidatedTime():
+  try:
+    return float(readFile(_getDirectoryCacheInvalidatedFileName(), continueOnError=True, displayError=False) or 0)
+  except ValueError:
+    return 0
+
+def _readDirectoryCacheFile():
+  try:
+    sections = json.loads(readFile(_getDirectoryCacheFileName(), continueOnError=True, displayError=False) or u'{}')
+  except ValueError:
+    return {}
+  return sections if isinstance(sections, dict) else {}
+
+def _checkDirectoryCacheEntry(entry, invalidatedTime):
+  return entry and entry[u'time'] > invalidatedTime and time.time()-entry[u'time'] <= GC.Values[GC.DIRECTORY_CACHE_MINUTES]*60
+
+# An entry not in this process's snapshot may have been saved by another process
+def _getDirectoryCacheEntry(section, key=u''):
+  with DirectoryCacheLock:
+    invalidatedTime = _readDirectoryCacheInvalidatedTime()
+    entry = DirectoryCache.get(section, {}).get(key)
+    if not _checkDirectoryCacheEntry(entry, invalidatedTime):
+      DirectoryCache.clear()
+      DirectoryCache.update(_readDirectoryCacheFile())
+      entry = DirectoryCache.get(section, {}).get(key)
+  return entry[u'data'] if _checkDirectoryCacheEntry(entry, invalidatedTime) else None
+
+# fetchTime is the time that getting the data from Google started; data gotten before the last change is not saved.
+# The file is reread so that the entries saved by other processes are kept; expired entries are dropped.
+# The file is written to a temporary file that is renamed so that other processes never read a partial file
+def _setDirectoryCacheEntry(section, data, fetchTime, key=u''):
+  with DirectoryCacheLock:
+    invalidatedTime = _readDirectoryCacheInvalidatedTime()
+    if fetchTime <= invalidatedTime:
+      return
+    sections = _readDirectoryCacheFile()
+    sections.setdefault(section, {})[key] = {u'time': fetchTime, u'data': data}
+    for entries in sections.values():
+      for entryKey in [entryKey for entryKey, entry in entries.items() if not _checkDirectoryCacheEntry(entry, invalidatedTime)]:
+        del entries[entryKey]
+    DirectoryCache.clear()
+    DirectoryCache.update(sections)
+    writeFileAtomic(_getDirectoryCacheFileName(), json.dumps(sections, ensure_ascii=False, separators=(u',', u':')))
+
+def _markDirectoryCacheInvalidated():
+  with DirectoryCacheLock:
+    DirectoryCache.clear()
+    writeFileAtomic(_getDirectoryCacheInvalidatedFileName(), repr(time.time()))
+    try:
+      os.remove(_getDirectoryCacheFileName())
+    except OSError:
+      pass
+
+# Called by commands that change users/CrOS devices before they make the changes; the snapshot is not used for the rest of the command.
+# ProcessGAMCommand calls completeDirectoryCacheInvalidation when the command has finished making the changes so that
+# a snapshot gotten by another process while the changes were being made is not used
+def invalidateDirectoryCache():
+  if not GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+    return
+  _markDirectoryCacheInvalidated()
+  GC.Values[GC.DIRECTORY_CACHE_MINUTES] = 0
+  GM.Globals[GM.DIRECTORY_CACHE_INVALIDATED] = True
+
+def completeDirectoryCacheInvalidation():
+  if GM.Globals.get(GM.DIRECTORY_CACHE_INVALIDATED):
+    GM.Globals[GM.DIRECTORY_CACHE_INVALIDATED] = False
+    _markDirectoryCacheInvalidated()
+
+def _orgUnitPathMatches(orgUnitPath, ou, directlyInOU):
+  orgUnitPath = orgUnitPath.lower()
+  if directlyInOU:
+    return orgUnitPath == ou
+  return ou == u'/' or orgUnitPath == ou or orgUnitPath.startswith(ou+u'/')
+
+# Return [[primaryEmail, id, orgUnitPath, suspended, aliases], ...] ordered by primaryEmail
+def _getDirectoryCacheUsers(cd):
+  users = _getDirectoryCacheEntry(DIRECTORY_CACHE_USERS)
+  if users is None:
+    fetchTime = time.time()
+    printGettingAllAccountEntities(Ent.USER)
+    try:
+      result = callGAPIpages(cd.users(), u'list', u'users',
+                             page_message=getPageMessage(),
+                             throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                             customer=GC.Values[GC.CUSTOMER_ID], orderBy=u'email',
+                             fields=u'nextPageToken,users(primaryEmail,id,orgUnitPath,suspended,aliases)',
+                             maxResults=GC.Values[GC.USER_MAX_RESULTS])
+    except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+      accessErrorExit(cd)
+    users = [[user[u'primaryEmail'], user[u'id'], user.get(u'orgUnitPath', u'/'), user.get(u'suspended', False), user.get(u'aliases', [])] for user in result]
+    _setDirectoryCacheEntry(DIRECTORY_CACHE_USERS, users, fetchTime)
+# The snapshot also resolves user IDs/email addresses; users not in it are gotten individually
+  state = GM.Globals[GM.USER_MAP_STATE]
+  with UserMapLock:
+    if not state[u'complete']:
+      for primaryEmail, uid, _, _, aliases in users:
+        _addUserToMaps(uid, primaryEmail, aliases)
+      state[u'loaded'] = state[u'complete'] = True
+  return users
+
+# Return [[deviceId, orgUnitPath], ...]
+def _getDirectoryCacheCrOSDevices(cd):
+  devices = _getDirectoryCacheEntry(DIRECTORY_CACHE_CROS)
+  if devices is None:
+    fetchTime = time.time()
+    printGettingAllAccountEntities(Ent.CROS_DEVICE)
+    try:
+      result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
+                             page_message=getPageMessage(),
+                             throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                             customerId=GC.Values[GC.CUSTOMER_ID],
+                             fields=u'nextPageToken,chromeosdevices(deviceId,orgUnitPath)',
+                             maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
+    except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+      accessErrorExit(cd)
+    devices = [[device[u'deviceId'], device.get(u'orgUnitPath', u'/')] for device in result]
+    _setDirectoryCacheEntry(DIRECTORY_CACHE_CROS, devices, fetchTime)
+  return devices
+
+# The users/CrOS devices in org units are found either by listing each org unit in num_api_threads threads or by listing
+# all of the users/CrOS devices once and selecting them by org unit path. The latter is used when the directory snapshot is used
+# or when the selected org units, with their children if selected, are at least OU_FULL_SCAN_FRACTION of all of the org units.
+OU_FULL_SCAN_FRACTION = 0.5
+OU_LIST_THROW_REASONS = [GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND, GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN]
+
+# Return ({lower case path: path}, {id: path}) of all of the org units
+# Return (None, None) if the org units can't be listed, e.g., by an administrator that only manages some org units
+def _getOrgUnitPathMaps(cd):
+  try:
+    orgUnits = callGAPIitems(cd.orgunits(), u'list', u'organizationUnits',
+                             throw_reasons=[GAPI.BAD_REQUEST, GAPI.INVALID_CUSTOMER_ID, GAPI.LOGIN_REQUIRED,
+                                            GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN, GAPI.BACKEND_ERROR],
+                             customerId=GC.Values[GC.CUSTOMER_ID], type=u'all', fields=u'organizationUnits(orgUnitPath,orgUnitId)')
+  except (GAPI.badRequest, GAPI.invalidCustomerId, GAPI.loginRequired, GAPI.resourceNotFound, GAPI.forbidden, GAPI.backendError):
+    return (None, None)
+  paths = {u'/': u'/'}
+  ids = {}
+  for orgUnit in orgUnits:
+    paths[orgUnit[u'orgUnitPath'].lower()] = orgUnit[u'orgUnitPath']
+    ids[orgUnit[u'orgUnitId']] = orgUnit[u'orgUnitPath']
+  return (paths, ids)
+
+# Return [(primaryEmail, orgUnitPath), ...] of the users in ou and its children or [(deviceId, orgUnitPath), ...] of the CrOS devices directly in ou
+def _listOrgUnitItems(cd, itemType, ou, isSuspended, pageMessage):
+  if itemType == Ent.USER:
+    return [(user[u'primaryEmail'], user.get(u'orgUnitPath', u'/'))
+            for user in callGAPIpages(cd.users(), u'list', u'users',
+                                      page_message=pageMessage,
+                                      throw_reasons=OU_LIST_THROW_REASONS,
+                                      customer=GC.Values[GC.CUSTOMER_ID], query=orgUnitPathQuery(ou, isSuspended), orderBy=u'email',
+                                      fields=u'nextPageToken,users(primaryEmail,orgUnitPath)', maxResults=GC.Values[GC.USER_MAX_RESULTS])]
+  return [(device[u'deviceId'], device.get(u'orgUnitPath', ou))
+          for device in callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
+                                      page_message=pageMessage,
+                                      throw_reasons=OU_LIST_THROW_REASONS,
+                                      customerId=GC.Values[GC.CUSTOMER_ID], orgUnitPath=ou,
+                                      fields=u'nextPageToken,chromeosdevices(deviceId,orgUnitPath)', maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])]
+
+# Return [(primaryEmail, orgUnitPath), ...] of all of the users or [(deviceId, orgUnitPath), ...] of all of the CrOS devices
+def _listAllOrgUnitItems(cd, itemType, isSuspended, pageMessage):
+  if itemType == Ent.USER:
+    if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+      return [(user[0], user[2]) for user in _getDirectoryCacheUsers(cd) if isSuspended is None or isSuspended == user[3]]
+    try:
+      return [(user[u'primaryEmail'], user.get(u'orgUnitPath', u'/'))
+              for user in callGAPIpages(cd.users(), u'list', u'users',
+                                        page_message=pageMessage,
+                                        throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                                        customer=GC.Values[GC.CUSTOMER_ID], query=orgUnitPathQuery(u'/', isSuspended) or None, orderBy=u'email',
+                                        fields=u'nextPageToken,users(primaryEmail,orgUnitPath)', maxResults=GC.Values[GC.USER_MAX_RESULTS])]
+    except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+      accessErrorExit(cd)
+  if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+    return [(device[0], device[1]) for device in _getDirectoryCacheCrOSDevices(cd)]
+  try:
+    return [(device[u'deviceId'], device.get(u'orgUnitPath', u'/'))
+            for device in callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
+                                        page_message=pageMessage,
+                                        throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                                        customerId=GC.Values[GC.CUSTOMER_ID],
+                                        fields=u'nextPageToken,chromeosdevices(deviceId,orgUnitPath)', maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])]
+  except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+    accessErrorExit(cd)
+
 # Turn the entity into a list of Users/CrOS devices
 def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, includeSuspendedInAll=False, groupMemberType=u'USER'):
   def _incrEntityDoesNotExist(entityType):
@@ -3802,16 +5312,11 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
     entityError[u'invalid'] += 1
     printErrorMessage(INVALID_ENTITY_RC, formatKeyValueList(u'', [Ent.Singular(entityType), entityName, Msg.INVALID], u''))
 
-  def _addGroupUsersToUsers(group, domains, recursive):
-    printGettingAllEntityItemsForWhom(memberRoles if memberRoles else Ent.ROLE_MANAGER_MEMBER_OWNER, group, entityType=Ent.GROUP)
-    validRoles, listRoles, listFields = _getRoleVerification(memberRoles, u'nextPageToken,members(email,type,status)')
-    try:
-      result = callGAPIpages(cd.members(), u'list', u'members',
-                             page_message=getPageMessageForWhom(),
-                             throw_reasons=GAPI.MEMBERS_THROW_REASONS,
-                             groupKey=group, roles=listRoles, fields=listFields, maxResults=GC.Values[GC.MEMBER_MAX_RESULTS])
-    except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden):
-      entityUnknownWarning(Ent.GROUP, group)
+# groupsMembers: {lower case group email: members} from getGroupsMembers; visited: the groups already added
+  def _addGroupUsersToUsers(group, domains, recursive, validRoles, groupsMembers, visited):
+    visited.add(group.lower())
+    result = groupsMembers.get(group.lower())
+    if result is None:
       _incrEntityDoesNotExist(Ent.GROUP)
       return
     for member in result:
@@ -3826,8 +5331,114 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
               continue
           entitySet.add(email)
           entityList.append(email)
-      elif recursive and member[u'type'] == u'GROUP':
-        _addGroupUsersToUsers(member[u'email'], domains, recursive)
+      elif recursive and member[u'type'] == u'GROUP' and member[u'email'].lower() not in visited:
+        _addGroupUsersToUsers(member[u'email'], domains, recursive, validRoles, groupsMembers, visited)
+
+  def _getOrgUnitPath(ou):
+    try:
+      return callGAPI(cd.orgunits(), u'get',
+                      throw_reasons=[GAPI.BAD_REQUEST, GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND, GAPI.BACKEND_ERROR,
+                                     GAPI.INVALID_CUSTOMER_ID, GAPI.LOGIN_REQUIRED],
+                      customerId=GC.Values[GC.CUSTOMER_ID], orgUnitPath=ou, fields=u'orgUnitPath')[u'orgUnitPath']
+    except (GAPI.badRequest, GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.backendError, GAPI.invalidCustomerId, GAPI.loginRequired):
+      return None
+
+  def _getOrgUnitItems(itemType, ous, directlyInOU):
+# Users in ou (and its children) or CrOS devices directly in ou of the org units being listed
+    def _getOrgUnitTaskItems(task):
+      j, ou, qualifier = task
+      printGettingAllEntityItemsForWhom(itemType, ou, qualifier=qualifier, entityType=Ent.ORGANIZATIONAL_UNIT)
+      try:
+        items = _listOrgUnitItems(cdThreads.Get(), itemType, ou, isSuspended, getPageMessageForWhom())
+      except (GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.invalidInput, GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+        return None
+      ouLower = orgUnits[j].lower()
+      items = [item for item, orgUnitPath in items if _orgUnitPathMatches(orgUnitPath, ouLower, directlyInOU)]
+      printGotEntityItemsForWhom(len(items))
+      return items
+
+    numOus = len(ous)
+    oneQualifier = [Msg.IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT)),
+                    Msg.DIRECTLY_IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT))][directlyInOU]
+    allQualifier = [Msg.IN_THE.format(Ent.Choose(Ent.ORGANIZATIONAL_UNIT, numOus)),
+                    Msg.DIRECTLY_IN_THE.format(Ent.Choose(Ent.ORGANIZATIONAL_UNIT, numOus))][directlyInOU]
+# The users of an org unit include those of its children; the CrOS devices of an org unit don't
+    childrenListed = itemType == Ent.USER
+    orgUnits = []
+    fullScan = GC.Values[GC.DIRECTORY_CACHE_MINUTES] > 0
+    if not fullScan and (numOus > 1 or not (childrenListed or directlyInOU)):
+      paths, ids = _getOrgUnitPathMaps(cd)
+      orgUnitsNotListed = paths is None
+    else:
+      paths = ids = None
+      orgUnitsNotListed = False
+    for ou in ous:
+      ou = makeOrgUnitPathAbsolute(ou)
+      if ou.startswith(u'id:'):
+        orgUnitPath = ids.get(ou) if ids is not None else None
+        if orgUnitPath is None:
+          orgUnitPath = _getOrgUnitPath(ou)
+      elif paths is not None:
+        orgUnitPath = paths.get(ou.lower())
+      elif orgUnitsNotListed:
+        orgUnitPath = _getOrgUnitPath(encodeOrgUnitPath(makeOrgUnitPathRelative(ou)))
+      else:
+        orgUnitPath = ou
+      if orgUnitPath is None:
+        checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, ou)
+        _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
+        continue
+      orgUnits.append(orgUnitPath)
+    if not orgUnits:
+      return
+# Without the list of org units, the children of the org units can't be listed individually
+    if orgUnitsNotListed and not (childrenListed or directlyInOU):
+      fullScan = True
+    if not fullScan and paths is not None:
+      selectedPaths = set()
+      for ou in orgUnits:
+        ouLower = ou.lower()
+        selectedPaths.update([path for path in paths if _orgUnitPathMatches(path, ouLower, directlyInOU)])
+      fullScan = len(selectedPaths) >= OU_FULL_SCAN_FRACTION*len(paths)
+    buckets = [[] for _ in orgUnits]
+    if not fullScan:
+      cdThreads = ThreadGAPIObjects(cd)
+      tasks = []
+      for j, ou in enumerate(orgUnits):
+        if childrenListed or directlyInOU:
+          tasks.append((j, ou, oneQualifier))
+        else:
+          ouLower = ou.lower()
+          directQualifier = Msg.DIRECTLY_IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT))
+          tasks.extend([(j, paths[path], directQualifier) for path in sorted(paths) if _orgUnitPathMatches(path, ouLower, False)])
+      for task, items in yieldThreadedCallsWithOutput(_getOrgUnitTaskItems, tasks, min(len(tasks), GC.Values[GC.NUM_API_THREADS])):
+        if items is None:
+          checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, task[1])
+          _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
+        else:
+          buckets[task[0]].extend(items)
+    else:
+      printGettingAllEntityItemsForWhom(itemType, u','.join(orgUnits), qualifier=allQualifier, entityType=Ent.ORGANIZATIONAL_UNIT)
+      ouIndexes = {}
+      for j, ou in enumerate(orgUnits):
+        ouIndexes.setdefault(ou.lower(), []).append(j)
+      for item, orgUnitPath in _listAllOrgUnitItems(cd, itemType, isSuspended, getPageMessageForWhom()):
+        orgUnitPath = orgUnitPath.lower()
+        while True:
+          for j in ouIndexes.get(orgUnitPath, []):
+            buckets[j].append(item)
+          if directlyInOU or orgUnitPath == u'/':
+            break
+          orgUnitPath = orgUnitPath[:orgUnitPath.rfind(u'/')] or u'/'
+# Org units not checked against the list of org units are checked if they are empty
+      if paths is None and not orgUnitsNotListed:
+        for j, ou in enumerate(orgUnits):
+          if not buckets[j] and not checkOrgUnitPathExists(cd, ou)[0]:
+            checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, ou)
+            _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
+      printGotEntityItemsForWhom(sum([len(bucket) for bucket in buckets]))
+    for bucket in buckets:
+      entityList.extend(bucket)
 
   entityError = {u'entityType': None, u'doesNotExist': 0, u'invalid': 0}
   entityList = []
@@ -3844,18 +5455,21 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
         _showInvalidEntity(Ent.USER, user)
   elif entityType == Cmd.ENTITY_ALL_USERS:
     cd = buildGAPIObject(API.DIRECTORY)
-    query = None if includeSuspendedInAll else u'isSuspended=False'
-    printGettingAllAccountEntities(Ent.USER)
-    try:
-      result = callGAPIpages(cd.users(), u'list', u'users',
-                             page_message=getPageMessage(),
-                             throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                             customer=GC.Values[GC.CUSTOMER_ID],
-                             query=query, orderBy=u'email', fields=u'nextPageToken,users(primaryEmail)',
-                             maxResults=GC.Values[GC.USER_MAX_RESULTS])
-    except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
-      accessErrorExit(cd)
-    entityList = [user[u'primaryEmail'] for user in result]
+    if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+      entityList = [user[0] for user in _getDirectoryCacheUsers(cd) if includeSuspendedInAll or not user[3]]
+    else:
+      query = None if includeSuspendedInAll else u'isSuspended=False'
+      printGettingAllAccountEntities(Ent.USER)
+      try:
+        result = callGAPIpages(cd.users(), u'list', u'users',
+                               page_message=getPageMessage(),
+                               throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                               customer=GC.Values[GC.CUSTOMER_ID],
+                               query=query, orderBy=u'email', fields=u'nextPageToken,users(primaryEmail)',
+                               maxResults=GC.Values[GC.USER_MAX_RESULTS])
+      except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+        accessErrorExit(cd)
+      entityList = [user[u'primaryEmail'] for user in result]
     printGotAccountEntities(len(entityList))
   elif entityType in [Cmd.ENTITY_GROUP, Cmd.ENTITY_GROUPS, Cmd.ENTITY_GROUP_NS, Cmd.ENTITY_GROUPS_NS, Cmd.ENTITY_GROUP_SUSP, Cmd.ENTITY_GROUPS_SUSP]:
     if entityType in [Cmd.ENTITY_GROUP_NS, Cmd.ENTITY_GROUPS_NS]:
@@ -3913,11 +5527,19 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
         missingArgumentExit(u'end')
     if rolesSet:
       memberRoles = u','.join(sorted(rolesSet))
+    validRoles, listRoles, listFields = _getRoleVerification(memberRoles, u'nextPageToken,members(email,type,status)')
+    validGroups = []
     for group in groups:
       if validateEmailAddressOrUID(group):
-        _addGroupUsersToUsers(normalizeEmailAddressOrUID(group), domains, recursive)
+        validGroups.append(normalizeEmailAddressOrUID(group))
       else:
         _showInvalidEntity(Ent.GROUP, group)
+    groupsMembers = {}
+    getGroupsMembers(cd, validGroups, memberRoles, listRoles, listFields, groupsMembers, recursive)
+    visited = set()
+    for group in validGroups:
+      if group.lower() not in visited:
+        _addGroupUsersToUsers(group, domains, recursive, validRoles, groupsMembers, visited)
   elif entityType in [Cmd.ENTITY_OU, Cmd.ENTITY_OUS, Cmd.ENTITY_OU_AND_CHILDREN, Cmd.ENTITY_OUS_AND_CHILDREN,
                       Cmd.ENTITY_OU_NS, Cmd.ENTITY_OUS_NS, Cmd.ENTITY_OU_AND_CHILDREN_NS, Cmd.ENTITY_OUS_AND_CHILDREN_NS,
                       Cmd.ENTITY_OU_SUSP, Cmd.ENTITY_OUS_SUSP, Cmd.ENTITY_OU_AND_CHILDREN_SUSP, Cmd.ENTITY_OUS_AND_CHILDREN_SUSP]:
@@ -3929,60 +5551,32 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
     ous = convertEntityToList(entity, shlexSplit=True, nonListEntityType=entityType in [Cmd.ENTITY_OU, Cmd.ENTITY_OU_AND_CHILDREN,
                                                                                         Cmd.ENTITY_OU_NS, Cmd.ENTITY_OU_AND_CHILDREN_NS,
                                                                                         Cmd.ENTITY_OU_SUSP, Cmd.ENTITY_OU_AND_CHILDREN_SUSP])
-    directlyInOU = entityType in [Cmd.ENTITY_OU, Cmd.ENTITY_OUS, Cmd.ENTITY_OU_NS, Cmd.ENTITY_OUS_NS, Cmd.ENTITY_OU_SUSP, Cmd.ENTITY_OUS_SUSP]
-    qualifier = [Msg.IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT)),
-                 Msg.DIRECTLY_IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT))][directlyInOU]
-    fields = u'nextPageToken,users(primaryEmail,orgUnitPath)' if directlyInOU else u'nextPageToken,users(primaryEmail)'
-    prevLen = 0
-    for ou in ous:
-      ou = makeOrgUnitPathAbsolute(ou)
-      try:
-        if ou.startswith(u'id:'):
-          ou = callGAPI(cd.orgunits(), u'get',
-                        throw_reasons=[GAPI.BAD_REQUEST, GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND, GAPI.BACKEND_ERROR,
-                                       GAPI.INVALID_CUSTOMER_ID, GAPI.LOGIN_REQUIRED],
-                        customerId=GC.Values[GC.CUSTOMER_ID], orgUnitPath=ou, fields=u'orgUnitPath')[u'orgUnitPath']
-        printGettingAllEntityItemsForWhom(Ent.USER, ou, qualifier=qualifier, entityType=Ent.ORGANIZATIONAL_UNIT)
-        result = callGAPIpages(cd.users(), u'list', u'users',
-                               page_message=getPageMessageForWhom(),
-                               throw_reasons=[GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND,
-                                              GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                               customer=GC.Values[GC.CUSTOMER_ID], query=orgUnitPathQuery(ou, isSuspended), orderBy=u'email',
-                               fields=fields, maxResults=GC.Values[GC.USER_MAX_RESULTS])
-      except (GAPI.badRequest, GAPI.invalidInput, GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.backendError,
-              GAPI.invalidCustomerId, GAPI.loginRequired, GAPI.resourceNotFound, GAPI.forbidden):
-        checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, ou)
-        _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
-        continue
-      if directlyInOU:
-        ou = ou.lower()
-        for user in result:
-          if ou == user.get(u'orgUnitPath', u'').lower():
-            entityList.append(user[u'primaryEmail'])
-      else:
-        entityList.extend([user[u'primaryEmail'] for user in result])
-      totalLen = len(entityList)
-      printGotEntityItemsForWhom(totalLen-prevLen)
-      prevLen = totalLen
+    _getOrgUnitItems(Ent.USER, ous,
+                     entityType in [Cmd.ENTITY_OU, Cmd.ENTITY_OUS, Cmd.ENTITY_OU_NS, Cmd.ENTITY_OUS_NS, Cmd.ENTITY_OU_SUSP, Cmd.ENTITY_OUS_SUSP])
   elif entityType in [Cmd.ENTITY_QUERY, Cmd.ENTITY_QUERIES]:
     cd = buildGAPIObject(API.DIRECTORY)
     queries = convertEntityToList(entity, shlexSplit=True, nonListEntityType=entityType == Cmd.ENTITY_QUERY)
     prevLen = 0
     for query in queries:
       printGettingAllAccountEntities(Ent.USER, query)
-      try:
-        result = callGAPIpages(cd.users(), u'list', u'users',
-                               page_message=getPageMessage(),
-                               throw_reasons=[GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND,
-                                              GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                               customer=GC.Values[GC.CUSTOMER_ID], query=query, orderBy=u'email',
-                               fields=u'nextPageToken,users(primaryEmail,suspended)',
-                               maxResults=GC.Values[GC.USER_MAX_RESULTS])
-      except (GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.invalidInput):
-        Cmd.Backup()
-        usageErrorExit(Msg.INVALID_QUERY)
-      except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
-        accessErrorExit(cd)
+      result = _getDirectoryCacheEntry(DIRECTORY_CACHE_USER_QUERIES, query) if GC.Values[GC.DIRECTORY_CACHE_MINUTES] else None
+      if result is None:
+        fetchTime = time.time()
+        try:
+          result = callGAPIpages(cd.users(), u'list', u'users',
+                                 page_message=getPageMessage(),
+                                 throw_reasons=[GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND,
+                                                GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                                 customer=GC.Values[GC.CUSTOMER_ID], query=query, orderBy=u'email',
+                                 fields=u'nextPageToken,users(primaryEmail,suspended)',
+                                 maxResults=GC.Values[GC.USER_MAX_RESULTS])
+        except (GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.invalidInput):
+          Cmd.Backup()
+          usageErrorExit(Msg.INVALID_QUERY)
+        except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+          accessErrorExit(cd)
+        if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+          _setDirectoryCacheEntry(DIRECTORY_CACHE_USER_QUERIES, result, fetchTime, query)
       for user in result:
         email = user[u'primaryEmail']
         if (isSuspended is None or isSuspended == user[u'suspended']) and email not in entitySet:
@@ -4037,17 +5631,20 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
         entityList.append(deviceId)
   elif entityType == Cmd.ENTITY_ALL_CROS:
     cd = buildGAPIObject(API.DIRECTORY)
-    printGettingAllAccountEntities(Ent.CROS_DEVICE)
-    try:
-      result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
-                             page_message=getPageMessage(),
-                             throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                             customerId=GC.Values[GC.CUSTOMER_ID],
-                             fields=u'nextPageToken,chromeosdevices(deviceId)',
-                             maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
-    except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
-      accessErrorExit(cd)
-    entityList = [device[u'deviceId'] for device in result]
+    if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+      entityList = [device[0] for device in _getDirectoryCacheCrOSDevices(cd)]
+    else:
+      printGettingAllAccountEntities(Ent.CROS_DEVICE)
+      try:
+        result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
+                               page_message=getPageMessage(),
+                               throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                               customerId=GC.Values[GC.CUSTOMER_ID],
+                               fields=u'nextPageToken,chromeosdevices(deviceId)',
+                               maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
+      except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+        accessErrorExit(cd)
+      entityList = [device[u'deviceId'] for device in result]
   elif entityType in [Cmd.ENTITY_CROS_QUERY, Cmd.ENTITY_CROS_QUERIES, Cmd.ENTITY_CROS_SN]:
     cd = buildGAPIObject(API.DIRECTORY)
     queries = convertEntityToList(entity, shlexSplit=entityType == Cmd.ENTITY_CROS_QUERIES,
@@ -4057,18 +5654,23 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
     prevLen = 0
     for query in queries:
       printGettingAllAccountEntities(Ent.CROS_DEVICE, query)
-      try:
-        result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
-                               page_message=getPageMessage(),
-                               throw_reasons=[GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                               customerId=GC.Values[GC.CUSTOMER_ID], query=query,
-                               fields=u'nextPageToken,chromeosdevices(deviceId)',
-                               maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
-      except GAPI.invalidInput:
-        Cmd.Backup()
-        usageErrorExit(Msg.INVALID_QUERY)
-      except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
-        accessErrorExit(cd)
+      result = _getDirectoryCacheEntry(DIRECTORY_CACHE_CROS_QUERIES, query) if GC.Values[GC.DIRECTORY_CACHE_MINUTES] else None
+      if result is None:
+        fetchTime = time.time()
+        try:
+          result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
+                                 page_message=getPageMessage(),
+                                 throw_reasons=[GAPI.INVALID_INPUT, GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
+                                 customerId=GC.Values[GC.CUSTOMER_ID], query=query,
+                                 fields=u'nextPageToken,chromeosdevices(deviceId)',
+                                 maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
+        except GAPI.invalidInput:
+          Cmd.Backup()
+          usageErrorExit(Msg.INVALID_QUERY)
+        except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
+          accessErrorExit(cd)
+        if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+          _setDirectoryCacheEntry(DIRECTORY_CACHE_CROS_QUERIES, result, fetchTime, query)
       for device in result:
         deviceId = device[u'deviceId']
         if deviceId not in entitySet:
@@ -4080,63 +5682,7 @@ def getUsersToModify(entityType, entity, memberRoles=None, isSuspended=None, inc
   elif entityType in [Cmd.ENTITY_CROS_OU, Cmd.ENTITY_CROS_OU_AND_CHILDREN, Cmd.ENTITY_CROS_OUS, Cmd.ENTITY_CROS_OUS_AND_CHILDREN]:
     cd = buildGAPIObject(API.DIRECTORY)
     ous = convertEntityToList(entity, shlexSplit=True, nonListEntityType=entityType in [Cmd.ENTITY_CROS_OU, Cmd.ENTITY_CROS_OU_AND_CHILDREN])
-    directlyInOU = entityType in [Cmd.ENTITY_CROS_OU, Cmd.ENTITY_CROS_OUS]
-    numOus = len(ous)
-    allQualifier = [Msg.IN_THE.format(Ent.Choose(Ent.ORGANIZATIONAL_UNIT, numOus)),
-                    Msg.DIRECTLY_IN_THE.format(Ent.Choose(Ent.ORGANIZATIONAL_UNIT, numOus))][directlyInOU]
-    if entityType in [Cmd.ENTITY_CROS_OU, Cmd.ENTITY_CROS_OUS]:
-      oneQualifier = [Msg.IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT)),
-                      Msg.DIRECTLY_IN_THE.format(Ent.Singular(Ent.ORGANIZATIONAL_UNIT))][directlyInOU]
-      for ou in ous:
-        ou = makeOrgUnitPathAbsolute(ou)
-        printGettingAllEntityItemsForWhom(Ent.CROS_DEVICE, ou, qualifier=oneQualifier, entityType=Ent.ORGANIZATIONAL_UNIT)
-        try:
-          result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
-                                 page_message=getPageMessage(),
-                                 throw_reasons=[GAPI.BAD_REQUEST, GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                                 customerId=GC.Values[GC.CUSTOMER_ID], orgUnitPath=ou,
-                                 fields=u'nextPageToken,chromeosdevices(deviceId)',
-                                 maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
-        except (GAPI.badRequest, GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.resourceNotFound, GAPI.forbidden):
-          checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, ou)
-          _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
-          continue
-        entityList.extend([device[u'deviceId'] for device in result])
-      Ent.SetGettingQualifier(Ent.CROS_DEVICE, allQualifier)
-      Ent.SetGettingForWhom(u','.join(ous))
-      printGotEntityItemsForWhom(len(entityList))
-    else:
-      ouSet = set()
-      for ou in ous:
-        ou = makeOrgUnitPathAbsolute(ou)
-        try:
-          result = callGAPI(cd.orgunits(), u'get',
-                            throw_reasons=[GAPI.BAD_REQUEST, GAPI.INVALID_ORGUNIT, GAPI.ORGUNIT_NOT_FOUND, GAPI.BACKEND_ERROR, GAPI.INVALID_CUSTOMER_ID, GAPI.LOGIN_REQUIRED],
-                            customerId=GC.Values[GC.CUSTOMER_ID], orgUnitPath=encodeOrgUnitPath(makeOrgUnitPathRelative(ou)), fields=u'orgUnitPath')
-        except (GAPI.badRequest, GAPI.invalidOrgunit, GAPI.orgunitNotFound, GAPI.backendError, GAPI.invalidCustomerId, GAPI.loginRequired, GAPI.resourceNotFound, GAPI.forbidden):
-          checkEntityDNEorAccessErrorExit(cd, Ent.ORGANIZATIONAL_UNIT, ou)
-          _incrEntityDoesNotExist(Ent.ORGANIZATIONAL_UNIT)
-          continue
-        ouSet.add(result[u'orgUnitPath'].lower())
-      if entityError[u'doesNotExist'] == 0:
-        qualifier = Msg.IN_THE.format(Ent.Choose(Ent.ORGANIZATIONAL_UNIT, len(ous)))
-        printGettingAllEntityItemsForWhom(Ent.CROS_DEVICE, u','.join(ous), qualifier=allQualifier, entityType=Ent.ORGANIZATIONAL_UNIT)
-        try:
-          result = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices',
-                                 page_message=getPageMessage(),
-                                 throw_reasons=[GAPI.BAD_REQUEST, GAPI.RESOURCE_NOT_FOUND, GAPI.FORBIDDEN],
-                                 customerId=GC.Values[GC.CUSTOMER_ID],
-                                 fields=u'nextPageToken,chromeosdevices(deviceId,orgUnitPath)',
-                                 maxResults=GC.Values[GC.DEVICE_MAX_RESULTS])
-        except (GAPI.badRequest, GAPI.resourceNotFound, GAPI.forbidden):
-          accessErrorExit(cd)
-        for device in result:
-          deviceOu = device[u'orgUnitPath'].lower()
-          for ou in ouSet:
-            if deviceOu.startswith(ou):
-              entityList.append(device[u'deviceId'])
-              break
-        printGotEntityItemsForWhom(len(entityList))
+    _getOrgUnitItems(Ent.CROS_DEVICE, ous, entityType in [Cmd.ENTITY_CROS_OU, Cmd.ENTITY_CROS_OUS])
   else:
     systemErrorExit(UNKNOWN_ERROR_RC, u'getUsersToModify coding error')
   if entityError[u'doesNotExist'] > 0:
@@ -4588,6 +6134,8 @@ def getTodriveParameters():
     else:
       Cmd.Backup()
       break
+  if GM.Globals[GM.CSVFILE].get(GM.REDIRECT_STREAMING_COLUMNS):
+    usageErrorExit(Msg.TODRIVE_NOT_SUPPORTED_WITH_STREAMING_COLUMNS)
   if not todrive[u'user']:
     todrive[u'user'] = _getValueFromOAuth(u'email')
   user = checkUserExists(buildGAPIObject(API.DIRECTORY), todrive[u'user'])
@@ -4822,9 +6370,140 @@ def convertToNativeTitles(fieldsTitles, titles, nativeTitles):
   titles[u'set'] = set(nativeTitles)
   titles[u'list'] = nativeTitles
 
+# redirect csv <FileName> streaming
+# Rows are pickled to a temporary file as they are generated rather than being held in memory;
+# they are read back one at a time when the CSV file is written.
+# Iterating over or sorting the rows reads them back into memory so that commands can post-process them.
+# redirect csv <FileName> streaming columns <FieldNameList>
+# The column titles are fixed; rows are written to the CSV file as they are generated, extra fields are ignored.
+# The rows can not be sorted or post-processed.
+class CSVRowSpool(object):
+  CHUNK_SIZE = 1000
+
+  def __init__(self, columns=None):
+    self.count = 0
+    self.rows = None
+    self.spoolFile = None
+    self.columns = columns
+    self.csvFile = None
+    self.writer = None
+    self.closeOnEnd = False
+    self.postProcessWarned = False
+
+  def __len__(self):
+    if self.rows is not None:
+      return len(self.rows)
+    return self.count
+
+  def __nonzero__(self):
+    return len(self) > 0
+
+  def _openWriter(self):
+    csvFileInfo = GM.Globals[GM.CSVFILE]
+    if csvFileInfo[GM.REDIRECT_NAME] == u'-' and GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD]:
+      self.csvFile = GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD]
+      lineterminator = '\n'
+    else:
+      if csvFileInfo[GM.REDIRECT_NAME] == u'-':
+        csvFileInfo[GM.REDIRECT_NAME] = GM.Globals[GM.STDOUT][GM.REDIRECT_NAME]
+      self.csvFile = openFile(csvFileInfo[GM.REDIRECT_NAME], csvFileInfo[GM.REDIRECT_MODE])
+      self.closeOnEnd = self.csvFile not in [sys.stdout, sys.stderr]
+      lineterminator = str(GC.Values[GC.CSV_OUTPUT_LINE_TERMINATOR])
+    self.writer = UnicodeDictWriter(self.csvFile, self.columns, csvFileInfo[GM.REDIRECT_ENCODING],
+                                    quoting=csv.QUOTE_MINIMAL, quotechar=str(csvFileInfo[GM.REDIRECT_QUOTE_CHAR]),
+                                    delimiter=str(csvFileInfo[GM.REDIRECT_COLUMN_DELIMITER]), lineterminator=lineterminator)
+# UnicodeDictWriter passes its keyword arguments to csv.writer which doesn't accept extrasaction
+    self.writer.extrasaction = u'ignore'
+    if csvFileInfo[GM.REDIRECT_WRITE_HEADER]:
+      self.writer.writerow(dict((item, item) for item in self.columns))
+
+  def append(self, row):
+    if self.rows is not None:
+      self.rows.append(row)
+      return
+    self.count += 1
+    if self.columns is not None:
+      if self.writer is None:
+        self._openWriter()
+      try:
+        self.writer.writerow(row)
+      except IOError as e:
+        systemErrorExit(FILE_ERROR_RC, e)
+      return
+    if self.spoolFile is None:
+      self.spoolFile = TemporaryFile()
+    cPickle.dump(row, self.spoolFile, cPickle.HIGHEST_PROTOCOL)
+
+  def extend(self, rows):
+    for row in rows:
+      self.append(row)
+
+# Generator of the rows in the order they were added
+  def Rows(self):
+    if self.rows is not None:
+      for row in self.rows:
+        yield row
+      return
+    if self.spoolFile is None:
+      return
+    self.spoolFile.seek(0)
+    try:
+      while True:
+        yield cPickle.load(self.spoolFile)
+    except EOFError:
+      pass
+    self.spoolFile.seek(0, os.SEEK_END)
+
+# Lists of at most CHUNK_SIZE rows
+  def Chunks(self):
+    chunk = []
+    for row in self.Rows():
+      chunk.append(row)
+      if len(chunk) == self.CHUNK_SIZE:
+        yield chunk
+        chunk = []
+    if chunk:
+      yield chunk
+
+  def _loadRows(self):
+    if self.columns is not None:
+      if not self.postProcessWarned:
+        stderrWarningMsg(Msg.STREAMING_COLUMNS_ROWS_NOT_POST_PROCESSED)
+        self.postProcessWarned = True
+      return False
+    if self.rows is None:
+      self.rows = list(self.Rows())
+      if self.spoolFile is not None:
+        self.spoolFile.close()
+        self.spoolFile = None
+    return True
+
+  def __iter__(self):
+    if not self._loadRows():
+      return iter([])
+    return iter(self.rows)
+
+  def sort(self, **kwargs):
+    if self._loadRows():
+      self.rows.sort(**kwargs)
+
+# Returns True if the rows were written directly to the CSV file
+  def Close(self):
+    if self.columns is None:
+      return False
+    if self.writer is None:
+      self._openWriter()
+    if self.closeOnEnd:
+      closeFile(self.csvFile)
+    self.csvFile = self.writer = None
+    return True
+
 def initializeTitlesCSVfile(baseTitles):
   titles = {u'set': set(), u'list': []}
-  csvRows = []
+  if GM.Globals[GM.CSVFILE].get(GM.REDIRECT_STREAMING):
+    csvRows = CSVRowSpool(GM.Globals[GM.CSVFILE][GM.REDIRECT_STREAMING_COLUMNS])
+  else:
+    csvRows = []
   if baseTitles is not None:
     addTitlesToCSVfile(baseTitles, titles)
   return (titles, csvRows)
@@ -4845,7 +6524,12 @@ def writeCSVfile(csvRows, titles, list_type, todrive, sortTitles=None, quotechar
     try:
       if GM.Globals[GM.CSVFILE][GM.REDIRECT_WRITE_HEADER]:
         writer.writerow(dict((item, item) for item in writer.fieldnames))
-      writer.writerows(csvRows)
+      if not isinstance(csvRows, CSVRowSpool):
+        writer.writerows(csvRows)
+      else:
+# csv.DictWriter.writerows builds a list of all of the rows, write them one at a time
+        for row in csvRows.Rows():
+          writer.writerow(row)
       return True
     except IOError as e:
       stderrErrorMsg(e)
@@ -4874,10 +6558,16 @@ def writeCSVfile(csvRows, titles, list_type, todrive, sortTitles=None, quotechar
       closeFile(csvFile)
 
   def writeCSVToDrive():
-    csvFile = StringIOobject()
-    writer = csv.DictWriter(csvFile, titles[u'list'],
-                            quoting=csv.QUOTE_MINIMAL, quotechar=quotechar,
-                            delimiter=delimiter, lineterminator='\n')
+    if not isinstance(csvRows, CSVRowSpool):
+      csvFile = StringIOobject()
+      writer = csv.DictWriter(csvFile, titles[u'list'],
+                              quoting=csv.QUOTE_MINIMAL, quotechar=quotechar,
+                              delimiter=delimiter, lineterminator='\n')
+    else:
+      csvFile = TemporaryFile()
+      writer = UnicodeDictWriter(csvFile, titles[u'list'], UTF8,
+                                 quoting=csv.QUOTE_MINIMAL, quotechar=quotechar,
+                                 delimiter=delimiter, lineterminator='\n')
     if writeCSVData(writer):
       title = todrive[u'title'] or u'{0} - {1}'.format(GC.Values[GC.DOMAIN], list_type)
       if todrive[u'timestamp']:
@@ -4953,7 +6643,16 @@ def writeCSVfile(csvRows, titles, list_type, todrive, sortTitles=None, quotechar
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_SORTTITLES, sortTitles))
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_QUOTECHAR, quotechar))
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_FIXPATHS, fixPaths))
-    GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_DATA, csvRows))
+    if not isinstance(csvRows, CSVRowSpool):
+      for i in range(0, len(csvRows), CSVRowSpool.CHUNK_SIZE):
+        GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_DATA, csvRows[i:i+CSVRowSpool.CHUNK_SIZE]))
+    else:
+      for chunk in csvRows.Chunks():
+        GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE].put((GM.REDIRECT_QUEUE_DATA, chunk))
+    return
+  if isinstance(csvRows, CSVRowSpool) and csvRows.Close():
+    if GM.Globals[GM.CSVFILE][GM.REDIRECT_MODE] == DEFAULT_FILE_APPEND_MODE:
+      GM.Globals[GM.CSVFILE][GM.REDIRECT_WRITE_HEADER] = False
     return
   if sortTitles is not None:
     sortCSVTitles(sortTitles, titles)
@@ -5191,14 +6890,18 @@ def resetDefaultEncodingToUTF8():
     if hasattr(sys, u'setdefaultencoding'):
       sys.setdefaultencoding(UTF8)
 
-def CSVFileQueueHandler(mpQueue, mpQueueStderr):
+def CSVFileQueueHandler(mpQueue, mpQueueStderr, gmGlobals, gcValues):
   global Cmd
   resetDefaultEncodingToUTF8()
   if sys.platform.startswith(u'win'):
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    GM.Globals = gmGlobals.copy()
+    GC.Values = gcValues.copy()
   if GM.Globals[GM.WINDOWS]:
     Cmd = glclargs.GamCLArgs()
-  titles, csvRows = initializeTitlesCSVfile(None)
+  titles, _ = initializeTitlesCSVfile(None)
+# Rows are spooled to disk or written to the CSV file as they arrive rather than being held in memory
+  csvRows = CSVRowSpool(GM.Globals[GM.CSVFILE].get(GM.REDIRECT_STREAMING_COLUMNS))
   list_type = u'CSV'
   todrive = {}
   quotechar = sortTitles = None
@@ -5238,11 +6941,10 @@ def CSVFileQueueHandler(mpQueue, mpQueueStderr):
   if mpQueueStderr is not None:
     mpQueueStderr.put((0, GM.REDIRECT_QUEUE_DATA, GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD].getvalue()))
 
-def initializeCSVFileQueueHandler(mpQueueStderr):
-  mpQueue = multiprocessing.Manager().Queue()
-  mpQueueHandler = multiprocessing.Process(target=CSVFileQueueHandler, args=(mpQueue, mpQueueStderr))
+def initializeCSVFileQueueHandler(mpQueue, mpQueueStderr, gmGlobals, gcValues):
+  mpQueueHandler = multiprocessing.Process(target=CSVFileQueueHandler, args=(mpQueue, mpQueueStderr, gmGlobals, gcValues))
   mpQueueHandler.start()
-  return (mpQueue, mpQueueHandler)
+  return mpQueueHandler
 
 def terminateCSVFileQueueHandler(mpQueue, mpQueueHandler):
   GM.Globals[GM.PARSER] = None
@@ -5323,34 +7025,72 @@ def StdQueueHandler(mpQueue, stdtype, gmGlobals, gcValues):
       pass
   GM.Globals[stdtype][GM.REDIRECT_FD] = None
 
-def initializeStdQueueHandler(stdtype, gmGlobals, gcValues):
-  mpQueue = multiprocessing.Manager().Queue()
+def initializeStdQueueHandler(mpQueue, stdtype, gmGlobals, gcValues):
   mpQueueHandler = multiprocessing.Process(target=StdQueueHandler, args=(mpQueue, stdtype, gmGlobals, gcValues))
   mpQueueHandler.start()
-  return (mpQueue, mpQueueHandler)
+  return mpQueueHandler
 
 def terminateStdQueueHandler(mpQueue, mpQueueHandler):
   mpQueue.put((0, GM.REDIRECT_QUEUE_EOF, None))
   mpQueueHandler.join()
 
-def ProcessGAMCommandMulti(pid, mpQueueCSVFile, mpQueueStdout, mpQueueStderr, gmGlobals, args):
-  resetDefaultEncodingToUTF8()
-  initializeLogging()
-  if sys.platform.startswith(u'win'):
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
-    GM.Globals = gmGlobals.copy()
+# The GM.Globals settings from gam.cfg and the credentials and discovery documents that a pool process
+# carries from command to command; all other values start from those of the gam batch/csv command
+POOL_WORKER_SHARED_GLOBALS = [
+  GM.ADMIN, GM.CACHE_DIR, GM.CACHE_DISCOVERY_ONLY, GM.CONVERT_TO_LOCAL_TIME,
+  GM.CURRENT_API_SERVICES, GM.CURRENT_CLIENT_API, GM.CURRENT_CLIENT_API_SCOPES,
+  GM.CURRENT_SVCACCT_API, GM.CURRENT_SVCACCT_API_SCOPES, GM.CURRENT_SVCACCT_USER,
+  GM.EXTRA_ARGS_LIST, GM.GAM_CFG_FILE, GM.GAM_CFG_PATH, GM.LAST_UPDATE_CHECK_TXT,
+  GM.OAUTH2_CLIENT_ID, GM.OAUTH2_TXT_LOCK, GM.OAUTH2SERVICE_CLIENT_ID, GM.OAUTH2SERVICE_JSON_DATA,
+  GM.PARSER, GM.SVCACCT_TOKEN_BATCH_DIR, GM.SVCACCT_TOKEN_DIR,
+  ]
+
+# Each command gets its own copy of the maps and other containers so that a command doesn't see
+# the values set by a previous command, e.g., in the same chunk
+def _copyPoolCommandGlobals(gmGlobals):
+  cmdGlobals = gmGlobals.copy()
+  for key in list(cmdGlobals):
+    if isinstance(cmdGlobals[key], (dict, list, set)):
+      cmdGlobals[key] = copy.copy(cmdGlobals[key])
+  return cmdGlobals
+
+# A pool process processes gam.cfg for its first command and saves the resulting settings; its subsequent commands
+# reuse them along with the credentials, discovery documents and HTTP objects loaded by earlier commands.
+# A command that starts with select/config/redirect processes gam.cfg starting from the settings of the gam batch/csv command;
+# the following command processes gam.cfg again so that it isn't affected by the select/config/redirect.
+def ProcessGAMCommandMulti(pid, gmGlobals, args):
+  mpQueueCSVFile = PoolQueues[GM.CSVFILE]
+  mpQueueStdout = PoolQueues[GM.STDOUT]
+  mpQueueStderr = PoolQueues[GM.STDERR]
+  metaCommand = (len(args) > 1) and (args[1].lower() in Cmd.GAM_META_COMMANDS)
+  processGamCfg = metaCommand or not PoolWorkerState or gmGlobals[GM.SAVED_STDOUT] is not None
+  if processGamCfg:
+    PoolWorkerState.clear()
+    resetDefaultEncodingToUTF8()
+    initializeLogging()
+    if sys.platform.startswith(u'win'):
+      signal.signal(signal.SIGINT, signal.SIG_IGN)
+    GM.Globals = _copyPoolCommandGlobals(gmGlobals)
+  else:
+    GM.Globals = _copyPoolCommandGlobals(gmGlobals)
+    for key in POOL_WORKER_SHARED_GLOBALS:
+      GM.Globals[key] = PoolWorkerState[u'globals'][key]
+    GC.Values = PoolWorkerState[u'values'].copy()
+    GM.Globals[GM.DATETIME_NOW] = datetime.datetime.now(GC.Values[GC.TIMEZONE])
   GM.Globals[GM.PID] = pid
   GM.Globals[GM.CSVFILE] = {}
   if mpQueueCSVFile:
     GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE] = mpQueueCSVFile
+  elif not processGamCfg:
+    GM.Globals[GM.CSVFILE] = PoolWorkerState[GM.CSVFILE].copy()
   if mpQueueStdout:
     GM.Globals[GM.STDOUT] = {GM.REDIRECT_NAME: u'', GM.REDIRECT_FD: None, GM.REDIRECT_MULTI_FD: StringIOobject()}
     if GM.Globals[GM.SAVED_STDOUT] is not None:
-      GM.Globals[GM.SAVED_STDOUT] = sys.stdout
-      sys.stdout = GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD]
+      GM.Globals[GM.SAVED_STDOUT] = getSysStdout()
+      setSysStdout(GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD])
     mpQueueStdout.put((pid, GM.REDIRECT_QUEUE_START, args))
   else:
-    GM.Globals[GM.STDOUT] = {}
+    GM.Globals[GM.STDOUT] = {} if processGamCfg else PoolWorkerState[GM.STDOUT].copy()
   if mpQueueStderr:
     if mpQueueStderr is not mpQueueStdout:
       GM.Globals[GM.STDERR] = {GM.REDIRECT_NAME: u'', GM.REDIRECT_FD: None, GM.REDIRECT_MULTI_FD: StringIOobject()}
@@ -5358,8 +7098,15 @@ def ProcessGAMCommandMulti(pid, mpQueueCSVFile, mpQueueStdout, mpQueueStderr, gm
     else:
       GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD] = GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD]
   else:
-    GM.Globals[GM.STDERR] = {}
-  sysRC = ProcessGAMCommand(args)
+    GM.Globals[GM.STDERR] = {} if processGamCfg else PoolWorkerState[GM.STDERR].copy()
+  sysRC = ProcessGAMCommand(args, processGamCfg=processGamCfg)
+  if processGamCfg and not metaCommand:
+    PoolWorkerState.update({u'globals': dict((key, GM.Globals[key]) for key in POOL_WORKER_SHARED_GLOBALS), u'values': GC.Values.copy(),
+                            GM.CSVFILE: GM.Globals[GM.CSVFILE].copy(), GM.STDOUT: GM.Globals[GM.STDOUT].copy(), GM.STDERR: GM.Globals[GM.STDERR].copy()})
+  elif not processGamCfg:
+# Credentials loaded by this command are available to the following commands
+    for key in POOL_WORKER_SHARED_GLOBALS:
+      PoolWorkerState[u'globals'][key] = GM.Globals[key]
   if mpQueueStdout:
     mpQueueStdout.put((pid, GM.REDIRECT_QUEUE_END, [sysRC, GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD].getvalue()]))
     GM.Globals[GM.STDOUT][GM.REDIRECT_MULTI_FD].close()
@@ -5369,6 +7116,10 @@ def ProcessGAMCommandMulti(pid, mpQueueCSVFile, mpQueueStdout, mpQueueStderr, gm
     GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD].close()
     GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD] = None
 
+def ProcessGAMCommandMultiChunk(chunk, gmGlobals):
+  for pid, args in chunk:
+    ProcessGAMCommandMulti(pid, gmGlobals, args)
+
 def batchWriteStderr(data):
   fd = GM.Globals[GM.STDERR].get(GM.REDIRECT_MULTI_FD, sys.stderr)
   if not GM.Globals[GM.STDERR].get(GM.REDIRECT_STD, False):
@@ -5388,56 +7139,104 @@ PROCESS_PLURAL_SINGULAR = [Msg.PROCESSES, Msg.PROCESS]
 THREAD_PLURAL_SINGULAR = [Msg.THREADS, Msg.THREAD]
 
 def MultiprocessGAMCommands(items, logCmds):
+
+# Completion callbacks wake the dispatcher as soon as a process is free; the timeout covers
+# commands that raise an exception as the callback is not called for them
+  def _waitForPoolProcesses(maxProcessesInUse):
+    with poolProcessCompleted:
+      while True:
+        for ppid in list(poolProcessResults):
+          try:
+            if poolProcessResults[ppid].ready():
+              del poolProcessResults[ppid]
+          except (TypeError, IOError):
+            pass
+        if len(poolProcessResults) <= maxProcessesInUse:
+          return
+        poolProcessCompleted.wait(1.0)
+
+  def _poolProcessCallback(_):
+    with poolProcessCompleted:
+      poolProcessCompleted.notify()
+
+# gam.cfg batch_chunk_size > 1 sends several commands to a process in one task
+  def _dispatchChunk():
+    if not chunk:
+      return
+    if len(chunk) == 1:
+      poolProcessResults[chunk[0][0]] = pool.apply_async(ProcessGAMCommandMulti, [chunk[0][0], GM.Globals, chunk[0][1]],
+                                                         callback=_poolProcessCallback)
+    else:
+      poolProcessResults[chunk[0][0]] = pool.apply_async(ProcessGAMCommandMultiChunk, [list(chunk), GM.Globals],
+                                                         callback=_poolProcessCallback)
+    del chunk[:]
+    _waitForPoolProcesses(numPoolProcesses-1)
+
   if not items:
     return
+  poolProcessCompleted = threading.Condition()
   numPoolProcesses = min(len(items), GC.Values[GC.NUM_THREADS])
-  origSigintHandler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+# signal can only be called from the main thread
+  mainThread = isMainThread()
+  if mainThread:
+    origSigintHandler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+  if not GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR]:
+    try:
+      GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR] = mkdtemp(prefix=u'gamtokens')
+      removeSvcAcctTokenBatchDir = True
+# The directory is also removed at exit in case the batch ends with an error exit
+      atexit.register(shutil.rmtree, GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR], ignore_errors=True)
+    except (IOError, OSError):
+      removeSvcAcctTokenBatchDir = False
+  else:
+    removeSvcAcctTokenBatchDir = False
+  if not GC.Values[GC.SVCACCT_TOKEN_CACHE]:
+    GM.Globals[GM.SVCACCT_TOKEN_DIR] = GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR]
+# The queues are created before the pool so that they are inherited by the pool processes
+  mpQueueStdout = multiprocessing.Queue() if GM.Globals[GM.STDOUT][GM.REDIRECT_MULTIPROCESS] else None
+  if GM.Globals[GM.STDERR][GM.REDIRECT_MULTIPROCESS]:
+    mpQueueStderr = multiprocessing.Queue() if GM.Globals[GM.STDERR][GM.REDIRECT_NAME] != u'stdout' else mpQueueStdout
+  else:
+    mpQueueStderr = None
+  mpQueueCSVFile = multiprocessing.Queue() if GM.Globals[GM.CSVFILE][GM.REDIRECT_MULTIPROCESS] else None
+  if GC.Values[GC.API_CALLS_RATE_CHECK]:
+    RateLimit.Share()
+    rateLimitState = RateLimit.SharedState()
+  else:
+    rateLimitState = None
   try:
-    pool = multiprocessing.Pool(processes=numPoolProcesses)
+    pool = multiprocessing.Pool(processes=numPoolProcesses, initializer=initializeMultiprocessPoolProcess,
+                                initargs=({GM.CSVFILE: mpQueueCSVFile, GM.STDOUT: mpQueueStdout, GM.STDERR: mpQueueStderr}, rateLimitState))
   except IOError as e:
     systemErrorExit(FILE_ERROR_RC, e)
   except AssertionError as e:
     Cmd.SetLocation(0)
     usageErrorExit(str(e))
-  if GM.Globals[GM.STDOUT][GM.REDIRECT_MULTIPROCESS]:
-    mpQueueStdout, mpQueueHandlerStdout = initializeStdQueueHandler(GM.STDOUT, GM.Globals, GC.Values)
+  if mpQueueStdout:
+    mpQueueHandlerStdout = initializeStdQueueHandler(mpQueueStdout, GM.STDOUT, GM.Globals, GC.Values)
     mpQueueStdout.put((0, GM.REDIRECT_QUEUE_START, Cmd.AllArguments()))
-  else:
-    mpQueueStdout = None
-  if GM.Globals[GM.STDERR][GM.REDIRECT_MULTIPROCESS]:
-    if GM.Globals[GM.STDERR][GM.REDIRECT_NAME] != u'stdout':
-      mpQueueStderr, mpQueueHandlerStderr = initializeStdQueueHandler(GM.STDERR, GM.Globals, GC.Values)
-      mpQueueStderr.put((0, GM.REDIRECT_QUEUE_START, Cmd.AllArguments()))
-    else:
-      mpQueueStderr = mpQueueStdout
-  else:
-    mpQueueStderr = None
-  if GM.Globals[GM.CSVFILE][GM.REDIRECT_MULTIPROCESS]:
-    mpQueueCSVFile, mpQueueHandlerCSVFile = initializeCSVFileQueueHandler(mpQueueStderr)
-  else:
-    mpQueueCSVFile = None
-  signal.signal(signal.SIGINT, origSigintHandler)
+  if mpQueueStderr and mpQueueStderr is not mpQueueStdout:
+    mpQueueHandlerStderr = initializeStdQueueHandler(mpQueueStderr, GM.STDERR, GM.Globals, GC.Values)
+    mpQueueStderr.put((0, GM.REDIRECT_QUEUE_START, Cmd.AllArguments()))
+  if mpQueueCSVFile:
+    mpQueueHandlerCSVFile = initializeCSVFileQueueHandler(mpQueueCSVFile, mpQueueStderr, GM.Globals, GC.Values)
+  if mainThread:
+    signal.signal(signal.SIGINT, origSigintHandler)
   batchWriteStderr(Msg.USING_N_PROCESSES.format(numPoolProcesses, PROCESS_PLURAL_SINGULAR[numPoolProcesses == 1]))
   try:
     pid = 0
-    poolProcessesInUse = 0
     poolProcessResults = {}
+    chunk = []
     for item in items:
       if item[0] == Cmd.COMMIT_BATCH_CMD:
+        _dispatchChunk()
+        poolProcessesInUse = len(poolProcessResults)
         batchWriteStderr(Msg.COMMIT_BATCH_WAIT_N_PROCESSES.format(poolProcessesInUse, PROCESS_PLURAL_SINGULAR[poolProcessesInUse == 1]))
-        while poolProcessesInUse > 0:
-          for ppid in list(poolProcessResults):
-            try:
-              if poolProcessResults[ppid].ready():
-                poolProcessesInUse -= 1
-                del poolProcessResults[ppid]
-            except (TypeError, IOError):
-              pass
-          if poolProcessesInUse > 0:
-            time.sleep(1)
+        _waitForPoolProcesses(0)
         batchWriteStderr(Msg.COMMIT_BATCH_COMPLETE.format(Msg.PROCESSES))
         continue
       if item[0] == Cmd.PRINT_CMD:
+        _dispatchChunk()
         batchWriteStderr(Cmd.QuotedArgumentList(item[1:])+u'\n')
         continue
       pid += 1
@@ -5445,18 +7244,10 @@ def MultiprocessGAMCommands(items, logCmds):
         batchWriteStderr(Msg.PROCESSING_ITEM_N.format(pid))
       if logCmds:
         batchWriteStderr(Cmd.QuotedArgumentList(item)+u'\n')
-      poolProcessResults[pid] = pool.apply_async(ProcessGAMCommandMulti, [pid, mpQueueCSVFile, mpQueueStdout, mpQueueStderr, GM.Globals, item])
-      poolProcessesInUse += 1
-      while poolProcessesInUse == numPoolProcesses:
-        for ppid in list(poolProcessResults):
-          try:
-            if poolProcessResults[ppid].ready():
-              poolProcessesInUse -= 1
-              del poolProcessResults[ppid]
-          except (TypeError, IOError):
-            pass
-        if poolProcessesInUse == numPoolProcesses:
-          time.sleep(1)
+      chunk.append((pid, item))
+      if len(chunk) == GC.Values[GC.BATCH_CHUNK_SIZE]:
+        _dispatchChunk()
+    _dispatchChunk()
   except KeyboardInterrupt:
     setSysExitRC(KEYBOARD_INTERRUPT_RC)
     pool.terminate()
@@ -5475,46 +7266,129 @@ def MultiprocessGAMCommands(items, logCmds):
     GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD].close()
     GM.Globals[GM.STDERR][GM.REDIRECT_MULTI_FD] = None
     terminateStdQueueHandler(mpQueueStderr, mpQueueHandlerStderr)
+  if removeSvcAcctTokenBatchDir:
+    shutil.rmtree(GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR], ignore_errors=True)
+    if GM.Globals[GM.SVCACCT_TOKEN_DIR] == GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR]:
+      GM.Globals[GM.SVCACCT_TOKEN_DIR] = None
+    GM.Globals[GM.SVCACCT_TOKEN_BATCH_DIR] = None
+
+# gam tbatch runs the commands in threads in this process rather than in a subprocess per command.
+# Each command gets its own copy of GM.Globals and GC.Values and its own Cmd, Act, Ent and Ind;
+# its stdout/stderr are captured and written when the command completes.
+def ProcessGAMCommandThread(pid, args, gmGlobals, gcValues):
+  gmGlobals = gmGlobals.copy()
+  gmGlobals[GM.PID] = pid
+  gmGlobals[GM.CSVFILE] = {}
+  gmGlobals[GM.STDOUT] = {GM.REDIRECT_NAME: u'', GM.REDIRECT_FD: None, GM.REDIRECT_MULTI_FD: StringIOobject()}
+  gmGlobals[GM.STDERR] = {GM.REDIRECT_NAME: u'', GM.REDIRECT_FD: None, GM.REDIRECT_MULTI_FD: StringIOobject()}
+  gmGlobals[GM.SAVED_STDOUT] = None
+  gmGlobals[GM.TBATCH_QUEUE] = None
+# select save and config modify the parser, have SetGlobalVariables read gam.cfg for these commands
+  if (len(args) > 1) and (args[1].lower() in Cmd.GAM_META_COMMANDS):
+    gmGlobals[GM.PARSER] = None
+  stdoutData = gmGlobals[GM.STDOUT][GM.REDIRECT_MULTI_FD]
+  stderrData = gmGlobals[GM.STDERR][GM.REDIRECT_MULTI_FD]
+  glthreadlocal.SetThreadValue(GM.Globals, gmGlobals)
+  glthreadlocal.SetThreadValue(GC.Values, gcValues.copy())
+  glthreadlocal.SetThreadValue(Act, glaction.GamAction())
+  glthreadlocal.SetThreadValue(Cmd, glclargs.GamCLArgs())
+  glthreadlocal.SetThreadValue(Ent, glentity.GamEntity())
+  glthreadlocal.SetThreadValue(Ind, glindent.GamIndent())
+  ProcessGAMCommand(args)
+  return (stdoutData, stderrData)
+
+# gam batch/csv/tbatch commands start a multiprocessing pool or worker threads of their own,
+# run them in a subprocess as was done for all tbatch commands
+TBATCH_SUBPROCESS_COMMANDS = [Cmd.BATCH_CMD, Cmd.CSV_CMD, Cmd.TBATCH_CMD]
+
+def ProcessGAMCommandSubprocess(args, pythonCmd):
+  try:
+    proc = subprocess.Popen(pythonCmd+args[1:], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdoutData, stderrData = proc.communicate()
+  except OSError as e:
+    stdoutData, stderrData = u'', u'{0}{1}\n'.format(ERROR_PREFIX, convertSysToUTF8(str(e)))
+  return (StringIOobject(convertSysToUTF8(stdoutData)), StringIOobject(convertSysToUTF8(stderrData)))
+
+def threadBatchWorker(tbatchQueue, gmGlobals, gcValues, outputFds, outputLock, pythonCmd):
+
+  def _writeData(fd, data):
+    if fd in [getSysStdout(), sys.stderr]:
+      fd.write(convertUTF8toSys(data))
+    else:
+      fd.write(data)
+    fd.flush()
 
-def threadBatchWorker():
   while True:
-    item = GM.Globals[GM.TBATCH_QUEUE].get()
-    subprocess.call(item, stdout=GM.Globals[GM.STDOUT].get(GM.REDIRECT_MULTI_FD, sys.stdout), stderr=GM.Globals[GM.STDERR].get(GM.REDIRECT_MULTI_FD, sys.stderr))
-    GM.Globals[GM.TBATCH_QUEUE].task_done()
+    task = tbatchQueue.get()
+    if task is None:
+      tbatchQueue.task_done()
+      return
+    pid, item = task
+    try:
+      if (len(item) > 1) and (item[1].lower() in TBATCH_SUBPROCESS_COMMANDS):
+        outputData = ProcessGAMCommandSubprocess(item, pythonCmd)
+      else:
+        outputData = ProcessGAMCommandThread(pid, item, gmGlobals, gcValues)
+      with outputLock:
+        for fd, data in zip(outputFds, outputData):
+          if data.getvalue():
+            _writeData(fd, data.getvalue())
+          data.close()
+    except Exception:
+      print_exc(file=sys.stderr)
+    finally:
+      tbatchQueue.task_done()
 
 def ThreadBatchGAMCommands(items, logCmds):
   if not items:
     return
-  pythonCmd = [sys.executable.lower(),]
-  if not getattr(sys, u'frozen', False): # we're not frozen
-    pythonCmd.append(os.path.realpath(Cmd.Argument(0)))
   numWorkerThreads = min(len(items), GC.Values[GC.NUM_TBATCH_THREADS])
   GM.Globals[GM.TBATCH_QUEUE] = Queue.Queue(maxsize=numWorkerThreads) # GM.Globals[GM.TBATCH_QUEUE].put() gets blocked when trying to create more items than there are workers
   batchWriteStderr(Msg.USING_N_PROCESSES.format(numWorkerThreads, THREAD_PLURAL_SINGULAR[numWorkerThreads == 1]))
-  for _ in range(numWorkerThreads):
-    t = threading.Thread(target=threadBatchWorker)
-    t.daemon = True
-    t.start()
-  pid = 0
-  numThreadsInUse = 0
-  for item in items:
-    if item[0] == Cmd.COMMIT_BATCH_CMD:
-      batchWriteStderr(Msg.COMMIT_BATCH_WAIT_N_PROCESSES.format(numThreadsInUse, THREAD_PLURAL_SINGULAR[numThreadsInUse == 1]))
-      GM.Globals[GM.TBATCH_QUEUE].join()
-      batchWriteStderr(Msg.COMMIT_BATCH_COMPLETE.format(Msg.THREADS))
-      numThreadsInUse = 0
-      continue
-    if item[0] == Cmd.PRINT_CMD:
-      batchWriteStderr(Cmd.QuotedArgumentList(item[1:])+u'\n')
-      continue
-    pid += 1
-    if pid % 100 == 0:
-      batchWriteStderr(Msg.PROCESSING_ITEM_N.format(pid))
-    if logCmds:
-      batchWriteStderr(Cmd.QuotedArgumentList(item)+u'\n')
-    GM.Globals[GM.TBATCH_QUEUE].put(pythonCmd+item[1:])
-    numThreadsInUse += 1
-  GM.Globals[GM.TBATCH_QUEUE].join()
+  if GC.Values[GC.API_CALLS_RATE_CHECK]:
+    RateLimit.Share()
+  outputFds = [GM.Globals[GM.STDOUT].get(GM.REDIRECT_MULTI_FD, sys.stdout), GM.Globals[GM.STDERR].get(GM.REDIRECT_MULTI_FD, sys.stderr)]
+  outputLock = threading.Lock()
+  pythonCmd = [sys.executable.lower(),]
+  if not getattr(sys, u'frozen', False): # we're not frozen
+    pythonCmd.append(os.path.realpath(Cmd.Argument(0)))
+  gmGlobals = GM.Globals
+  gcValues = GC.Values
+  savedSettings = startThreadLocalSettings()
+  savedStdout = sys.stdout
+  sys.stdout = glthreadlocal.GamThreadLocal(savedStdout)
+  try:
+    for _ in range(numWorkerThreads):
+      t = threading.Thread(target=threadBatchWorker, args=(gmGlobals[GM.TBATCH_QUEUE], gmGlobals, gcValues, outputFds, outputLock, pythonCmd))
+      t.daemon = True
+      t.start()
+    pid = 0
+    numThreadsInUse = 0
+    for item in items:
+      if item[0] == Cmd.COMMIT_BATCH_CMD:
+        batchWriteStderr(Msg.COMMIT_BATCH_WAIT_N_PROCESSES.format(numThreadsInUse, THREAD_PLURAL_SINGULAR[numThreadsInUse == 1]))
+        GM.Globals[GM.TBATCH_QUEUE].join()
+        batchWriteStderr(Msg.COMMIT_BATCH_COMPLETE.format(Msg.THREADS))
+        numThreadsInUse = 0
+        continue
+      if item[0] == Cmd.PRINT_CMD:
+        batchWriteStderr(Cmd.QuotedArgumentList(item[1:])+u'\n')
+        continue
+      pid += 1
+      if pid % 100 == 0:
+        batchWriteStderr(Msg.PROCESSING_ITEM_N.format(pid))
+      if logCmds:
+        batchWriteStderr(Cmd.QuotedArgumentList(item)+u'\n')
+      GM.Globals[GM.TBATCH_QUEUE].put((pid, item))
+      numThreadsInUse += 1
+    GM.Globals[GM.TBATCH_QUEUE].join()
+# Stop the worker threads so that they aren't waiting on the queue at interpreter shutdown
+    for _ in range(numWorkerThreads):
+      GM.Globals[GM.TBATCH_QUEUE].put(None)
+    GM.Globals[GM.TBATCH_QUEUE].join()
+  finally:
+    sys.stdout = savedStdout
+    endThreadLocalSettings(savedSettings)
 
 # gam batch <FileName>|-|(gdoc <UserGoogleDoc>) [charset <Charset>] [showcmds]
 def doBatch(threadBatch=False):
@@ -6689,6 +8563,113 @@ def doReport():
             return (-1, tryDate)
     return (1, tryDate)
 
+# With num_api_threads > 1, the usage reports for the (user, )date tasks are fetched in threads ahead of the loops that process them;
+# a date not in the tasks, e.g., an adjusted date, is fetched when it is reached
+  def _getUserUsage(task):
+    (_, tryDate), user = task
+    rep = repThreads.Get()
+    try:
+      warnings = None
+      if not userCustomerRange and dataRequiredServices is not None:
+        warnings = callGAPIitems(rep.userUsageReport(), u'get', u'warnings',
+                                 throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
+                                 userKey=user, date=tryDate, customerId=customerId, orgUnitID=orgUnitId, fields=u'warnings')
+        if _checkDataRequiredServices(warnings, tryDate)[0] != 1:
+          return (warnings, None)
+      return (warnings, callGAPIpages(rep.userUsageReport(), u'get', u'usageReports',
+                                      page_message=page_message,
+                                      throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
+                                      userKey=user, date=tryDate, customerId=customerId, orgUnitID=orgUnitId, filters=filters, parameters=parameters,
+                                      maxResults=maxResults))
+    except (GAPI.invalid, GAPI.badRequest, GAPI.forbidden) as e:
+      return e
+
+  def _getCustomerUsage(task):
+    (tryDate,), _ = task
+    rep = repThreads.Get()
+    try:
+      warnings = None
+      if not userCustomerRange and dataRequiredServices is not None:
+        warnings = callGAPIitems(rep.customerUsageReports(), u'get', u'warnings',
+                                 throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
+                                 date=tryDate, customerId=customerId, fields=u'warnings')
+        if _checkDataRequiredServices(warnings, tryDate)[0] != 1:
+          return (warnings, None)
+      return (warnings, callGAPIpages(rep.customerUsageReports(), u'get', u'usageReports',
+                                      throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
+                                      date=tryDate, customerId=customerId, parameters=parameters))
+    except (GAPI.invalid, GAPI.badRequest, GAPI.forbidden) as e:
+      return e
+
+# The report of all users for a date is in the incremental file if any user's report for that date is
+  def _reportCaptured(user, tryDate):
+    return (user, tryDate) in existingReports or (user == u'all' and tryDate in existingDates)
+
+  def _usageTasks(keyUsers):
+    for key, user in keyUsers:
+      startDateTime = startEndTime.startDateTime
+      while startDateTime <= startEndTime.endDateTime:
+        tryDate = startDateTime.strftime(u'%Y-%m-%d')
+        if not _reportCaptured(user, tryDate):
+          yield (key+(tryDate,), user)
+        startDateTime += datetime.timedelta(days=1)
+
+  def _getUsage(prefetch, key, user):
+    while True:
+      if prefetch[u'next'] is None:
+        try:
+          prefetch[u'next'] = next(prefetch[u'results'])
+        except StopIteration:
+          result = prefetch[u'function']((key, user))
+          break
+      (taskKey, _), result = prefetch[u'next']
+      if taskKey >= key:
+        if taskKey == key:
+          prefetch[u'next'] = None
+        else:
+          result = prefetch[u'function']((key, user))
+        break
+      prefetch[u'next'] = None
+    if isinstance(result, Exception):
+      raise result
+    return result
+
+# The checkpoint file holds, for each activity application, the time of the newest activity fetched and the
+# uniqueQualifiers of the activities fetched within lookback minutes of it; the next run starts from
+# that time less lookback minutes and skips the activities that it has already output
+  def _readActivityCheckpoints():
+    data = readFile(checkpointFile, continueOnError=True, displayError=False)
+    try:
+      checkpoints = json.loads(data) if data else {}
+      if not isinstance(checkpoints, dict):
+        raise ValueError
+      return checkpoints
+    except ValueError:
+      systemErrorExit(INVALID_JSON_RC, Msg.DOES_NOT_EXIST_OR_HAS_INVALID_FORMAT.format(Ent.Singular(Ent.FILE), checkpointFile))
+
+  def _getCheckpointThreshold(activityTime):
+    return (iso8601.parse_date(activityTime)[0]-datetime.timedelta(minutes=checkpointLookback)).replace(microsecond=0)
+
+  def _writeActivityCheckpoints():
+    if checkpoint[u'time'] is None:
+      return
+    threshold = _getCheckpointThreshold(checkpoint[u'time'])
+    checkpoints[report] = {u'time': checkpoint[u'time'],
+                           u'ids': dict((uniqueQualifier, activityTime) for uniqueQualifier, activityTime in iteritems(checkpoint[u'ids'])
+                                        if iso8601.parse_date(activityTime)[0] >= threshold)}
+    writeFile(checkpointFile, json.dumps(checkpoints, sort_keys=True, indent=2)+u'\n')
+
+# Returns True if the activity has been output by a previous run
+  def _checkpointActivity(activity):
+    activityTime = activity[u'id'][u'time']
+    uniqueQualifier = activity[u'id'][u'uniqueQualifier']
+    if checkpoint[u'ids'].get(uniqueQualifier) == activityTime:
+      return True
+    checkpoint[u'ids'][uniqueQualifier] = activityTime
+    if checkpoint[u'time'] is None or iso8601.parse_date(activityTime)[0] > iso8601.parse_date(checkpoint[u'time'])[0]:
+      checkpoint[u'time'] = activityTime
+    return False
+
   def processUserUsage(usage, lastDate):
     if not usage or lastDate == usage[0][u'date']:
       return (lastDate is None, lastDate)
@@ -6697,6 +8678,8 @@ def doReport():
       if u'entity' not in user_report:
         continue
       row = {u'email': user_report[u'entity'][u'userEmail'], u'date': user_report[u'date']}
+      if (row[u'email'], row[u'date']) in existingReports:
+        continue
       for item in user_report.get(u'parameters', []):
         if u'name' not in item:
           continue
@@ -6846,6 +8829,7 @@ def doReport():
 
   report = getChoice(REPORT_CHOICE_MAP, mapChoice=True)
   rep = buildGAPIObject(API.REPORTS)
+  repThreads = ThreadGAPIObjects(rep)
   customerId = GC.Values[GC.CUSTOMER_ID]
   if customerId == GC.MY_CUSTOMER:
     customerId = None
@@ -6864,6 +8848,11 @@ def doReport():
   usageReports = customerReports or userReports
   activityReports = not usageReports
   dataRequiredServices = None
+  existingReports = set()
+  existingDates = set()
+  threaded = GC.Values[GC.NUM_API_THREADS] > 1
+  checkpointFile = None
+  checkpointLookback = 0
   if usageReports:
     fullDataServices = CUSTOMER_REPORT_SERVICES if customerReports else USER_REPORT_SERVICES
     includeServices = set()
@@ -6882,6 +8871,13 @@ def doReport():
       userCustomerRange = False
     elif usageReports and myarg == u'nodatechange':
       noDateChange = True
+    elif usageReports and myarg == u'incremental':
+      f, csvFile = openCSVFileReader(getString(Cmd.OB_FILE_NAME))
+      for row in csvFile:
+        if row.get(u'date'):
+          existingReports.add((row.get(u'email') if userReports else None, row[u'date']))
+          existingDates.add(row[u'date'])
+      closeFile(f)
     elif usageReports and myarg in [u'fields', u'parameters']:
       parameters = getString(Cmd.OB_STRING)
     elif usageReports and myarg == u'fulldatarequired':
@@ -6902,7 +8898,7 @@ def doReport():
           invalidChoiceExit(fullDataServices, True)
     elif customerReports and myarg == u'noauthorizedapps':
       noAuthorizedApps = True
-    elif customerReports and myarg == u'maxactivities':
+    elif activityReports and myarg == u'maxactivities':
       maxActivities = getInteger(minVal=0)
     elif activityReports and myarg in [u'start', u'starttime', u'end', u'endtime', u'yesterday']:
       startEndTime.Get(myarg)
@@ -6916,6 +8912,10 @@ def doReport():
       countsOnly = True
     elif activityReports and myarg == u'summary':
       summary = True
+    elif activityReports and myarg == u'checkpoint':
+      checkpointFile = getString(Cmd.OB_FILE_NAME)
+      if checkArgumentPresent(u'lookback'):
+        checkpointLookback = getInteger(minVal=0)
     elif not customerReports and myarg.startswith(u'filtertime'):
       filterTimes[myarg] = getTimeOrDeltaFromNow()
     elif not customerReports and myarg in [u'filter', u'filters']:
@@ -6929,6 +8929,9 @@ def doReport():
       select = True
     else:
       unknownArgumentExit()
+# maxactivities gets the newest activities; a checkpoint at the newest of them would skip the older activities
+  if checkpointFile and maxActivities:
+    usageErrorExit(Msg.ARE_MUTUALLY_EXCLUSIVE.format(u'maxactivities', u'checkpoint'))
   if usageReports and not includeServices:
     includeServices = set(fullDataServices)
   if filterTimes and filters is not None:
@@ -6949,12 +8952,14 @@ def doReport():
       users = [normalizeEmailAddressOrUID(userKey)]
       orgUnitId = None
     titles, csvRows = initializeTitlesCSVfile([u'email', u'date'])
+    if normalizeUsers:
+      users = [normalizeEmailAddressOrUID(user) for user in users]
+    prefetch = {u'function': _getUserUsage, u'next': None,
+                u'results': yieldThreadedCalls(_getUserUsage, _usageTasks((((i,), user) for i, user in enumerate(users, 1))) if threaded else [])}
     i = 0
     count = len(users)
     for user in users:
       i += 1
-      if normalizeUsers:
-        user = normalizeEmailAddressOrUID(user)
       if user != u'all':
         printGettingEntityItemForWhom(Ent.REPORT, user, i, count)
       startDateTime = startEndTime.startDateTime
@@ -6962,11 +8967,12 @@ def doReport():
       lastDate = None
       while startDateTime <= endDateTime:
         tryDate = startDateTime.strftime(u'%Y-%m-%d')
+        if _reportCaptured(user, tryDate):
+          startDateTime += datetime.timedelta(days=1)
+          continue
         try:
-          if not userCustomerRange and dataRequiredServices is not None:
-            warnings = callGAPIitems(rep.userUsageReport(), u'get', u'warnings',
-                                     throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
-                                     userKey=user, date=tryDate, customerId=customerId, orgUnitID=orgUnitId, fields=u'warnings')
+          warnings, usage = _getUsage(prefetch, (i, tryDate), user)
+          if warnings is not None:
             fullData, tryDate = _checkDataRequiredServices(warnings, tryDate)
             if fullData < 0:
               printWarningMessage(DATA_NOT_AVALIABLE_RC, Msg.NO_REPORT_AVAILABLE.format(report))
@@ -6974,11 +8980,6 @@ def doReport():
             if fullData == 0:
               startDateTime = endDateTime = datetime.datetime.strptime(tryDate, YYYYMMDD_FORMAT)
               continue
-          usage = callGAPIpages(rep.userUsageReport(), u'get', u'usageReports',
-                                page_message=page_message,
-                                throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
-                                userKey=user, date=tryDate, customerId=customerId, orgUnitID=orgUnitId, filters=filters, parameters=parameters,
-                                maxResults=maxResults)
           if not userCustomerRange and not usage:
             startDateTime += datetime.timedelta(days=-1)
             endDateTime = startDateTime
@@ -7006,6 +9007,7 @@ def doReport():
         startDateTime += datetime.timedelta(days=1)
       if exitUserLoop:
         break
+    prefetch[u'results'].close()
     csvRows.sort(key=lambda k: (k[u'email'], k[u'date']))
     writeCSVfile(csvRows, titles, u'User Reports - {0}'.format(tryDate), todrive, [u'email', u'date'])
   elif customerReports:
@@ -7013,16 +9015,19 @@ def doReport():
     if not userCustomerRange:
       addTitlesToCSVfile([u'name', u'value'], titles)
     authorizedApps = []
+    prefetch = {u'function': _getCustomerUsage, u'next': None,
+                u'results': yieldThreadedCalls(_getCustomerUsage, _usageTasks([((), None)]) if threaded else [])}
     startDateTime = startEndTime.startDateTime
     endDateTime = startEndTime.endDateTime
     lastDate = None
     while startDateTime <= endDateTime:
       tryDate = startDateTime.strftime(u'%Y-%m-%d')
+      if _reportCaptured(None, tryDate):
+        startDateTime += datetime.timedelta(days=1)
+        continue
       try:
-        if not userCustomerRange and dataRequiredServices is not None:
-          warnings = callGAPIitems(rep.customerUsageReports(), u'get', u'warnings',
-                                   throw_reasons=[GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.FORBIDDEN],
-                                   date=tryDate, customerId=customerId, fields=u'warnings')
+        warnings, usage = _getUsage(prefetch, (tryDate,), None)
+        if warnings is not None:
           fullData, tryDate = _checkDataRequiredServices(warnings, tryDate)
           if fullData < 0:
             printWarningMessage(DATA_NOT_AVALIABLE_RC, Msg.NO_REPORT_AVAILABLE.format(report))
@@ -7030,9 +9035,6 @@ def doReport():
           if fullData == 0:
             startDateTime = endDateTime = datetime.datetime.strptime(tryDate, YYYYMMDD_FORMAT)
             continue
-        usage = callGAPIpages(rep.customerUsageReports(), u'get', u'usageReports',
-                              throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
-                              date=tryDate, customerId=customerId, parameters=parameters)
         if not userCustomerRange and not usage:
           startDateTime += datetime.timedelta(days=-1)
           endDateTime = startDateTime
@@ -7054,6 +9056,7 @@ def doReport():
       except GAPI.forbidden:
         accessErrorExit(None)
       startDateTime += datetime.timedelta(days=1)
+    prefetch[u'results'].close()
     writeCSVfile(csvRows, titles, u'Customer Report - {0}'.format(tryDate), todrive)
   else: # activityReports
     if select:
@@ -7069,6 +9072,12 @@ def doReport():
       users = [normalizeEmailAddressOrUID(userKey)]
     if not eventNames:
       eventNames.append(None)
+    if checkpointFile:
+      checkpoints = _readActivityCheckpoints()
+      checkpoint = checkpoints.get(report, {})
+      checkpoint = {u'time': checkpoint.get(u'time'), u'ids': checkpoint.get(u'ids', {})}
+      if checkpoint[u'time'] is not None:
+        startEndTime.startTime = ISOformatTimeStamp(_getCheckpointThreshold(checkpoint[u'time']))
     eventCounts = {}
     titles, csvRows = initializeTitlesCSVfile(None)
     i = 0
@@ -7098,6 +9107,8 @@ def doReport():
         except GAPI.authError:
           accessErrorExit(None)
         for activity in feed:
+          if checkpointFile and _checkpointActivity(activity):
+            continue
           events = activity.pop(u'events')
           if not countsOnly:
             activity_row = flattenJSON(activity, timeObjects=REPORT_ACTIVITIES_TIME_OBJECTS)
@@ -7140,6 +9151,8 @@ def doReport():
       for event in sorted(eventCounts):
         csvRows.append({u'event': event, u'count': eventCounts[event]})
     writeCSVfile(csvRows, titles, u'{0} Activity Report'.format(report.capitalize()), todrive)
+    if checkpointFile:
+      _writeActivityCheckpoints()
 
 # Substitute for #user#, #email#, #usernamne#
 def _substituteForUser(field, user, userName):
@@ -8933,12 +10946,12 @@ def _batchMoveCrOSesToOrgUnit(cd, orgUnitPath, i, count, items, quickCrOSMove):
       svcparms[u'deviceId'] = deviceId
       dbatch.add(method(**svcparms), request_id=batchRequestID(u'', 0, 0, j, jcount, deviceId))
       bcount += 1
-      if bcount >= GC.Values[GC.BATCH_SIZE]:
+      if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
         executeBatch(dbatch)
         dbatch = cd.new_batch_http_request(callback=_callbackMoveCrOSesToOrgUnit)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, final=True)
   else:
     bcount = 0
     j = 0
@@ -8986,16 +10999,17 @@ def _batchMoveUsersToOrgUnit(cd, orgUnitPath, i, count, items):
     svcparms[u'userKey'] = normalizeEmailAddressOrUID(user)
     dbatch.add(method(**svcparms), request_id=batchRequestID(u'', 0, 0, j, jcount, svcparms[u'userKey']))
     bcount += 1
-    if bcount >= GC.Values[GC.BATCH_SIZE]:
+    if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
       executeBatch(dbatch)
       dbatch = cd.new_batch_http_request(callback=_callbackMoveUsersToOrgUnit)
       bcount = 0
   if bcount > 0:
-    dbatch.execute()
+    executeBatch(dbatch, final=True)
   Ind.Decrement()
 
 def _doUpdateOrgs(entityList):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   if checkArgumentPresent([u'move', u'add']):
     entityType, items = getEntityToModify(defaultEntityType=Cmd.ENTITY_USERS, crosAllowed=True)
     orgItemLists = items if isinstance(items, dict) else None
@@ -9309,12 +11323,12 @@ def _getOrgUnits(cd, orgUnitPath, fieldsList, listType, showParent, batchSubOrgs
       dbatch.add(method(**svcparms), request_id=batchRequestID(u'', i, 0, 0, 0, u''))
       bcount += 1
       i += 1
-      if bcount >= GC.Values[GC.BATCH_SIZE]:
+      if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
         executeBatch(dbatch)
         dbatch = cd.new_batch_http_request(callback=_callbackListOrgUnits)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, final=True)
 
   deleteOrgUnitId = deleteParentOrgUnitId = False
   if showParent:
@@ -9571,11 +11585,13 @@ ALIAS_TARGET_TYPES = [u'user', u'group', u'target',]
 
 def _doCreateUpdateAliases(doUpdate):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   aliasList = getEntityList(Cmd.OB_EMAIL_ADDRESS_ENTITY)
   targetType = getChoice(ALIAS_TARGET_TYPES)
   targetEmails = getEntityList(Cmd.OB_GROUP_ENTITY)
   entityLists = targetEmails if isinstance(targetEmails, dict) else None
   checkForExtraneousArguments()
+  changedUsers = []
   i = 0
   count = len(aliasList)
   for aliasEmail in aliasList:
@@ -9588,6 +11604,7 @@ def _doCreateUpdateAliases(doUpdate):
     if jcount > 0:
 # Only process first target
       targetEmail = normalizeEmailAddressOrUID(targetEmails[0])
+      changedUsers.extend([aliasEmail, targetEmail])
       if doUpdate:
         try:
           callGAPI(cd.users().aliases(), u'delete',
@@ -9647,6 +11664,7 @@ def _doCreateUpdateAliases(doUpdate):
         entityActionFailedWarning([Ent.GROUP_ALIAS, aliasEmail, Ent.GROUP, targetEmail], Msg.INVALID_ALIAS, i, count)
       except (GAPI.groupNotFound, GAPI.userNotFound, GAPI.badRequest, GAPI.forbidden):
         entityUnknownWarning(Ent.ALIAS_TARGET, targetEmail, i, count)
+  invalidateUserMaps(changedUsers)
 
 # gam create aliases|nicknames <EmailAddressEntity> user|group|target <UniqueID>|<EmailAddress>
 def doCreateAliases():
@@ -9659,14 +11677,17 @@ def doUpdateAliases():
 # gam delete aliases|nicknames [user|group|target] <EmailAddressEntity>
 def doDeleteAliases():
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   targetType = getChoice(ALIAS_TARGET_TYPES, defaultChoice=u'target')
   entityList = getEntityList(Cmd.OB_EMAIL_ADDRESS_ENTITY)
   checkForExtraneousArguments()
+  changedUsers = []
   i = 0
   count = len(entityList)
   for aliasEmail in entityList:
     i += 1
     aliasEmail = normalizeEmailAddressOrUID(aliasEmail, noUid=True)
+    changedUsers.append(aliasEmail)
     aliasDeleted = False
     if targetType != u'group':
       try:
@@ -9720,6 +11741,7 @@ def doDeleteAliases():
       entityUnknownWarning(Ent.GROUP_ALIAS, aliasEmail, i, count)
       continue
     entityUnknownWarning(Ent.ALIAS, aliasEmail, i, count)
+  invalidateUserMaps(changedUsers)
 
 def infoAliases(entityList):
 
@@ -12347,6 +14369,7 @@ CROS_ACTION_NAME_MAP = {
 # gam <CrOSTypeEntity> update (<CrOSAttributes>+ [quickcrosmove [<Boolean>]])|(action <CrOSAction> [acknowledge_device_touch_requirement])
 def updateCrOSDevices(entityList):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   update_body = {}
   action_body = {}
   orgUnitPath = updateNotes = None
@@ -13131,12 +15154,12 @@ def doPrintCrOSDevices(entityList=None):
         svcparms[u'deviceId'] = deviceId
         dbatch.add(method(**svcparms), request_id=batchRequestID(u'', 0, 0, j, jcount, deviceId))
         bcount += 1
-        if bcount >= GC.Values[GC.BATCH_SIZE]:
+        if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
           executeBatch(dbatch)
           dbatch = cd.new_batch_http_request(callback=_callbackPrintCrOS)
           bcount = 0
       if bcount > 0:
-        dbatch.execute()
+        executeBatch(dbatch, final=True)
 # The only field specified was deviceId, just list the CrOS devices
     else:
       for cros in entityList:
@@ -13316,12 +15339,12 @@ def doPrintCrOSActivity(entityList=None):
       svcparms[u'deviceId'] = deviceId
       dbatch.add(method(**svcparms), request_id=batchRequestID(u'', 0, 0, j, jcount, deviceId))
       bcount += 1
-      if bcount >= GC.Values[GC.BATCH_SIZE]:
+      if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
         executeBatch(dbatch)
         dbatch = cd.new_batch_http_request(callback=_callbackPrintCrOS)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, final=True)
   if sortRows and orderBy and orderBy in titles[u'set']:
     csvRows.sort(key=lambda k: k[orderBy], reverse=sortOrder == u'DESCENDING')
   writeCSVfile(csvRows, titles, u'CrOS Activity', todrive, None, quotechar)
@@ -13885,7 +15908,7 @@ def doUpdateGroups():
     return getChoice(GROUP_DELIVERY_SETTINGS_MAP, defaultChoice=DELIVERY_SETTINGS_UNDEFINED, mapChoice=True)
 
   def _executeBatch(dbatch, batchParms):
-    dbatch.execute()
+    executeBatch(dbatch, batchParms[u'size'], final=True)
     if batchParms[u'wait'] > 0:
       time.sleep(batchParms[u'wait'])
 
@@ -13909,6 +15932,7 @@ def doUpdateGroups():
     Ind.Decrement()
 
   def _showAction(group, role, delivery_settings, member, j, jcount):
+    changedGroups.add(group)
     kvList = []
     if role is not None and role != u'None':
       kvList.append(u'{0}: {1}'.format(Ent.Singular(Ent.ROLE), role))
@@ -14022,13 +16046,13 @@ def doUpdateGroups():
         svcparms[u'body'].pop(u'email', None)
       dbatch.add(method(**svcparms), request_id=batchRequestID(group, i, count, j, jcount, member, role, delivery_settings))
       bcount += 1
-      if bcount >= addBatchParms[u'size']:
+      if bcount >= getBatchFlushSize(addBatchParms[u'size'], addBatchParms[u'wait']):
         addBatchParms[u'adjust'] = True
         _executeBatch(dbatch, addBatchParms)
         dbatch = cd.new_batch_http_request(callback=_callbackAddGroupMembers)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, addBatchParms[u'size'], final=True)
     Ind.Decrement()
 
   def _removeMember(group, i, count, role, member, j, jcount):
@@ -14095,13 +16119,13 @@ def doUpdateGroups():
       svcparms[u'memberKey'] = normalizeEmailAddressOrUID(member, checkForCustomerId=True)
       dbatch.add(method(**svcparms), request_id=batchRequestID(group, i, count, j, jcount, svcparms[u'memberKey'], role))
       bcount += 1
-      if bcount >= remBatchParms[u'size']:
+      if bcount >= getBatchFlushSize(remBatchParms[u'size'], remBatchParms[u'wait']):
         remBatchParms[u'adjust'] = True
         _executeBatch(dbatch, remBatchParms)
         dbatch = cd.new_batch_http_request(callback=_callbackRemoveGroupMembers)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, remBatchParms[u'size'], final=True)
     Ind.Decrement()
 
   _UPDATE_MEMBER_REASON_TO_MESSAGE_MAP = {GAPI.MEMBER_NOT_FOUND: u'{0} {1}'.format(Msg.NOT_A, Ent.Singular(Ent.MEMBER)),
@@ -14175,19 +16199,21 @@ def doUpdateGroups():
       svcparms[u'memberKey'] = normalizeEmailAddressOrUID(member, checkForCustomerId=True)
       dbatch.add(method(**svcparms), request_id=batchRequestID(group, i, count, j, jcount, svcparms[u'memberKey'], role, delivery_settings))
       bcount += 1
-      if bcount >= updBatchParms[u'size']:
+      if bcount >= getBatchFlushSize(updBatchParms[u'size'], updBatchParms[u'wait']):
         updBatchParms[u'adjust'] = True
         _executeBatch(dbatch, updBatchParms)
         dbatch = cd.new_batch_http_request(callback=_callbackUpdateGroupMembers)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, updBatchParms[u'size'], final=True)
     Ind.Decrement()
 
   cd = buildGAPIObject(API.DIRECTORY)
   preview = False
   entityList = getEntityList(Cmd.OB_GROUP_ENTITY)
   CL_subCommand = getChoice(UPDATE_GROUP_SUBCMDS, defaultChoice=None)
+# The groups whose members have been changed are relisted the next time that the group membership graph is used
+  changedGroups = set()
   addBatchParms = {u'size': GC.Values[GC.BATCH_SIZE], u'wait': GC.Values[GC.INTER_BATCH_WAIT], u'adjust': True}
   remBatchParms = {u'size': GC.Values[GC.BATCH_SIZE], u'wait': GC.Values[GC.INTER_BATCH_WAIT], u'adjust': True}
   updBatchParms = {u'size': GC.Values[GC.BATCH_SIZE], u'wait': GC.Values[GC.INTER_BATCH_WAIT], u'adjust': True}
@@ -14211,6 +16237,7 @@ def doUpdateGroups():
         return
     elif not body:
       return
+    renamedGroups = []
     Act.Set(Act.UPDATE)
     i = 0
     count = len(entityList)
@@ -14236,9 +16263,13 @@ def doUpdateGroups():
           continue
       if body:
         try:
+          oldGroup = group
           group = callGAPI(cd.groups(), u'update',
                            throw_reasons=GAPI.GROUP_UPDATE_THROW_REASONS, retry_reasons=GAPI.GROUP_GET_RETRY_REASONS,
                            groupKey=group, body=body, fields=u'email')[u'email']
+          if u'email' in body:
+            renamedGroups.append(oldGroup)
+            changedGroups.add(group)
         except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.backendError, GAPI.badRequest, GAPI.invalid, GAPI.systemError) as e:
           entityActionFailedWarning([Ent.GROUP, group], str(e), i, count)
           continue
@@ -14253,6 +16284,8 @@ def doUpdateGroups():
           entityActionFailedWarning([Ent.GROUP, group], str(e), i, count)
           continue
       entityActionPerformed([Ent.GROUP, group], i, count)
+# A renamed group is removed from the graph under its old email address and added under its new one
+    invalidateGroupMembershipGraph(renamedGroups, deleted=True)
   elif CL_subCommand in [u'create', u'add']:
     role, groupMemberType = _getRoleGroupMemberType()
     isSuspended = _getOptionalIsSuspended()
@@ -14383,12 +16416,14 @@ def doUpdateGroups():
         if _checkMemberRoleIsSuspended(member, validRoles, isSuspended):
           removeMembers.append(member.get(u'email', member[u'id']))
       _batchRemoveGroupMembers(group, i, count, removeMembers, Ent.ROLE_MEMBER)
+  invalidateGroupMembershipGraph(list(changedGroups))
 
 # gam delete groups <GroupEntity>
 def doDeleteGroups():
   cd = buildGAPIObject(API.DIRECTORY)
   entityList = getEntityList(Cmd.OB_GROUP_ENTITY)
   checkForExtraneousArguments()
+  deletedGroups = []
   i = 0
   count = len(entityList)
   for group in entityList:
@@ -14399,8 +16434,10 @@ def doDeleteGroups():
                throw_reasons=[GAPI.GROUP_NOT_FOUND, GAPI.DOMAIN_NOT_FOUND, GAPI.FORBIDDEN, GAPI.INVALID],
                groupKey=group)
       entityActionPerformed([Ent.GROUP, group], i, count)
+      deletedGroups.append(group)
     except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.invalid):
       entityUnknownWarning(Ent.GROUP, group, i, count)
+  invalidateGroupMembershipGraph(deletedGroups, deleted=True)
 
 GROUP_FIELDS_CHOICE_MAP = {
   u'admincreated': u'adminCreated',
@@ -15024,13 +17061,14 @@ def doPrintGroups():
       printGettingEntityItem(Ent.GROUP, svcparms[u'groupKey'], i, count)
       cdbatch.add(cdmethod(**svcparms), request_id=batchRequestID(svcparms[u'groupKey'], i, count, 0, 0, None))
       cdbcount += 1
-      if cdbcount >= GC.Values[GC.BATCH_SIZE]:
+      if cdbcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
         executeBatch(cdbatch)
         cdbatch = cd.new_batch_http_request(callback=_callbackProcessGroupBasic)
         cdbcount = 0
     if cdbcount > 0:
-      cdbatch.execute()
+      executeBatch(cdbatch, final=True)
   required = 0
+  graph = getGroupMembershipGraph(cd) if memberRoles else None
   if memberRoles:
     required += 1
     svcargs = dict([(u'groupKey', None), (u'roles', memberRoles), (u'fields', u'nextPageToken,members(email,id,role,status)'),
@@ -15057,13 +17095,19 @@ def doPrintGroups():
       _printGroupRow(groupEntity, None, None)
       continue
     groupData[i] = {u'entity': groupEntity, u'members': [], u'settings': getSettings, u'required': required}
-    if memberRoles:
+    graphMembers = graph.GetGroupMembers(groupEmail, rolesSet) if graph is not None else None
+    if graphMembers is not None:
+      groupData[i][u'members'] = graphMembers
+      groupData[i][u'required'] -= 1
+      if groupData[i][u'required'] == 0:
+        _writeCompleteRows()
+    elif memberRoles:
       printGettingEntityItemForWhom(memberRoles, groupEmail, i, count)
       svcparms = svcargs.copy()
       svcparms[u'groupKey'] = groupEmail
       cdbatch.add(cdmethod(**svcparms), request_id=batchRequestID(groupEmail, i, count, 0, 0, None, memberRoles))
       cdbcount += 1
-      if cdbcount >= GC.Values[GC.BATCH_SIZE]:
+      if cdbcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
         executeBatch(cdbatch)
         cdbatch = cd.new_batch_http_request(callback=_callbackProcessGroupMembers)
         cdbcount = 0
@@ -15075,7 +17119,7 @@ def doPrintGroups():
         svcparmsgs[u'groupUniqueId'] = groupEmail
         gsbatch.add(gsmethod(**svcparmsgs), request_id=batchRequestID(groupEmail, i, count, 0, 0, None))
         gsbcount += 1
-        if gsbcount >= GC.Values[GC.BATCH_SIZE]:
+        if gsbcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
           executeBatch(gsbatch)
           gsbatch = gs.new_batch_http_request(callback=_callbackProcessGroupSettings)
           gsbcount = 0
@@ -15084,9 +17128,9 @@ def doPrintGroups():
         groupData[i][u'settings'] = False
         groupData[i][u'required'] -= 1
   if cdbcount > 0:
-    cdbatch.execute()
+    executeBatch(cdbatch, final=True)
   if getSettings and gsbcount > 0:
-    gsbatch.execute()
+    executeBatch(gsbatch, final=True)
   _writeCompleteRows()
   writeCSVfile(csvRows, titles, u'Groups', todrive, [fieldsTitles[u'email']] if sortHeaders else None, quotechar)
 
@@ -15141,73 +17185,75 @@ MEMBEROPTION_ISSUSPENDED = 4
 def _initMemberOptions():
   return [False, False, False, False, None]
 
-def getGroupMembers(cd, groupEmail, memberRoles, membersList, membersSet, i, count, memberOptions, level):
-  def _getDeliverySettings(member):
-    if u'delivery_settings' not in member:
-      try:
-        member[u'delivery_settings'] = callGAPI(cd.members(), u'get',
-                                                throw_reasons=GAPI.MEMBERS_THROW_REASONS+[GAPI.MEMBER_NOT_FOUND], retry_reasons=GAPI.MEMBERS_RETRY_REASONS,
-                                                groupKey=groupEmail, memberKey=member[u'id'], fields=u'delivery_settings')[u'delivery_settings']
-      except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden):
-        pass
-      except GAPI.memberNotFound:
-        pass
-    else:
-      memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS] = False
+# groupsMembers: {lower case group email: members} of the groups already listed; pass the same dictionary
+# for each group of a recursive command so that a subgroup in several groups is only listed once
+def getGroupMembers(cd, groupEmail, memberRoles, membersList, membersSet, i, count, memberOptions, level, groupsMembers=None):
+  def _addMember(member, subgroupEmail):
+    if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
+      if u'delivery_settings' not in member:
+        deliveryMembers.append((subgroupEmail, member))
+      else:
+        memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS] = False
+    membersList.append(member)
+
+  def _addRecursiveMember(member, subgroupEmail, subgroupLevel):
+    member = member.copy()
+    member[u'level'] = subgroupLevel
+    member[u'subgroup'] = subgroupEmail
+    _addMember(member, subgroupEmail)
+
+  def _getNoDuplicatesMembers(subgroupEmail, subgroupLevel):
+    groupMemberList = []
+    for member in groupsMembers.get(subgroupEmail.lower()) or []:
+      if member[u'type'] == u'USER':
+        if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]) and member[u'id'] not in membersSet:
+          membersSet.add(member[u'id'])
+          _addRecursiveMember(member, subgroupEmail, subgroupLevel)
+      elif member[u'type'] == u'GROUP':
+        if member[u'id'] not in membersSet:
+          membersSet.add(member[u'id'])
+          groupMemberList.append(member[u'email'])
+    for member in groupMemberList:
+      _getNoDuplicatesMembers(member, subgroupLevel+1)
+
+# ancestors: the groups being expanded; a group that is a member of itself, directly or indirectly, is not expanded again
+  def _getAllMembers(subgroupEmail, subgroupLevel, ancestors):
+    ancestors.add(subgroupEmail.lower())
+    for member in groupsMembers.get(subgroupEmail.lower()) or []:
+      if member[u'type'] == u'USER':
+        if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]):
+          _addRecursiveMember(member, subgroupEmail, subgroupLevel)
+      elif member[u'type'] == u'GROUP' and member[u'email'].lower() not in ancestors:
+        _getAllMembers(member[u'email'], subgroupLevel+1, ancestors)
+    ancestors.discard(subgroupEmail.lower())
 
-  printGettingAllEntityItemsForWhom(memberRoles if memberRoles else Ent.ROLE_MANAGER_MEMBER_OWNER, groupEmail, i, count)
   validRoles, listRoles, listFields = _getRoleVerification(memberRoles, u'nextPageToken,members(email,id,role,status,type,delivery_settings)')
-  try:
-    groupMembers = callGAPIpages(cd.members(), u'list', u'members',
-                                 throw_reasons=GAPI.MEMBERS_THROW_REASONS, retry_reasons=GAPI.MEMBERS_RETRY_REASONS,
-                                 groupKey=groupEmail, roles=listRoles, fields=listFields, maxResults=GC.Values[GC.MEMBER_MAX_RESULTS])
-  except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden):
+  if groupsMembers is None:
+    groupsMembers = {}
+  if groupsMembers.get(groupEmail.lower(), True) is None:
     entityUnknownWarning(Ent.GROUP, groupEmail, i, count)
     return
+  getGroupsMembers(cd, [groupEmail], memberRoles, listRoles, listFields, groupsMembers, memberOptions[MEMBEROPTION_RECURSIVE], i, count)
+  groupMembers = groupsMembers[groupEmail.lower()]
+  if groupMembers is None:
+    return
+  deliveryMembers = []
   if not memberOptions[MEMBEROPTION_RECURSIVE]:
     if memberOptions[MEMBEROPTION_NODUPLICATES]:
       for member in groupMembers:
         if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]) and member[u'id'] not in membersSet:
-          if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
-            _getDeliverySettings(member)
           membersSet.add(member[u'id'])
-          membersList.append(member)
+          _addMember(member, groupEmail)
     else:
       for member in groupMembers:
         if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]):
-          if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
-            _getDeliverySettings(member)
-          membersList.append(member)
+          _addMember(member, groupEmail)
   elif memberOptions[MEMBEROPTION_NODUPLICATES]:
-    groupMemberList = []
-    for member in groupMembers:
-      if member[u'type'] == u'USER':
-        if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]) and member[u'id'] not in membersSet:
-          if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
-            _getDeliverySettings(member)
-          membersSet.add(member[u'id'])
-          member[u'level'] = level
-          member[u'subgroup'] = groupEmail
-          membersList.append(member)
-      elif member[u'type'] == u'GROUP':
-        if member[u'id'] not in membersSet:
-          if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
-            _getDeliverySettings(member)
-          membersSet.add(member[u'id'])
-          groupMemberList.append(member[u'email'])
-    for member in groupMemberList:
-      getGroupMembers(cd, member, memberRoles, membersList, membersSet, i, count, memberOptions, level+1)
+    _getNoDuplicatesMembers(groupEmail, level)
   else:
-    for member in groupMembers:
-      if member[u'type'] == u'USER':
-        if _checkMemberRoleIsSuspended(member, validRoles, memberOptions[MEMBEROPTION_ISSUSPENDED]):
-          if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS]:
-            _getDeliverySettings(member)
-          member[u'level'] = level
-          member[u'subgroup'] = groupEmail
-          membersList.append(member)
-      elif member[u'type'] == u'GROUP':
-        getGroupMembers(cd, member[u'email'], memberRoles, membersList, membersSet, i, count, memberOptions, level+1)
+    _getAllMembers(groupEmail, level, set())
+  if memberOptions[MEMBEROPTION_GETDELIVERYSETTINGS] and deliveryMembers:
+    getGroupsMembersDeliverySettings(cd, deliveryMembers)
 
 GROUPMEMBERS_FIELDS_CHOICE_MAP = {
   u'delivery': u'delivery_settings',
@@ -15360,6 +17406,7 @@ def doPrintGroupMembers():
   memberRoles = u','.join(sorted(rolesSet)) if rolesSet else None
   membersSet = set()
   level = 0
+  groupsMembers = {} if memberOptions[MEMBEROPTION_RECURSIVE] else None
   customerKey = GC.Values[GC.CUSTOMER_ID]
   setCustomerMemberEmail = u'email' in fieldsList
   i = 0
@@ -15373,7 +17420,7 @@ def doPrintGroupMembers():
     if not checkGroupMatchPatterns(groupEmail, group, matchPatterns):
       continue
     membersList = []
-    getGroupMembers(cd, groupEmail, memberRoles, membersList, membersSet, i, count, memberOptions, level)
+    getGroupMembers(cd, groupEmail, memberRoles, membersList, membersSet, i, count, memberOptions, level, groupsMembers)
     for member in membersList:
       memberId = member[u'id']
       row = {}
@@ -15541,8 +17588,106 @@ def doShowGroupMembers():
     if checkGroupMatchPatterns(groupEmail, group, matchPatterns):
       _showGroup(groupEmail, 0)
 
+# gam update groupgraph [full] [norefresh] [import <FileName>] [export <FileName>]
+def doUpdateGroupGraph():
+  cd = buildGAPIObject(API.DIRECTORY)
+  full = False
+  refresh = True
+  importFile = exportFile = None
+  while Cmd.ArgumentsRemaining():
+    myarg = getArgument()
+    if myarg == u'full':
+      full = True
+    elif myarg == u'norefresh':
+      refresh = False
+    elif myarg == u'import':
+      importFile = getString(Cmd.OB_FILE_NAME)
+    elif myarg == u'export':
+      exportFile = getString(Cmd.OB_FILE_NAME)
+    else:
+      unknownArgumentExit()
+  graph = GroupMembershipGraph()
+  if importFile:
+    if not graph.Load(readFile(importFile)):
+      systemErrorExit(INVALID_JSON_RC, Msg.DOES_NOT_EXIST_OR_HAS_INVALID_FORMAT.format(Ent.Singular(Ent.FILE), importFile))
+  else:
+    graph.Load(readFile(_getGroupGraphCacheFileName(), continueOnError=True, displayError=False))
+  if refresh:
+    graph.Refresh(cd, full=full)
+  with GroupMembershipGraphLock:
+    graph.Save(_getGroupGraphCacheFileName())
+    GM.Globals[GM.GROUP_MEMBERSHIP_GRAPH] = graph
+  if exportFile:
+    writeFile(exportFile, graph.Dumps())
+  printKeyValueList([Ent.Plural(Ent.GROUP), len(graph.groups)])
+  printKeyValueList([Ent.Plural(Ent.MEMBER), len(graph.GetMembers())])
+  printKeyValueList([u'Time', ISOformatTimeStamp(datetime.datetime.fromtimestamp(int(graph.time), GC.Values[GC.TIMEZONE]))])
+
+# gam print groupgraph [todrive <ToDriveAttributes>*] [member <UserItem>] [recursive]
+def doPrintGroupGraph():
+  cd = buildGAPIObject(API.DIRECTORY)
+  todrive = {}
+  memberKey = None
+  recursive = False
+  while Cmd.ArgumentsRemaining():
+    myarg = getArgument()
+    if myarg == u'todrive':
+      todrive = getTodriveParameters()
+    elif myarg == u'member':
+      memberKey = getEmailAddress()
+    elif myarg == u'recursive':
+      recursive = True
+    else:
+      unknownArgumentExit()
+  titles, csvRows = initializeTitlesCSVfile([u'member', u'group', u'role'])
+  if recursive:
+    addTitlesToCSVfile([u'level', u'subgroup'], titles)
+  graph = getGroupMembershipGraph(cd, alwaysUse=True)
+  if memberKey:
+    memberKeys = [memberKey]
+  else:
+    memberKeys = [member[graph.EMAIL] or member[graph.ID] for member in graph.GetMembers()]
+  for memberKey in memberKeys:
+    for group in graph.GetAllMemberGroups(memberKey) if recursive else graph.GetMemberGroups(memberKey):
+      row = {u'member': memberKey, u'group': group[u'email'], u'role': group[u'role']}
+      if recursive:
+        row[u'level'] = group[u'level']
+        row[u'subgroup'] = group[u'subgroup']
+      csvRows.append(row)
+  writeCSVfile(csvRows, titles, u'Group Graph', todrive)
+
 # gam print licenses [todrive <ToDriveAttributes>*] [(products|product <ProductIDList>)|(skus|sku <SKUIDList>)|allskus|gsuite] [countsonly]
 def doPrintLicenses(returnFields=None, skus=None, countsOnly=False, returnCounts=False):
+# The products/SKUs are listed in num_api_threads threads; for countsonly, the licenses are counted page by page and not kept
+  def _getLicenses(task):
+    productId, skuId = task
+    if skuId:
+      function = u'listForProductAndSku'
+      kwargs = {u'productId': productId, u'skuId': skuId}
+      forWhom = SKU.formatSKUIdDisplayName(skuId)
+      entityValueList = [Ent.PRODUCT, SKU.formatProductIdDisplayName(productId), Ent.SKU, forWhom]
+    else:
+      function = u'listForProduct'
+      kwargs = {u'productId': productId}
+      forWhom = productId
+      entityValueList = [Ent.PRODUCT, SKU.formatProductIdDisplayName(productId)]
+    try:
+      if countsOnly:
+        licenseCount = 0
+        for licenses in yieldGAPIpages(licThreads.Get().licenseAssignments(), function, u'items',
+                                       page_message=getPageMessageForWhom(forWhom=forWhom),
+                                       throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
+                                       customerId=GC.Values[GC.DOMAIN], fields=fields, maxResults=GC.Values[GC.LICENSE_MAX_RESULTS], **kwargs):
+          licenseCount += len(licenses)
+        return licenseCount
+      return callGAPIpages(licThreads.Get().licenseAssignments(), function, u'items',
+                           page_message=getPageMessageForWhom(forWhom=forWhom),
+                           throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
+                           customerId=GC.Values[GC.DOMAIN], fields=fields, maxResults=GC.Values[GC.LICENSE_MAX_RESULTS], **kwargs)
+    except (GAPI.invalid, GAPI.forbidden) as e:
+      entityActionNotPerformedWarning(entityValueList, str(e))
+      return None
+
   lic = buildGAPIObject(API.LICENSING)
   products = []
   feed = []
@@ -15582,37 +17727,23 @@ def doPrintLicenses(returnFields=None, skus=None, countsOnly=False, returnCounts
   else:
     fields = u'nextPageToken,items({0})'.format(returnFields)
   if skus:
-    for skuId in skus:
-      Ent.SetGetting(Ent.LICENSE)
-      productId, skuId = SKU.getProductAndSKU(skuId)
-      productDisplay = SKU.formatProductIdDisplayName(productId)
-      skuIdDisplay = SKU.formatSKUIdDisplayName(skuId)
-      try:
-        feed += callGAPIpages(lic.licenseAssignments(), u'listForProductAndSku', u'items',
-                              page_message=getPageMessageForWhom(forWhom=skuIdDisplay),
-                              throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
-                              customerId=GC.Values[GC.DOMAIN], productId=productId, skuId=skuId, fields=fields)
-        if countsOnly:
-          licenseCounts.append([Ent.PRODUCT, productId, Ent.SKU, [skuId, skuIdDisplay][returnCounts], Ent.LICENSE, len(feed)])
-          feed = []
-      except (GAPI.invalid, GAPI.forbidden) as e:
-        entityActionNotPerformedWarning([Ent.PRODUCT, productDisplay, Ent.SKU, skuIdDisplay], str(e))
+    tasks = [SKU.getProductAndSKU(skuId) for skuId in skus]
   else:
     if not products:
       products = SKU.getSortedProductList()
-    for productId in products:
-      Ent.SetGetting(Ent.LICENSE)
-      productDisplay = SKU.formatProductIdDisplayName(productId)
-      try:
-        feed += callGAPIpages(lic.licenseAssignments(), u'listForProduct', u'items',
-                              page_message=getPageMessageForWhom(forWhom=productId),
-                              throw_reasons=[GAPI.INVALID, GAPI.FORBIDDEN],
-                              customerId=GC.Values[GC.DOMAIN], productId=productId, fields=fields)
-        if countsOnly:
-          licenseCounts.append([Ent.PRODUCT, [productId, productDisplay][returnCounts], Ent.LICENSE, len(feed)])
-          feed = []
-      except (GAPI.invalid, GAPI.forbidden) as e:
-        entityActionNotPerformedWarning([Ent.PRODUCT, productDisplay], str(e))
+    tasks = [(productId, None) for productId in products]
+  Ent.SetGetting(Ent.LICENSE)
+  licThreads = ThreadGAPIObjects(lic)
+  for (productId, skuId), result in yieldThreadedCallsWithOutput(_getLicenses, tasks, min(len(tasks), GC.Values[GC.NUM_API_THREADS])):
+    if result is None:
+      continue
+    if countsOnly:
+      if skuId:
+        licenseCounts.append([Ent.PRODUCT, productId, Ent.SKU, [skuId, SKU.formatSKUIdDisplayName(skuId)][returnCounts], Ent.LICENSE, result])
+      else:
+        licenseCounts.append([Ent.PRODUCT, [productId, SKU.formatProductIdDisplayName(productId)][returnCounts], Ent.LICENSE, result])
+    else:
+      feed.extend(result)
   if countsOnly:
     if returnCounts:
       return licenseCounts
@@ -15650,6 +17781,17 @@ def doPrintLicenses(returnFields=None, skus=None, countsOnly=False, returnCounts
                     u'skuId': skuId, u'skuDisplay': SKU.skuIdToDisplayName(skuId)})
   writeCSVfile(csvRows, titles, u'Licenses', todrive)
 
+# Return {lower case userId: [skuId, ...]} for the licenses of skus, of all products if skus is None
+def getUserLicenseMap(skus=None):
+  key = u','.join(sorted(skus)) if skus else u''
+  licenses = _getDirectoryCacheEntry(DIRECTORY_CACHE_LICENSES, key) if GC.Values[GC.DIRECTORY_CACHE_MINUTES] else None
+  if licenses is None:
+    fetchTime = time.time()
+    licenses = doPrintLicenses(returnFields=u'userId,skuId', skus=skus)
+    if GC.Values[GC.DIRECTORY_CACHE_MINUTES]:
+      _setDirectoryCacheEntry(DIRECTORY_CACHE_LICENSES, licenses, fetchTime, key)
+  return licenses
+
 # gam show licenses [(products|product <ProductIDList>)|(skus|sku <SKUIDList>)|allskus|gsuite]
 def doShowLicenses():
   licenseCounts = doPrintLicenses(countsOnly=True, returnCounts=True)
@@ -18641,30 +20783,79 @@ def doPrintShowVaultExports():
     writeCSVfile(csvRows, titles, u'Vault Exports', todrive, PRINT_VAULT_EXPORTS_TITLES)
 
 ZIP_EXTENSION_PATTERN = re.compile(r'^.*\.zip$', re.IGNORECASE)
+# Nested zip files up to this size are extracted from memory rather than being written to disk
+NESTED_ZIP_MEMORY_LIMIT = 256*1024*1024
 
 # gam download vaultexport|export <ExportItem> matter <MatterItem> [targetfolder <FilePath>] [noverify] [noextract]
 # gam download vaultexport|export <MatterItem> <ExportItem> [targetfolder <FilePath>] [noverify] [noextract]
 def doDownloadVaultExport():
-  def extract_nested_zip(zippedFile):
+# Another thread may create a directory of the member between zipfile's check for it and its makedirs/mkdir;
+# the directory then exists so the extract is retried
+  def extract_member(zfile, inner_file):
+    try:
+      return zfile.extract(inner_file, targetFolder)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+      return zfile.extract(inner_file, targetFolder)
+
+  def extract_nested_zip(zippedFile, zippedName):
     """ Extract a zip file including any nested zip files
+        Nested zip files that fit in memory are extracted from the outer zip file without writing them to disk
         Delete the zip file(s) after extraction
     """
     Act.Set(Act.UNZIP)
-    performAction(Ent.FILE, zippedFile)
+    performAction(Ent.FILE, zippedName)
     Ind.Increment()
     with zipfile.ZipFile(zippedFile, 'r') as zfile:
       inner_files = zfile.infolist()
       for inner_file in inner_files:
         Act.Set(Act.EXTRACT)
         performAction(Ent.FILE, inner_file.filename)
-        innerFilePath = zfile.extract(inner_file, targetFolder)
-        if ZIP_EXTENSION_PATTERN.match(inner_file.filename):
-          extract_nested_zip(innerFilePath)
+        if not ZIP_EXTENSION_PATTERN.match(inner_file.filename):
+          extract_member(zfile, inner_file)
+        elif inner_file.file_size <= NESTED_ZIP_MEMORY_LIMIT:
+          extract_nested_zip(cStringIO.StringIO(zfile.read(inner_file)), inner_file.filename)
+        else:
+          innerFilePath = extract_member(zfile, inner_file)
+          extract_nested_zip(innerFilePath, innerFilePath)
     Ind.Decrement()
+    if isinstance(zippedFile, basestring):
+      try:
+        os.remove(zippedFile)
+      except OSError as e:
+        stderrWarningMsg(e)
+
+# Download the files, yield the zip files to extract as they are downloaded
+  def _downloadFiles():
+    Act.Set(Act.DOWNLOAD)
+    for download, finished in MediaDownloader(s._http, downloads).Run():
+      j, s_object, md5Hash = download.item
+      filename = download.filename
+      if not finished:
+        entityActionPerformedMessage([Ent.CLOUD_STORAGE_FILE, s_object], u'{0:>7.2%}'.format(download.Progress()), j, jcount)
+        continue
+      if download.error is not None:
+        entityModifierNewValueActionFailedWarning([Ent.CLOUD_STORAGE_FILE, s_object], Act.MODIFIER_TO, filename, download.error, j, jcount)
+        continue
+      entityModifierNewValueActionPerformed([Ent.CLOUD_STORAGE_FILE, s_object], Act.MODIFIER_TO, filename, j, jcount)
+      if verifyFiles:
+        Act.Set(Act.VERIFY)
+        if download.Verified():
+          entityActionPerformed([Ent.CLOUD_STORAGE_FILE, s_object, Ent.MD5HASH, md5Hash], j, jcount)
+        else:
+          entityActionFailedWarning([Ent.CLOUD_STORAGE_FILE, s_object, Ent.MD5HASH, md5Hash], u'', j, jcount)
+          return
+        Act.Set(Act.DOWNLOAD)
+      if extractFiles and ZIP_EXTENSION_PATTERN.match(filename):
+        yield (j, filename)
+
+  def _extractFile(item):
+    j, filename = item
     try:
-      os.remove(zippedFile)
-    except OSError as e:
-      stderrWarningMsg(e)
+      extract_nested_zip(filename, filename)
+    except (IOError, OSError, zipfile.BadZipfile) as e:
+      entityActionFailedWarning([Ent.FILE, filename], str(e), j, jcount)
 
   v = buildGAPIObject(API.VAULT)
   s = buildGAPIObject(API.STORAGE)
@@ -18703,49 +20894,18 @@ def doDownloadVaultExport():
   jcount = len(export[u'cloudStorageSink']['files'])
   entityPerformActionNumItems([Ent.VAULT_MATTER, matterNameId, Ent.VAULT_EXPORT, exportNameId], jcount, Ent.CLOUD_STORAGE_FILE)
   Ind.Increment()
+  downloads = []
   j = 0
   for s_file in export[u'cloudStorageSink']['files']:
     j += 1
-    bucket = s_file['bucketName']
     s_object = s_file['objectName']
-    filename = os.path.join(targetFolder, s_object.replace(u'/', u'-'))
-    Act.Set(Act.DOWNLOAD)
-    performAction(Ent.CLOUD_STORAGE_FILE, s_object, j, jcount)
-    Ind.Increment()
-    try:
-      request = s.objects().get_media(bucket=bucket, object=s_object)
-      f = openFile(filename, 'wb')
-      downloader = googleapiclient.http.MediaIoBaseDownload(f, request)
-      done = False
-      while not done:
-        status, done = downloader.next_chunk()
-        entityActionPerformedMessage([Ent.CLOUD_STORAGE_FILE, s_object], u'{0:>7.2%}'.format(status.progress()), j, jcount)
-      entityModifierNewValueActionPerformed([Ent.CLOUD_STORAGE_FILE, s_object], Act.MODIFIER_TO, filename, j, jcount)
-      # Necessary to make sure file is flushed by both Python and OS
-      # https://stackoverflow.com/a/13762137/1503886
-      f.flush()
-      os.fsync(f.fileno())
-      closeFile(f)
-      if verifyFiles:
-        f = openFile(filename, 'rb')
-        Act.Set(Act.VERIFY)
-        hash_md5 = hashlib.md5()
-        for chunk in iter(lambda: f.read(4096), b""):
-          hash_md5.update(chunk)
-        actual_hash = hash_md5.hexdigest()
-        closeFile(f)
-        if actual_hash == s_file['md5Hash']:
-          entityActionPerformed([Ent.CLOUD_STORAGE_FILE, s_object, Ent.MD5HASH, s_file['md5Hash']], j, jcount)
-        else:
-          entityActionFailedWarning([Ent.CLOUD_STORAGE_FILE, s_object, Ent.MD5HASH, s_file['md5Hash']], u'', j, jcount)
-          break
-      if extractFiles and ZIP_EXTENSION_PATTERN.match(filename):
-        Act.Set(Act.EXTRACT)
-        extract_nested_zip(filename)
-        Act.Set(Act.DOWNLOAD)
-    except (IOError, httplib2.HttpLib2Error) as e:
-      entityModifierNewValueActionFailedWarning([Ent.CLOUD_STORAGE_FILE, s_object], Act.MODIFIER_TO, filename, str(e), j, jcount)
-    Ind.Decrement()
+    request = s.objects().get_media(bucket=s_file['bucketName'], object=s_object)
+    downloads.append(MediaDownload(request.uri, os.path.join(targetFolder, s_object.replace(u'/', u'-')),
+                                   int(s_file['size']) if u'size' in s_file else None,
+                                   s_file['md5Hash'] if verifyFiles else None, (j, s_object, s_file['md5Hash'])))
+# The zip files are extracted in other threads while the remaining files are being downloaded
+  for _ in yieldThreadedCallsWithOutput(_extractFile, _downloadFiles()):
+    pass
   Ind.Decrement()
 
 def _getHoldEmailAddressesOrgUnitName(hold, cd):
@@ -20720,6 +22880,7 @@ def getUserAttributes(cd, updateCmd, noUid=False):
 # gam create user <EmailAddress> <UserAttributes> [notify <EmailAddress>] [subject <String>] [message <String>|(file <FileName> [charset <CharSet>])] [html [<Boolean>]]
 def doCreateUser():
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   body, notify, _, _, _ = getUserAttributes(cd, False, noUid=True)
   user = body[u'primaryEmail']
   try:
@@ -20740,14 +22901,18 @@ def doCreateUser():
     entityActionFailedWarning([Ent.USER, user], str(e))
   except GAPI.invalidOrgunit:
     entityActionFailedWarning([Ent.USER, user], Msg.INVALID_ORGUNIT)
+  invalidateUserMaps([user])
 
 # gam <UserTypeEntity> update user <UserAttributes> [updateprimaryemail <RegularExpression> <EmailReplacement>]
 #	[clearschema <SchemaName>] [clearschema <SchemaName>.<FieldName>]
 #	[createifnotfound] [notify <EmailAddress>] [subject <String>] [message <String>|(file <FileName> [charset <CharSet>])] [html [<Boolean>]]
 def updateUsers(entityList):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   body, notify, updatePrimaryEmail, createIfNotFound, groupOrgUnitMap = getUserAttributes(cd, True)
+  graph = getGroupMembershipGraph(cd) if groupOrgUnitMap else None
   vfe = u'primaryEmail' in body and body[u'primaryEmail'][:4].lower() == u'vfe@'
+  renamedUsers = []
   i, count, entityList = getEntityArgument(entityList)
   for user in entityList:
     i += 1
@@ -20772,13 +22937,17 @@ def updateUsers(entityList):
           if not body:
             entityActionNotPerformedWarning([Ent.USER, user], Msg.PRIMARY_EMAIL_DID_NOT_MATCH_PATTERN.format(updatePrimaryEmail[u'search']), i, count)
       if groupOrgUnitMap:
-        try:
-          groups = callGAPIpages(cd.groups(), u'list', u'groups',
-                                 throw_reasons=[GAPI.INVALID_MEMBER],
-                                 userKey=userKey, orderBy=u'email', fields=u'nextPageToken,groups(email)')
-        except (GAPI.invalidMember) as e:
-          entityUnknownWarning(Ent.USER, userKey, i, count)
-          continue
+# A user given by an alias or not in the graph is looked up so that aliases are resolved and unknown users are reported
+        if graph is not None and graph.IsMember(userKey):
+          groups = graph.GetMemberGroups(userKey)
+        else:
+          try:
+            groups = callGAPIpages(cd.groups(), u'list', u'groups',
+                                   throw_reasons=[GAPI.INVALID_MEMBER],
+                                   userKey=userKey, orderBy=u'email', fields=u'nextPageToken,groups(email)')
+          except (GAPI.invalidMember) as e:
+            entityUnknownWarning(Ent.USER, userKey, i, count)
+            continue
         groupList = []
         for group in groups:
           orgUnit = groupOrgUnitMap.get(group[u'email'].lower())
@@ -20796,6 +22965,8 @@ def updateUsers(entityList):
                                            GAPI.INVALID, GAPI.INVALID_INPUT, GAPI.INVALID_ORGUNIT, GAPI.INVALID_SCHEMA_VALUE],
                             userKey=userKey, body=body, fields=u'primaryEmail,name')
           entityActionPerformed([Ent.USER, user], i, count)
+          if u'primaryEmail' in body:
+            renamedUsers.append(userKey)
           if notify.get(u'emailAddress') and notify.get(u'password'):
             sendCreateUpdateUserNotification(notify, result, i, count, False)
         except GAPI.userNotFound:
@@ -20824,6 +22995,8 @@ def updateUsers(entityList):
       entityActionFailedWarning([Ent.USER, user], str(e), i, count)
     except GAPI.invalidOrgunit:
       entityActionFailedWarning([Ent.USER, user], Msg.INVALID_ORGUNIT, i, count)
+  invalidateGroupMembershipGraph(members=renamedUsers)
+  invalidateUserMaps(renamedUsers)
 
 # gam update users <UserTypeEntity> <UserAttributes> [updateprimaryemail <RegularExpression> <EmailReplacement>]
 #	[clearschema <SchemaName>] [clearschema <SchemaName>.<FieldName>]
@@ -20840,7 +23013,9 @@ def doUpdateUser():
 # gam <UserTypeEntity> delete users
 def deleteUsers(entityList):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   checkForExtraneousArguments()
+  deletedUsers = []
   i, count, entityList = getEntityArgument(entityList)
   for user in entityList:
     i += 1
@@ -20850,8 +23025,11 @@ def deleteUsers(entityList):
                throw_reasons=[GAPI.USER_NOT_FOUND, GAPI.DOMAIN_NOT_FOUND, GAPI.DOMAIN_CANNOT_USE_APIS, GAPI.FORBIDDEN],
                userKey=user)
       entityActionPerformed([Ent.USER, user], i, count)
+      deletedUsers.append(user)
     except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden):
       entityUnknownWarning(Ent.USER, user, i, count)
+  invalidateGroupMembershipGraph(members=deletedUsers)
+  invalidateUserMaps(deletedUsers)
 
 # gam delete users <UserTypeEntity>
 def doDeleteUsers():
@@ -20864,6 +23042,7 @@ def doDeleteUser():
 # gam <UserEntity> undelete users [org|ou <OrgUnitPath>]
 def undeleteUsers(entityList):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   if checkArgumentPresent([u'org', u'ou']):
     entitySelector = getEntitySelector()
     if entitySelector:
@@ -20940,6 +23119,7 @@ def doUndeleteUser():
 
 def suspendUnsuspendUsers(entityList, suspended):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   checkForExtraneousArguments()
   body = {u'suspended': suspended}
   i, count, entityList = getEntityArgument(entityList)
@@ -21219,9 +23399,15 @@ def infoUsers(entityList):
   fields = u','.join(set(fieldsList)).replace(u'.', u'/') if fieldsList else None
   if getLicenses:
     lic = buildGAPIObject(API.LICENSING)
+  graph = getGroupMembershipGraph(cd) if getGroups else None
   if isinstance(entityList, dict):
     entityList[u'includeSuspendedInAll'] = True
   i, count, entityList = getEntityArgument(entityList)
+# Listing the licenses once costs less than getting each license of each user when there are many users
+  licenseMap = None
+  if getLicenses and ((GC.Values[GC.LICENSE_MAP_THRESHOLD] and count >= GC.Values[GC.LICENSE_MAP_THRESHOLD]) or
+                      (GC.Values[GC.DIRECTORY_CACHE_MINUTES] and _getDirectoryCacheEntry(DIRECTORY_CACHE_LICENSES, u','.join(sorted(skus))) is not None)):
+    licenseMap = getUserLicenseMap(skus)
   for userEmail in entityList:
     i += 1
     userEmail = normalizeEmailAddressOrUID(userEmail)
@@ -21230,18 +23416,25 @@ def infoUsers(entityList):
                       throw_reasons=GAPI.USER_GET_THROW_REASONS+[GAPI.INVALID_INPUT],
                       userKey=userEmail, projection=projection, customFieldMask=customFieldMask, viewType=viewType, fields=fields)
       if getGroups:
-        groups = callGAPIpages(cd.groups(), u'list', u'groups',
-                               userKey=user[u'primaryEmail'], orderBy=u'email', fields=u'nextPageToken,groups(name,email)')
+        if graph is not None:
+          groups = graph.GetMemberGroups(user[u'primaryEmail'])
+        else:
+          groups = callGAPIpages(cd.groups(), u'list', u'groups',
+                                 userKey=user[u'primaryEmail'], orderBy=u'email', fields=u'nextPageToken,groups(name,email)')
       if getLicenses:
-        svcargs = dict([(u'userId', None), (u'productId', None), (u'skuId', None), (u'fields', u'skuId')]+GM.Globals[GM.EXTRA_ARGS_LIST])
-        method = getattr(lic.licenseAssignments(), u'get')
-        dbatch = lic.new_batch_http_request(callback=_callbackGetLicense)
-        for skuId in skus:
-          svcparms = svcargs.copy()
-          svcparms[u'userId'] = user[u'primaryEmail']
-          svcparms[u'productId'], svcparms[u'skuId'] = SKU.getProductAndSKU(skuId)
-          dbatch.add(method(**svcparms))
-        dbatch.execute()
+        if licenseMap is not None:
+          licenses = licenseMap.get(user[u'primaryEmail'].lower(), [])
+        else:
+          licenses = []
+          svcargs = dict([(u'userId', None), (u'productId', None), (u'skuId', None), (u'fields', u'skuId')]+GM.Globals[GM.EXTRA_ARGS_LIST])
+          method = getattr(lic.licenseAssignments(), u'get')
+          dbatch = lic.new_batch_http_request(callback=_callbackGetLicense)
+          for skuId in skus:
+            svcparms = svcargs.copy()
+            svcparms[u'userId'] = user[u'primaryEmail']
+            svcparms[u'productId'], svcparms[u'skuId'] = SKU.getProductAndSKU(skuId)
+            dbatch.add(method(**svcparms))
+          executeBatch(dbatch, final=True)
       if formatJSON:
         if getGroups:
           user[u'groups'] = groups
@@ -21718,12 +23911,12 @@ def doPrintUsers(entityList=None):
         svcparms[u'userKey'] = normalizeEmailAddressOrUID(userEntity)
         dbatch.add(method(**svcparms), request_id=batchRequestID(u'', 0, 0, j, jcount, svcparms[u'userKey']))
         bcount += 1
-        if bcount >= GC.Values[GC.BATCH_SIZE]:
+        if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
           executeBatch(dbatch)
           dbatch = cd.new_batch_http_request(callback=_callbackPrintUser)
           bcount = 0
       if bcount > 0:
-        dbatch.execute()
+        executeBatch(dbatch, final=True)
 # The only field specified was primaryEmail, just list the users/count the domains
     elif not countOnly:
       for userEntity in entityList:
@@ -21740,19 +23933,23 @@ def doPrintUsers(entityList=None):
         csvRows.sort(key=lambda k: k[orderBy], reverse=sortOrder == u'DESCENDING')
     if getGroupFeed:
       addTitlesToCSVfile([u'GroupsCount', u'Groups'], titles)
+      graph = getGroupMembershipGraph(cd)
       i = 0
       count = len(csvRows)
       for user in csvRows:
         i += 1
         userEmail = user[u'primaryEmail']
-        printGettingAllEntityItemsForWhom(Ent.GROUP_MEMBERSHIP, userEmail, i, count)
-        groups = callGAPIpages(cd.groups(), u'list', u'groups',
-                               userKey=userEmail, orderBy=u'email', fields=u'nextPageToken,groups(email)')
+        if graph is not None:
+          groups = graph.GetMemberGroups(userEmail)
+        else:
+          printGettingAllEntityItemsForWhom(Ent.GROUP_MEMBERSHIP, userEmail, i, count)
+          groups = callGAPIpages(cd.groups(), u'list', u'groups',
+                                 userKey=userEmail, orderBy=u'email', fields=u'nextPageToken,groups(email)')
         user[u'GroupsCount'] = len(groups)
         user[u'Groups'] = delimiter.join([groupname[u'email'] for groupname in groups])
     if getLicenseFeed:
       addTitlesToCSVfile([u'LicensesCount', u'Licenses', u'LicensesDisplay'], titles)
-      licenses = doPrintLicenses(returnFields=u'userId,skuId')
+      licenses = getUserLicenseMap()
       if licenses:
         for user in csvRows:
           u_licenses = licenses.get(user[u'primaryEmail'].lower())
@@ -23283,12 +25480,12 @@ def _batchAddParticipantsToCourse(croom, courseId, i, count, addParticipants, ro
       cleanItem = removeCourseIdScope(svcparms[u'body'][attribute])
     dbatch.add(method(**svcparms), request_id=batchRequestID(noScopeCourseId, 0, 0, j, jcount, cleanItem, role))
     bcount += 1
-    if bcount >= GC.Values[GC.BATCH_SIZE]:
+    if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
       executeBatch(dbatch)
       dbatch = croom.new_batch_http_request(callback=_callbackAddParticipantsToCourse)
       bcount = 0
   if bcount > 0:
-    dbatch.execute()
+    executeBatch(dbatch, final=True)
   Ind.Decrement()
 
 def _batchRemoveParticipantsFromCourse(croom, courseId, i, count, removeParticipants, role):
@@ -23335,12 +25532,12 @@ def _batchRemoveParticipantsFromCourse(croom, courseId, i, count, removeParticip
       cleanItem = removeCourseIdScope(svcparms[attribute])
     dbatch.add(method(**svcparms), request_id=batchRequestID(noScopeCourseId, 0, 0, j, jcount, cleanItem, role))
     bcount += 1
-    if bcount >= GC.Values[GC.BATCH_SIZE]:
+    if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
       executeBatch(dbatch)
       dbatch = croom.new_batch_http_request(callback=_callbackRemoveParticipantsFromCourse)
       bcount = 0
   if bcount > 0:
-    dbatch.execute()
+    executeBatch(dbatch, final=True)
   Ind.Decrement()
 
 ADD_REMOVE_PARTICIPANT_TYPES_MAP = {
@@ -27271,40 +29468,117 @@ def printShowDriveSettings(users):
     writeCSVfile(csvRows, titles, u'User Drive Settings', todrive, [u'email',]+DRIVESETTINGS_SCALAR_FIELDS)
 
 def initFilePathInfo():
-  return {u'ids': {}, u'allPaths': {}, u'localPaths': None}
-
-def getFilePaths(drive, fileTree, initialResult, filePathInfo, addParentsToTree=False):
-  def _followParent(paths, parentId):
-    result = None
-    paths.setdefault(parentId, {})
-    if fileTree:
-      parentEntry = fileTree.get(parentId)
-      if not parentEntry:
-        if not addParentsToTree:
-          return
-        parentEntry = fileTree[parentId] = {u'info': {u'id': parentId, VX_FILENAME: parentId, u'mimeType': MIMETYPE_GA_FOLDER}, u'children': []}
-      if parentEntry[u'info'][VX_FILENAME] == parentEntry[u'info'][u'id']:
+  return {u'ids': {}, u'parents': {}, u'allPaths': {}, u'localPaths': None}
+
+# The names and parents of shared drive folders are the same for all users; they are kept for the users of a command
+# and, if drive_path_cache is true, saved in drivepathcache.json for subsequent commands. The saved names and parents
+# are used until drive_path_cache_minutes after the file was created so that renamed or moved folders are gotten again.
+def _getDriveFolderInfoMap():
+  if GM.Globals[GM.MAP_DRIVE_FOLDER_ID_TO_INFO] is None:
+    folders = {}
+    cacheTime = time.time()
+    if GC.Values[GC.DRIVE_PATH_CACHE]:
+      data = readFile(os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_DRIVE_PATH_CACHE_JSON), continueOnError=True, displayError=False)
+      if data:
         try:
-          result = callGAPI(drive.files(), u'get',
-                            throw_reasons=GAPI.DRIVE_GET_THROW_REASONS,
-                            fileId=parentId, fields=VX_FILENAME_PARENTS)
-          parentEntry[u'info'][VX_FILENAME] = result[VX_FILENAME]
-          parentEntry[u'info'][u'parents'] = result.get(u'parents', [])
-        except (GAPI.fileNotFound, GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy):
+          cache = json.loads(data)
+          if (isinstance(cache, dict) and isinstance(cache.get(u'folders'), dict) and isinstance(cache.get(u'time'), (int, float)) and
+              0 <= cacheTime-cache[u'time'] <= GC.Values[GC.DRIVE_PATH_CACHE_MINUTES]*60):
+            folders = cache[u'folders']
+            cacheTime = cache[u'time']
+        except ValueError:
           pass
-      filePathInfo[u'ids'][parentId] = parentEntry[u'info'][VX_FILENAME]
-      parents = parentEntry[u'info'].get(u'parents', [])
-    else:
+    GM.Globals[GM.MAP_DRIVE_FOLDER_ID_TO_INFO] = {u'folders': folders, u'time': cacheTime, u'changed': False}
+  return GM.Globals[GM.MAP_DRIVE_FOLDER_ID_TO_INFO]
+
+def saveDriveFolderInfoMap():
+  folderInfoMap = GM.Globals[GM.MAP_DRIVE_FOLDER_ID_TO_INFO]
+  if GC.Values[GC.DRIVE_PATH_CACHE] and folderInfoMap and folderInfoMap[u'changed']:
+    writeFileAtomic(os.path.join(os.path.dirname(GC.Values[GC.OAUTH2_TXT]), GC.FN_DRIVE_PATH_CACHE_JSON),
+                    json.dumps({u'time': folderInfoMap[u'time'], u'folders': folderInfoMap[u'folders']}, ensure_ascii=False, separators=(u',', u':')))
+    folderInfoMap[u'changed'] = False
+
+# Get the names and parents of parentIds and their ancestors; the unknown folders at each level are gotten in a batch
+def _getFilePathParents(drive, fileTree, parentIds, filePathInfo, addParentsToTree):
+  def _callbackGetParent(request_id, response, exception):
+    if exception is None:
+      results[request_id] = response
+
+  def _setParentInfo(parentId, name, parents):
+    if name is not None:
+      filePathInfo[u'ids'][parentId] = name
+    filePathInfo[u'parents'][parentId] = parents
+    if parentId in unknownParentIds:
+      fileTree.UpdateInfo(parentId, {VX_FILENAME: name, u'parents': [{u'id': lparentId} for lparentId in parents]})
+
+  folderInfoMap = _getDriveFolderInfoMap()
+  folders = folderInfoMap[u'folders']
+  unknownParentIds = set()
+  while parentIds:
+    getIds = []
+    for parentId in parentIds:
+      if fileTree:
+        if parentId not in fileTree:
+          if not addParentsToTree:
+            filePathInfo[u'parents'][parentId] = []
+            continue
+          fileTree.AddFolder(parentId)
+        parentInfo = fileTree.Info(parentId)
+        if parentInfo[VX_FILENAME] != parentId:
+          _setParentInfo(parentId, parentInfo[VX_FILENAME], fileTree.Parents(parentId))
+          continue
+        unknownParentIds.add(parentId)
+      if parentId in folders:
+        _setParentInfo(parentId, folders[parentId][0], folders[parentId][1])
+      else:
+        getIds.append(parentId)
+    results = {}
+    if len(getIds) == 1:
       try:
-        result = callGAPI(drive.files(), u'get',
-                          throw_reasons=GAPI.DRIVE_GET_THROW_REASONS,
-                          fileId=parentId, fields=VX_FILENAME_PARENTS)
-        filePathInfo[u'ids'][parentId] = result[VX_FILENAME]
-        parents = result.get(u'parents', [])
+        results[getIds[0]] = callGAPI(drive.files(), u'get',
+                                      throw_reasons=GAPI.DRIVE_GET_THROW_REASONS,
+                                      fileId=getIds[0], fields=VX_FILENAME_PARENTS_TEAMDRIVEID)
       except (GAPI.fileNotFound, GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy):
-        return
-    for lparent in parents:
-      lparentId = lparent[u'id']
+        pass
+    elif getIds:
+      svcargs = dict([(u'fileId', None), (u'fields', VX_FILENAME_PARENTS_TEAMDRIVEID)]+GM.Globals[GM.EXTRA_ARGS_LIST])
+      method = getattr(drive.files(), u'get')
+      dbatch = drive.new_batch_http_request(callback=_callbackGetParent)
+      bcount = 0
+      for parentId in getIds:
+        svcparms = svcargs.copy()
+        svcparms[u'fileId'] = parentId
+        dbatch.add(method(**svcparms), request_id=parentId)
+        bcount += 1
+        if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
+          executeBatch(dbatch)
+          dbatch = drive.new_batch_http_request(callback=_callbackGetParent)
+          bcount = 0
+      if bcount > 0:
+        executeBatch(dbatch, final=True)
+    for parentId in getIds:
+      result = results.get(parentId)
+      if result is not None:
+        parents = [lparent[u'id'] for lparent in result.get(u'parents', [])]
+        _setParentInfo(parentId, result[VX_FILENAME], parents)
+        if result.get(u'teamDriveId'):
+          folders[parentId] = [result[VX_FILENAME], parents]
+          folderInfoMap[u'changed'] = True
+      elif parentId in unknownParentIds:
+        _setParentInfo(parentId, parentId, fileTree.Parents(parentId))
+      else:
+        filePathInfo[u'parents'][parentId] = []
+    nextParentIds = set()
+    for parentId in parentIds:
+      for lparentId in filePathInfo[u'parents'][parentId]:
+        if lparentId not in filePathInfo[u'parents']:
+          nextParentIds.add(lparentId)
+    parentIds = list(nextParentIds)
+
+def getFilePaths(drive, fileTree, initialResult, filePathInfo, addParentsToTree=False):
+  def _followParent(paths, parentId):
+    paths.setdefault(parentId, {})
+    for lparentId in filePathInfo[u'parents'].get(parentId, []):
       if lparentId not in filePathInfo[u'allPaths']:
         _followParent(paths[parentId], lparentId)
         filePathInfo[u'allPaths'][lparentId] = paths[parentId][lparentId]
@@ -27326,6 +29600,8 @@ def getFilePaths(drive, fileTree, initialResult, filePathInfo, addParentsToTree=
   filePaths = []
   parents = initialResult.get(u'parents', [])
   if parents:
+    _getFilePathParents(drive, fileTree, [parent[u'id'] for parent in parents if parent[u'id'] not in filePathInfo[u'parents']],
+                        filePathInfo, addParentsToTree)
     filePathInfo[u'localPaths'] = {}
     for parent in parents:
       parentId = parent[u'id']
@@ -27653,6 +29929,7 @@ def showFileInfo(users):
         userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
         break
     Ind.Decrement()
+  saveDriveFolderInfoMap()
 
 def getRevisionsEntity():
   revisionsEntity = {u'list': [], u'dict': None, u'count': None, u'time': None, u'range': None}
@@ -28098,34 +30375,190 @@ def _getShowOwnedBy(query):
 
 OWNED_BY_ME_FIELDS_TITLES = [u'ownedByMe',]
 
+# A tree of Drive files; the files are nodes with integer indexes. Each id is kept once, the fields of each file are kept in a tuple
+# with the field names shared by the files that have the same fields and the parent/child links are kept in arrays
+# rather than in a dict per file and a list of children ids per folder so that the trees of drives with millions of files fit in memory.
+# Files added by Add are linked to their parents, or to Orphans, and their children are known;
+# files added by SetInfo are not linked to their parents and their children are known only if childrenKnown is True.
+class DriveFileTree(object):
+  ORPHANS = u'Orphans'
+# The values of these fields are kept once
+  INTERNED_FIELDS = frozenset([u'mimeType'])
+
+  def __init__(self):
+    self.index = {}
+    self.ids = []
+    self.fieldNames = []
+    self.fieldNamesIndex = {}
+    self.fieldNamesIds = array.array('i')
+    self.fieldValues = []
+    self.strings = {}
+    self.childrenKnown = bytearray()
+    self.firstChild = array.array('i')
+    self.lastChild = array.array('i')
+    self.linkChild = array.array('i')
+    self.linkNext = array.array('i')
+    self.firstParent = array.array('i')
+    self.moreParents = {}
+    self.unlinkedParents = {}
+
+  def __len__(self):
+    return len(self.ids)
+
+  def __contains__(self, fileId):
+    return fileId in self.index
+
+  def _getNode(self, fileId):
+    node = self.index.get(fileId)
+    if node is None:
+      node = len(self.ids)
+      try:
+        fileId = intern(fileId.encode(u'ascii'))
+      except UnicodeError:
+        pass
+      self.index[fileId] = node
+      self.ids.append(fileId)
+      self.fieldNamesIds.append(-1)
+      self.fieldValues.append(None)
+      self.childrenKnown.append(0)
+      self.firstChild.append(-1)
+      self.lastChild.append(-1)
+      self.firstParent.append(-1)
+    return node
+
+# Parents with only an id are rebuilt from the links when the fields are gotten
+  def _setFields(self, node, fileInfo):
+    names = []
+    values = []
+    for name, value in iteritems(fileInfo):
+      if name == u'id':
+        continue
+      if name == u'parents':
+        if all(len(parent) == 1 for parent in value):
+          value = None
+      elif name in self.INTERNED_FIELDS:
+        value = self.strings.setdefault(value, value)
+      names.append(name)
+      values.append(value)
+    names = tuple(names)
+    k = self.fieldNamesIndex.get(names)
+    if k is None:
+      k = self.fieldNamesIndex[names] = len(self.fieldNames)
+      self.fieldNames.append(names)
+    self.fieldNamesIds[node] = k
+    self.fieldValues[node] = tuple(values)
+
+  def _link(self, parentNode, node):
+    link = len(self.linkChild)
+    self.linkChild.append(node)
+    self.linkNext.append(-1)
+    if self.lastChild[parentNode] == -1:
+      self.firstChild[parentNode] = link
+    else:
+      self.linkNext[self.lastChild[parentNode]] = link
+    self.lastChild[parentNode] = link
+
+  def _getParentNodes(self, node):
+    if self.firstParent[node] == -1:
+      return []
+    return [self.firstParent[node]]+self.moreParents.get(node, [])
+
+  def Add(self, fileInfo):
+    if u'parents' not in fileInfo:
+      fileInfo[u'parents'] = []
+    node = self._getNode(fileInfo[u'id'])
+    self._setFields(node, fileInfo)
+    self.childrenKnown[node] = 1
+    self.unlinkedParents.pop(node, None)
+    self.firstParent[node] = -1
+    self.moreParents.pop(node, None)
+    parents = fileInfo[u'parents']
+    if not parents:
+      self._link(self._getFolderNode(self.ORPHANS), node)
+      return
+    for parent in parents:
+      parentNode = self._getFolderNode(parent[u'id'])
+      self._link(parentNode, node)
+      if self.firstParent[node] == -1:
+        self.firstParent[node] = parentNode
+      else:
+        self.moreParents.setdefault(node, []).append(parentNode)
+
+  def _getFolderNode(self, fileId):
+    node = self.index.get(fileId)
+    if node is None:
+      node = self._getNode(fileId)
+      self._setFields(node, {VX_FILENAME: fileId, u'mimeType': MIMETYPE_GA_FOLDER})
+      self.childrenKnown[node] = 1
+    return node
+
+# Add a folder that is known only by its id
+  def AddFolder(self, fileId):
+    self._getFolderNode(fileId)
+
+  def SetInfo(self, fileInfo, childrenKnown=False):
+    node = self._getNode(fileInfo[u'id'])
+    self._setFields(node, fileInfo)
+    self.unlinkedParents[node] = [parent[u'id'] for parent in fileInfo.get(u'parents', [])]
+    self.childrenKnown[node] = 1 if childrenKnown else 0
+
+  def UpdateInfo(self, fileId, fields):
+    node = self.index[fileId]
+    fileInfo = self.Info(fileId)
+    fileInfo.update(fields)
+    if u'parents' in fields and (node in self.unlinkedParents or self.firstParent[node] == -1):
+      self.unlinkedParents[node] = [parent[u'id'] for parent in fields[u'parents']]
+    self._setFields(node, fileInfo)
+
+  def Info(self, fileId):
+    node = self.index.get(fileId)
+    if node is None or self.fieldNamesIds[node] == -1:
+      return None
+    fileInfo = {u'id': self.ids[node]}
+    for name, value in zip(self.fieldNames[self.fieldNamesIds[node]], self.fieldValues[node]):
+      if name == u'parents' and value is None:
+        value = [{u'id': parentId} for parentId in self.Parents(fileId)]
+      fileInfo[name] = value
+    return fileInfo
+
+  def Parents(self, fileId):
+    node = self.index[fileId]
+    if node in self.unlinkedParents:
+      return self.unlinkedParents[node][:]
+    return [self.ids[parentNode] for parentNode in self._getParentNodes(node)]
+
+  def ChildrenKnown(self, fileId):
+    node = self.index.get(fileId)
+    return node is not None and self.childrenKnown[node] == 1
+
+  def Children(self, fileId):
+    children = []
+    node = self.index.get(fileId)
+    if node is not None:
+      link = self.firstChild[node]
+      while link != -1:
+        children.append(self.ids[self.linkChild[link]])
+        link = self.linkNext[link]
+    return children
+
+  def AddChild(self, fileId, childFileId):
+    self._link(self.index[fileId], self._getNode(childFileId))
+
 def initFileTree(drive):
-  fileTree = {u'Orphans': {u'info': {u'id': u'Orphans', VX_FILENAME: u'Orphans', u'mimeType': MIMETYPE_GA_FOLDER, u'ownedByMe': True}, u'children': []}}
+  fileTree = DriveFileTree()
+  fileTree.SetInfo({u'id': DriveFileTree.ORPHANS, VX_FILENAME: DriveFileTree.ORPHANS, u'mimeType': MIMETYPE_GA_FOLDER, u'ownedByMe': True}, True)
   try:
     f_file = callGAPI(drive.files(), u'get',
                       throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
                       fileId=u'root', fields=u','.join(VX_FILEPATH_FIELDS+OWNED_BY_ME_FIELDS_TITLES))
-    fileTree[f_file[u'id']] = {u'info': f_file, u'children': []}
+    fileTree.SetInfo(f_file, True)
   except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy):
     pass
   return fileTree
 
 def extendFileTree(fileTree, feed):
   for f_file in feed:
-    if u'parents' not in f_file:
-      f_file[u'parents'] = []
-    fileId = f_file[u'id']
-    if fileId not in fileTree:
-      fileTree[fileId] = {u'info': f_file, u'children': []}
-    else:
-      fileTree[fileId][u'info'] = f_file
-    parents = f_file[u'parents']
-    if not parents:
-      parents = [{u'id': u'Orphans'}]
-    for parent in parents:
-      parentId = parent[u'id']
-      if parentId not in fileTree:
-        fileTree[parentId] = {u'info': {u'id': parentId, VX_FILENAME: parentId, u'mimeType': MIMETYPE_GA_FOLDER}, u'children': []}
-      fileTree[parentId][u'children'].append(fileId)
+    fileTree.Add(f_file)
 
 def buildFileTree(feed, drive):
   fileTree = initFileTree(drive)
@@ -28387,16 +30820,15 @@ def printFileList(users):
                           csvRows, titles)
 
   def _printChildDriveFolderContents(drive, fileEntry, user, i, count, depth):
-    parentFileEntry = fileTree.get(fileEntry[u'id'])
-    if parentFileEntry and u'children' in parentFileEntry:
-      for childFileId in parentFileEntry[u'children']:
-        childEntry = fileTree.get(childFileId)
-        if childEntry:
+    if fileTree.ChildrenKnown(fileEntry[u'id']):
+      for childFileId in fileTree.Children(fileEntry[u'id']):
+        childEntryInfo = fileTree.Info(childFileId)
+        if childEntryInfo:
           if childFileId not in filesPrinted:
             filesPrinted.add(childFileId)
-            _printFileInfo(drive, user, childEntry[u'info'].copy())
-          if childEntry[u'info'][u'mimeType'] == MIMETYPE_GA_FOLDER and (maxdepth == -1 or depth < maxdepth):
-            _printChildDriveFolderContents(drive, childEntry[u'info'], user, i, count, depth+1)
+            _printFileInfo(drive, user, childEntryInfo.copy())
+          if childEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER and (maxdepth == -1 or depth < maxdepth):
+            _printChildDriveFolderContents(drive, childEntryInfo, user, i, count, depth+1)
       return
     q = WITH_PARENTS.format(fileEntry[u'id'])
     if selectSubQuery:
@@ -28414,8 +30846,8 @@ def printFileList(users):
       return
     for childEntryInfo in children:
       childFileId = childEntryInfo[u'id']
-      if filepath:
-        fileTree.setdefault(childFileId, {u'info': childEntryInfo})
+      if filepath and childFileId not in fileTree:
+        fileTree.SetInfo(childEntryInfo)
       if childFileId not in filesPrinted:
         filesPrinted.add(childFileId)
         _printFileInfo(drive, user, childEntryInfo.copy())
@@ -28570,7 +31002,7 @@ def printFileList(users):
       if queryError:
         break
       continue
-    fileTree = {}
+    fileTree = DriveFileTree()
     if buildTree:
       printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, user, i, count, query=DLP.query)
       try:
@@ -28601,16 +31033,14 @@ def printFileList(users):
     j = 0
     for fileId in fileIdEntity[u'list']:
       j += 1
-      fileEntry = fileTree.get(fileId)
-      if fileEntry:
-        fileEntryInfo = fileEntry[u'info']
-      else:
+      fileEntryInfo = fileTree.Info(fileId)
+      if not fileEntryInfo:
         try:
           fileEntryInfo = callGAPI(drive.files(), u'get',
                                    throw_reasons=GAPI.DRIVE_GET_THROW_REASONS,
                                    fileId=fileId, fields=fields)
           if filepath:
-            fileTree[fileId] = {u'info': fileEntryInfo}
+            fileTree.SetInfo(fileEntryInfo)
         except GAPI.fileNotFound:
           entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE_OR_FOLDER, fileId], Msg.NOT_FOUND, j, jcount)
           continue
@@ -28625,6 +31055,7 @@ def printFileList(users):
           _printFileInfo(drive, user, fileEntryInfo.copy())
       if fileEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER:
         _printChildDriveFolderContents(drive, fileEntryInfo, user, i, count, 0)
+  saveDriveFolderInfoMap()
   if not csvRows:
     addTitlesToCSVfile([u'Owner', u'id', fileNameTitle], titles)
     setSysExitRC(NO_ENTITIES_FOUND)
@@ -28695,6 +31126,7 @@ def printShowFilePaths(users):
         userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
         break
     Ind.Decrement()
+  saveDriveFolderInfoMap()
   if csvFormat:
     writeCSVfile(csvRows, titles, u'Drive File Paths', todrive, [u'Owner', u'id', fileNameTitle, u'paths'] if not oneItemPerRow else None)
 
@@ -28740,11 +31172,20 @@ def printShowFileCounts(users):
     total = 0
     mimeTypeCounts = {}
     printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, user, i, count, query=DLP.query)
+# Count each page as it arrives rather than holding the whole feed
     try:
-      feed = callGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
-                           page_message=getPageMessageForWhom(),
-                           throw_reasons=GAPI.DRIVE_USER_THROW_REASONS+[GAPI.INVALID_QUERY, GAPI.INVALID, GAPI.FILE_NOT_FOUND],
-                           q=DLP.query, fields=pagesfields, maxResults=GC.Values[GC.DRIVE_MAX_RESULTS])
+      for feed in yieldGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
+                                 page_message=getPageMessageForWhom(),
+                                 throw_reasons=GAPI.DRIVE_USER_THROW_REASONS+[GAPI.INVALID_QUERY, GAPI.INVALID, GAPI.FILE_NOT_FOUND],
+                                 q=DLP.query, fields=pagesfields, maxResults=GC.Values[GC.DRIVE_MAX_RESULTS]):
+        for f_file in feed:
+          if (not DLP.CheckMinimumFileSize(f_file) or
+              not DLP.CheckFilenameMatch(f_file) or
+              not DLP.CheckPermissonMatches(f_file)):
+            continue
+          total += 1
+          mimeTypeCounts.setdefault(f_file[u'mimeType'], 0)
+          mimeTypeCounts[f_file[u'mimeType']] += 1
     except (GAPI.invalidQuery, GAPI.invalid):
       entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE_OR_FOLDER, None], invalidQuery(DLP.query), i, count)
       continue
@@ -28754,14 +31195,6 @@ def printShowFileCounts(users):
     except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
       userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
       continue
-    for f_file in feed:
-      if (not DLP.CheckMinimumFileSize(f_file) or
-          not DLP.CheckFilenameMatch(f_file) or
-          not DLP.CheckPermissonMatches(f_file)):
-        continue
-      total += 1
-      mimeTypeCounts.setdefault(f_file[u'mimeType'], 0)
-      mimeTypeCounts[f_file[u'mimeType']] += 1
     if not csvFormat:
       printEntityKVList([Ent.USER, user], [Ent.Choose(Ent.DRIVE_FILE_OR_FOLDER, total), total], i, count)
       Ind.Increment()
@@ -28811,19 +31244,18 @@ def showFileTree(users):
     else:
       printKeyValueList([fileEntry[VX_FILENAME]])
 
-  def _showDriveFolderContents(fileEntry, depth):
-    for childId in fileEntry[u'children']:
-      childEntry = fileTree.get(childId)
-      if childEntry:
-        if (DLP.CheckMimeType(childEntry[u'info']) and
-            DLP.CheckMinimumFileSize(childEntry[u'info']) and
-            DLP.CheckFilenameMatch(childEntry[u'info']) and
-            DLP.CheckPermissonMatches(childEntry[u'info'])):
-          _showFileInfo(childEntry[u'info'])
-        if childEntry[u'info'][u'mimeType'] == MIMETYPE_GA_FOLDER and (maxdepth == -1 or depth < maxdepth):
-          Ind.Increment()
-          _showDriveFolderContents(childEntry, depth+1)
-          Ind.Decrement()
+  def _showDriveFolderContents(fileId, depth):
+    for childId in fileTree.Children(fileId):
+      childEntryInfo = fileTree.Info(childId)
+      if (DLP.CheckMimeType(childEntryInfo) and
+          DLP.CheckMinimumFileSize(childEntryInfo) and
+          DLP.CheckFilenameMatch(childEntryInfo) and
+          DLP.CheckPermissonMatches(childEntryInfo)):
+        _showFileInfo(childEntryInfo)
+      if childEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER and (maxdepth == -1 or depth < maxdepth):
+        Ind.Increment()
+        _showDriveFolderContents(childId, depth+1)
+        Ind.Decrement()
 
   def _showChildDriveFolderContents(drive, fileEntry, user, i, count, depth):
     q = WITH_PARENTS.format(fileEntry[u'id'])
@@ -28854,7 +31286,6 @@ def showFileTree(users):
   maxdepth = -1
   fileIdEntity = initDriveFileEntity()
   selectSubQuery = u''
-  fieldsList = [u'id', VX_FILENAME, VX_PARENTS_ID, u'mimeType', u'owners(emailAddress)', VX_SIZE]
   showFields = {}
   for field in FILETREE_FIELDS_CHOICE_MAP:
     showFields[FILETREE_FIELDS_CHOICE_MAP[field]] = False
@@ -28889,6 +31320,12 @@ def showFileTree(users):
                and _simpleFileIdEntityList(fileIdEntity[u'list']))
   if buildTree:
     defaultSelection = not fileIdEntity[u'list']
+# Only get the fields that are shown or checked
+  fieldsList = [u'id', VX_FILENAME, VX_PARENTS_ID, u'mimeType']
+  if showFields[u'owners']:
+    fieldsList.append(u'owners(emailAddress)')
+  if showFields[VX_SIZE] or DLP.minimumFileSize is not None:
+    fieldsList.append(VX_SIZE)
   if DLP.permissionMatches:
     fieldsList.append('permissions')
   fields = u','.join(set(fieldsList)).replace(u'.', u'/')
@@ -28928,12 +31365,10 @@ def showFileTree(users):
       if userError:
         continue
       if defaultSelection:
-        if u'Orphans' in fileTree and fileTree[u'Orphans'][u'children']:
-          cleanFileIDsList(fileIdEntity, [u'root', u'Orphans'])
+        if fileTree.Children(DriveFileTree.ORPHANS):
+          cleanFileIDsList(fileIdEntity, [u'root', DriveFileTree.ORPHANS])
         else:
           cleanFileIDsList(fileIdEntity, [u'root',])
-    else:
-      fileTree = {}
     user, drive, jcount = _validateUserGetFileIDs(origUser, i, count, fileIdEntity, drive=drive, entityType=Ent.DRIVE_FILE_OR_FOLDER)
     if jcount == 0:
       continue
@@ -28942,11 +31377,10 @@ def showFileTree(users):
     for fileId in fileIdEntity[u'list']:
       j += 1
       if buildTree:
-        fileEntry = fileTree.get(fileId)
-        if not fileEntry:
+        fileEntryInfo = fileTree.Info(fileId)
+        if not fileEntryInfo:
           entityActionFailedWarning([Ent.DRIVE_FILE_OR_FOLDER, fileId], Msg.NOT_FOUND, j, jcount)
           continue
-        fileEntryInfo = fileEntry[u'info']
       else:
         try:
           fileEntryInfo = callGAPI(drive.files(), u'get',
@@ -28961,7 +31395,7 @@ def showFileTree(users):
       _showFileInfo(fileEntryInfo, j, jcount)
       Ind.Increment()
       if buildTree:
-        _showDriveFolderContents(fileEntry, 0)
+        _showDriveFolderContents(fileId, 0)
       else:
         _showChildDriveFolderContents(drive, fileEntryInfo, user, i, count, 0)
       Ind.Decrement()
@@ -29146,10 +31580,11 @@ STAT_FILE_DUPLICATE = 9
 STAT_FILE_FAILED = 10
 STAT_FILE_NOT_COPYABLE_MOVABLE = 11
 STAT_FILE_PERMISSIONS_FAILED = 12
-STAT_LENGTH = 13
+STAT_FILE_ALREADY_COPIED = 13
+STAT_LENGTH = 14
 
 FOLDER_SUBTOTAL_STATS = [STAT_FOLDER_COPIED_MOVED, STAT_FOLDER_DUPLICATE, STAT_FOLDER_MERGED, STAT_FOLDER_FAILED, STAT_FOLDER_NOT_WRITABLE]
-FILE_SUBTOTAL_STATS = [STAT_FILE_COPIED_MOVED, STAT_FILE_DUPLICATE, STAT_FILE_FAILED, STAT_FILE_NOT_COPYABLE_MOVABLE]
+FILE_SUBTOTAL_STATS = [STAT_FILE_COPIED_MOVED, STAT_FILE_DUPLICATE, STAT_FILE_FAILED, STAT_FILE_NOT_COPYABLE_MOVABLE, STAT_FILE_ALREADY_COPIED]
 
 def _initStatistics():
   return [0] * STAT_LENGTH
@@ -29161,6 +31596,10 @@ def _incrStatistic(statistics, stat):
   elif stat in FILE_SUBTOTAL_STATS:
     statistics[STAT_FILE_TOTAL] += 1
 
+def _addStatistics(statistics, addStatistics):
+  for stat, value in enumerate(addStatistics):
+    statistics[stat] += value
+
 def _printStatistics(user, statistics, i, count, copy):
   if statistics[STAT_FOLDER_TOTAL]:
     if copy:
@@ -29193,7 +31632,8 @@ def _printStatistics(user, statistics, i, count, copy):
                                                          statistics[STAT_FILE_DUPLICATE],
                                                          statistics[STAT_FILE_FAILED],
                                                          statistics[STAT_FILE_NOT_COPYABLE_MOVABLE],
-                                                         statistics[STAT_FILE_PERMISSIONS_FAILED])],
+                                                         statistics[STAT_FILE_PERMISSIONS_FAILED],
+                                                         statistics[STAT_FILE_ALREADY_COPIED])],
                         i, count)
     else:
       printEntityKVList([Ent.USER, user],
@@ -29325,19 +31765,22 @@ def _getUniqueFilename(destFilename, mimeType, targetChildren):
     return u'{0}({1}).{2}'.format(base, n+1, ext)
   return u'{0}({1})'.format(base, n+1)
 
+# The non-owner permissions are added to the new file in a batch
 def _copyPermissions(drive, user, i, count, j, jcount, entityType, fileId, fileTitle, newFileId, newFileTitle,
                      statistics, stat):
   try:
     try:
       permissions = callGAPIpages(drive.permissions(), u'list', VX_PAGES_PERMISSIONS,
                                   throw_reasons=GAPI.DRIVE_ACCESS_THROW_REASONS,
-                                  fileId=fileId, fields=VX_NPT_PERMISSIONS_FIELDLIST.format(u'additionalRoles,domain,emailAddress,expirationDate,role,type,withLink'))
+                                  fileId=fileId, fields=VX_NPT_PERMISSIONS_FIELDLIST.format(u'additionalRoles,domain,emailAddress,expirationDate,id,role,type,withLink'))
     except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError) as e:
       entityActionFailedWarning([Ent.USER, user, entityType, fileTitle], str(e), j, jcount)
       _incrStatistic(statistics, stat)
       return
+# Drive doesn't support concurrent changes to the permissions of a file, the permissions are added one at a time
     for permission in permissions:
       if permission[u'role'] != u'owner':
+        permissionId = permission.pop(u'id')
         if permission[u'type'] in [u'user', u'group']:
           permission[u'value'] = permission.pop(u'emailAddress')
           permission.pop(u'domain')
@@ -29351,7 +31794,7 @@ def _copyPermissions(drive, user, i, count, j, jcount, entityType, fileId, fileT
         except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError) as e:
           entityActionFailedWarning([Ent.USER, user, entityType, newFileTitle], str(e), j, jcount)
         except GAPI.invalidSharingRequest as e:
-          entityActionFailedWarning([Ent.USER, user, entityType, newFileTitle], Ent.TypeNameMessage(Ent.PERMISSION_ID, permission[u'id'], str(e)), j, jcount)
+          entityActionFailedWarning([Ent.USER, user, entityType, newFileTitle], Ent.TypeNameMessage(Ent.PERMISSION_ID, permissionId, str(e)), j, jcount)
   except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
     userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
     _incrStatistic(statistics, stat)
@@ -29399,6 +31842,50 @@ def _checkForDuplicateTargetFile(drive, user, k, kcount, child, destFilename, ta
   child[VX_FILENAME] = destFilename
   return False
 
+# The checkpoint file of copy|move drivefile has a line "<User> <SourceFileID> <NewFileID>" for each file copied and folder created;
+# when a command is rerun with the same checkpoint file, those files are not copied and those folders are not created again
+class CopyMoveCheckpoint(object):
+  def __init__(self, fileName):
+    self.ids = {}
+    self.f = None
+    self.lock = threading.Lock()
+    if fileName:
+      data = readFile(fileName, continueOnError=True, displayError=False, encoding=UTF8)
+      for line in (data or u'').splitlines():
+        fields = line.split()
+        if len(fields) == 3:
+          self.ids[(fields[0], fields[1])] = fields[2]
+      self.f = openFile(fileName, mode=u'a')
+
+  def Get(self, user, fileId):
+    return self.ids.get((user, fileId))
+
+# Called by the threads copying files as each copy and its permissions complete so that a copy is recorded even if the command is interrupted
+  def Set(self, user, fileId, newFileId):
+    if self.f:
+      with self.lock:
+        self.ids[(user, fileId)] = newFileId
+        self.f.write(u'{0} {1} {2}\n'.format(user, fileId, newFileId).encode(UTF8))
+        self.f.flush()
+
+  def Close(self):
+    if self.f:
+      closeFile(self.f)
+      self.f = None
+
+# A folder created by a previous run of the command with the same checkpoint file is merged with rather than created again
+def _getCheckpointFolder(checkpoint, user, j, jcount, folderId, folderTitle, newFolderTitle, statistics):
+  newFolderId = checkpoint.Get(user, folderId)
+  if newFolderId:
+    action = Act.Get()
+    Act.Set(Act.MERGE)
+    entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, folderTitle],
+                                                       Act.MODIFIER_WITH, newFolderTitle,
+                                                       [Ent.DRIVE_FOLDER_ID, newFolderId], j, jcount)
+    Act.Set(action)
+    _incrStatistic(statistics, STAT_FOLDER_MERGED)
+  return newFolderId
+
 def _getCopyMoveParentInfo(drive, user, i, count, j, jcount, newParentId, statistics):
   try:
     return callGAPI(drive.files(), u'get',
@@ -29453,6 +31940,7 @@ COPY_SUB_PARENTS_CHOICES = {u'all': COPY_ALL_PARENTS, u'none': COPY_NO_PARENTS,
 #	[copysubfileparents nonpath|none|all] [copysubfolderparents nonpath|none|all]
 #	[copyfilepermissions [<Boolean>]]
 #	[copytopfolderpermissions [<Boolean>]] [copysubfolderpermissions [<Boolean>]]
+#	[checkpoint <FileName>]
 def copyDriveFile(users):
   def _cloneFolderCopy(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
                        atTop, newParentId, copyMoveOptions, statistics):
@@ -29468,6 +31956,10 @@ def copyDriveFile(users):
       _incrStatistic(statistics, STAT_FOLDER_MERGED)
       source.pop(u'oldparents', None)
       return (newParentId, True)
+    newFolderId = _getCheckpointFolder(checkpoint, user, j, jcount, folderId, folderTitle, newFolderTitle, statistics)
+    if newFolderId:
+      source.pop(u'oldparents', None)
+      return (newFolderId, True)
     if copyMoveOptions[u'duplicateFolders'] == DUPLICATE_FOLDER_MERGE:
       newFolderTitleLower = newFolderTitle.lower()
       for target in targetChildren:
@@ -29504,6 +31996,7 @@ def copyDriveFile(users):
       newFolderId = callGAPI(drive.files(), u'insert',
                              throw_reasons=GAPI.DRIVE_USER_THROW_REASONS+[GAPI.FORBIDDEN, GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.INTERNAL_ERROR],
                              body=body, fields=u'id')[u'id']
+      checkpoint.Set(user, folderId, newFolderId)
       entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, folderTitle],
                                                          Act.MODIFIER_TO, newFolderTitle,
                                                          [Ent.DRIVE_FOLDER_ID, newFolderId], j, jcount)
@@ -29520,6 +32013,7 @@ def copyDriveFile(users):
     copyMoveOptions[u'retainSourceFolders'] = True
     return (None, False)
 
+# Folders are created as they are reached; the files to copy are yielded to _copyFile
   def _recursiveFolderCopy(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren, depth, atTop, newParentId):
     folderId = source[u'id']
     newFolderId, existingTargetFolder = _cloneFolderCopy(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
@@ -29564,8 +32058,13 @@ def copyDriveFile(users):
             for parent in childParents:
               if parent[u'id'] != folderId or copyMoveOptions[u'copySubFolderParents'] == COPY_ALL_PARENTS:
                 child[u'parents'].append({u'id': parent[u'id']})
-          _recursiveFolderCopy(drive, user, i, count, k, kcount, child, childTitle, subTargetChildren, depth, False, newFolderId)
+          for fileCopy in _recursiveFolderCopy(drive, user, i, count, k, kcount, child, childTitle, subTargetChildren, depth, False, newFolderId):
+            yield fileCopy
         else:
+          if checkpoint.Get(user, childId):
+            entityActionNotPerformedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], Msg.ALREADY_COPIED, k, kcount)
+            _incrStatistic(statistics, STAT_FILE_ALREADY_COPIED)
+            continue
           if not child.pop(u'capabilities')[u'canCopy']:
             entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], Msg.NOT_COPYABLE, k, kcount)
             _incrStatistic(statistics, STAT_FILE_NOT_COPYABLE_MOVABLE)
@@ -29577,23 +32076,50 @@ def copyDriveFile(users):
               if parent[u'id'] != folderId or copyMoveOptions[u'copySubFileParents'] == COPY_ALL_PARENTS:
                 child[u'parents'].append({u'id': parent[u'id']})
           child.pop(u'id')
-          try:
-            result = callGAPI(drive.files(), u'copy',
-                              throw_reasons=GAPI.DRIVE_COPY_THROW_REASONS,
-                              fileId=childId, body=child, fields=VX_ID_FILENAME)
-            entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FILE, childTitle],
-                                                               Act.MODIFIER_TO, result[VX_FILENAME], [Ent.DRIVE_FILE_ID, result[u'id']], k, kcount)
-            _incrStatistic(statistics, STAT_FILE_COPIED_MOVED)
-            copiedFiles[result[u'id']] = 1
-            if copyMoveOptions[u'copyFilePermissions']:
-              _copyPermissions(drive, user, i, count, k, kcount, Ent.DRIVE_FILE, childId, childTitle, result[u'id'], result[VX_FILENAME],
-                               statistics, STAT_FILE_PERMISSIONS_FAILED)
-          except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
-                  GAPI.cannotCopyFile, GAPI.responsePreparationFailure, GAPI.rateLimitExceeded, GAPI.userRateLimitExceeded) as e:
-            entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], str(e), k, kcount)
-            _incrStatistic(statistics, STAT_FILE_FAILED)
+          yield {u'id': childId, VX_FILENAME: childTitle, u'body': child, u'k': k, u'kcount': kcount, u'indent': Ind.GetLevel()}
       Ind.Decrement()
 
+# Called in num_api_threads threads; returns the ID of the copy and the statistics of the copy
+  def _copyFile(fileCopy):
+    fileStatistics = _initStatistics()
+    newFileId = None
+    Act.Set(Act.COPY)
+    indent = Ind.GetLevel()
+    Ind.SetLevel(fileCopy[u'indent'])
+    threadDrive = driveThreads.Get()
+    childId = fileCopy[u'id']
+    childTitle = fileCopy[VX_FILENAME]
+    k = fileCopy[u'k']
+    kcount = fileCopy[u'kcount']
+    try:
+      result = callGAPI(threadDrive.files(), u'copy',
+                        throw_reasons=GAPI.DRIVE_COPY_THROW_REASONS,
+                        fileId=childId, body=fileCopy[u'body'], fields=VX_ID_FILENAME)
+      entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FILE, childTitle],
+                                                         Act.MODIFIER_TO, result[VX_FILENAME], [Ent.DRIVE_FILE_ID, result[u'id']], k, kcount)
+      _incrStatistic(fileStatistics, STAT_FILE_COPIED_MOVED)
+      newFileId = result[u'id']
+      if copyMoveOptions[u'copyFilePermissions']:
+        _copyPermissions(threadDrive, user, i, count, k, kcount, Ent.DRIVE_FILE, childId, childTitle, result[u'id'], result[VX_FILENAME],
+                         fileStatistics, STAT_FILE_PERMISSIONS_FAILED)
+      checkpoint.Set(user, childId, newFileId)
+    except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
+            GAPI.cannotCopyFile, GAPI.responsePreparationFailure, GAPI.rateLimitExceeded, GAPI.userRateLimitExceeded) as e:
+      entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], str(e), k, kcount)
+      _incrStatistic(fileStatistics, STAT_FILE_FAILED)
+    Ind.SetLevel(indent)
+    return (newFileId, fileStatistics)
+
+# The files are copied, num_api_threads at a time, while the folders are still being created
+  def _copyFolderTree(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren, newParentId):
+    for _, result in yieldThreadedCallsWithOutput(_copyFile,
+                                                  _recursiveFolderCopy(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
+                                                                       0, True, newParentId)):
+      newFileId, fileStatistics = result
+      _addStatistics(statistics, fileStatistics)
+      if newFileId:
+        copiedFiles[newFileId] = 1
+
   fileIdEntity = getDriveFileEntity()
   copyBody = {}
   parentBody = {}
@@ -29603,11 +32129,14 @@ def copyDriveFile(users):
   newParentsSpecified = recursive = False
   maxdepth = -1
   copiedFiles = {}
+  checkpointFile = None
   statistics = _initStatistics()
   while Cmd.ArgumentsRemaining():
     myarg = getArgument()
     if getCopyMoveOptions(myarg, copyMoveOptions, True):
       pass
+    elif myarg == u'checkpoint':
+      checkpointFile = getString(Cmd.OB_FILE_NAME)
     elif getDriveFileParentAttribute(myarg, parentParms):
       newParentsSpecified = True
     elif myarg == u'recursive':
@@ -29624,6 +32153,7 @@ def copyDriveFile(users):
       copyParameters[DFA_KEEP_REVISION_FOREVER] = getBoolean()
     else:
       unknownArgumentExit()
+  checkpoint = CopyMoveCheckpoint(checkpointFile)
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -29632,6 +32162,7 @@ def copyDriveFile(users):
       continue
     if not _getDriveFileParentInfo(drive, user, i, count, parentBody, parentParms):
       continue
+    driveThreads = ThreadGAPIObjects(drive)
     Ind.Increment()
     j = 0
     for fileId in fileIdEntity[u'list']:
@@ -29691,11 +32222,15 @@ def copyDriveFile(users):
               if parent[u'id'] not in newParentsList:
                 source[u'parents'].append({u'id': parent[u'id']})
           if recursive:
-            _recursiveFolderCopy(drive, user, i, count, j, jcount, source, destFilename, targetChildren, 0, True, newParentId)
+            _copyFolderTree(drive, user, i, count, j, jcount, source, destFilename, targetChildren, newParentId)
           else:
             _cloneFolderCopy(drive, user, i, count, j, jcount, source, destFilename, targetChildren,
                              True, newParentId, copyMoveOptions, statistics)
         else:
+          if checkpoint.Get(user, fileId):
+            entityActionNotPerformedWarning([Ent.USER, user, Ent.DRIVE_FILE, sourceFilename], Msg.ALREADY_COPIED, j, jcount)
+            _incrStatistic(statistics, STAT_FILE_ALREADY_COPIED)
+            continue
           if not source.pop(u'capabilities')[u'canCopy']:
             entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, sourceFilename], Msg.NOT_COPYABLE, j, jcount)
             _incrStatistic(statistics, STAT_FILE_NOT_COPYABLE_MOVABLE)
@@ -29724,6 +32259,7 @@ def copyDriveFile(users):
           if copyMoveOptions[u'copyFilePermissions']:
             _copyPermissions(drive, user, i, count, j, jcount, Ent.DRIVE_FILE, sourceId, sourceFilename, result[u'id'], result[VX_FILENAME],
                              statistics, STAT_FILE_PERMISSIONS_FAILED)
+          checkpoint.Set(user, fileId, result[u'id'])
       except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions,
               GAPI.unknownError, GAPI.cannotCopyFile, GAPI.badRequest, GAPI.fileNeverWritable) as e:
         entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE_OR_FOLDER_ID, fileId], str(e), j, jcount)
@@ -29735,13 +32271,14 @@ def copyDriveFile(users):
     Ind.Decrement()
     if copyMoveOptions[u'summary']:
       _printStatistics(user, statistics, i, count, True)
+  checkpoint.Close()
 
 # gam <UserTypeEntity> move drivefile <DriveFileEntity> [newfilename <DriveFileName>] [summary [<Boolean>]]
 #	<DriveFileMoveAttributes>* [mergewithparent|mergewithparentthendelete [<Boolean>]]
 #	[duplicatefiles overwriteolder|overwriteall|duplicatename|uniquename|skip]
 #	[duplicatefolders merge|duplicatename|uniquename|skip]
 #	[copysubfileparents nonpath|none|all] [copysubfolderparents nonpath|none|all]
-#	[retainsourcefolders [<Boolean>]]
+#	[retainsourcefolders [<Boolean>]] [checkpoint <FileName>]
 def moveDriveFile(users):
   def _cloneFolderMove(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
                        atTop, newParentId, copyMoveOptions, statistics):
@@ -29757,6 +32294,10 @@ def moveDriveFile(users):
       _incrStatistic(statistics, STAT_FOLDER_MERGED)
       source.pop(u'oldparents', None)
       return (newParentId, True)
+    newFolderId = _getCheckpointFolder(checkpoint, user, j, jcount, folderId, folderTitle, newFolderTitle, statistics)
+    if newFolderId:
+      source.pop(u'oldparents', None)
+      return (newFolderId, True)
     if copyMoveOptions[u'duplicateFolders'] == DUPLICATE_FOLDER_MERGE:
       newFolderTitleLower = newFolderTitle.lower()
       for target in targetChildren:
@@ -29812,6 +32353,7 @@ def moveDriveFile(users):
       newFolderId = callGAPI(drive.files(), u'insert',
                              throw_reasons=GAPI.DRIVE_USER_THROW_REASONS+[GAPI.FORBIDDEN, GAPI.INVALID, GAPI.BAD_REQUEST, GAPI.INTERNAL_ERROR],
                              body=body, fields=u'id')[u'id']
+      checkpoint.Set(user, folderId, newFolderId)
       entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, folderTitle],
                                                          Act.MODIFIER_TO, newFolderTitle,
                                                          [Ent.DRIVE_FOLDER_ID, newFolderId], j, jcount)
@@ -29828,7 +32370,9 @@ def moveDriveFile(users):
     copyMoveOptions[u'retainSourceFolders'] = True
     return (None, False)
 
-  def _recursiveFolderMove(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren, atTop, newParentId):
+# Folders are created as they are reached; the files to move are yielded to _moveFile.
+# The source folders to delete or retain are added to sourceFolders after their children
+  def _recursiveFolderMove(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren, atTop, newParentId, sourceFolders):
     folderId = source[u'id']
     newFolderId, existingTargetFolder = _cloneFolderMove(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
                                                          atTop, newParentId, copyMoveOptions, statistics)
@@ -29871,50 +32415,79 @@ def moveDriveFile(users):
               if parent[u'id'] != folderId or copyMoveOptions[u'copySubFolderParents'] == COPY_ALL_PARENTS:
                 child[u'parents'].append({u'id': parent[u'id']})
           child[u'oldparents'] = childParents
-          _recursiveFolderMove(drive, user, i, count, k, kcount, child, childTitle, subTargetChildren, False, newFolderId)
+          for fileMove in _recursiveFolderMove(drive, user, i, count, k, kcount, child, childTitle, subTargetChildren, False, newFolderId, sourceFolders):
+            yield fileMove
         else:
           if existingTargetFolder and _checkForDuplicateTargetFile(drive, user, k, kcount, child, childTitle, subTargetChildren, copyMoveOptions, statistics):
             copyMoveOptions[u'retainSourceFolders'] = True
             continue
-          body = {VX_FILENAME: child[VX_FILENAME]}
           if copyMoveOptions[u'copySubFileParents'] == COPY_NONPATH_PARENTS:
             removeParents = folderId
           elif copyMoveOptions[u'copySubFileParents'] == COPY_NO_PARENTS:
             removeParents = u','.join([parent[u'id'] for parent in childParents])
           else: #COPY_ALL_PARENTS
             removeParents = u''
-          try:
-            result = callGAPI(drive.files(), u'patch',
-                              throw_reasons=GAPI.DRIVE_ACCESS_THROW_REASONS+[GAPI.FILE_OWNER_NOT_MEMBER_OF_WRITER_DOMAIN],
-                              fileId=childId, addParents=newFolderId, removeParents=removeParents,
-                              body=body, fields=VX_ID_FILENAME)
-            entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FILE, childTitle],
-                                                               Act.MODIFIER_TO, result[VX_FILENAME],
-                                                               [Ent.DRIVE_FILE_ID, result[u'id']], k, kcount)
-            _incrStatistic(statistics, STAT_FILE_COPIED_MOVED)
-          except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
-                  GAPI.fileOwnerNotMemberOfWriterDomain) as e:
-            entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], str(e), k, kcount)
-            _incrStatistic(statistics, STAT_FILE_FAILED)
-            copyMoveOptions[u'retainSourceFolders'] = True
+          yield {u'id': childId, VX_FILENAME: childTitle, u'body': {VX_FILENAME: child[VX_FILENAME]},
+                 u'addParents': newFolderId, u'removeParents': removeParents, u'k': k, u'kcount': kcount, u'indent': Ind.GetLevel()}
       Ind.Decrement()
-    if (atTop and copyMoveOptions[u'mergeWithParentRetain']) or copyMoveOptions[u'retainSourceFolders'] or source[VX_FILENAME] == MY_DRIVE:
-      Act.Set(Act.RETAIN)
-      entityActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, source[VX_FILENAME], Ent.DRIVE_FOLDER_ID, folderId], i, count)
-    else:
-      Act.Set(Act.DELETE)
-      try:
-        callGAPI(drive.files(), u'delete',
-                 throw_reasons=GAPI.DRIVE_ACCESS_THROW_REASONS+[GAPI.FILE_NEVER_WRITABLE],
-                 fileId=folderId)
-        entityActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, source[VX_FILENAME], Ent.DRIVE_FOLDER_ID, folderId], i, count)
-      except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
-              GAPI.fileNeverWritable) as e:
-        entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FOLDER_ID, folderId], str(e), j, jcount)
-      except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
-        userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
+    sourceFolders.append((source[VX_FILENAME], folderId, atTop, j, jcount))
+
+# Called in num_api_threads threads; returns whether the file was moved and the statistics of the move
+  def _moveFile(fileMove):
+    fileStatistics = _initStatistics()
     Act.Set(Act.MOVE)
-    return
+    indent = Ind.GetLevel()
+    Ind.SetLevel(fileMove[u'indent'])
+    threadDrive = driveThreads.Get()
+    childTitle = fileMove[VX_FILENAME]
+    k = fileMove[u'k']
+    kcount = fileMove[u'kcount']
+    try:
+      result = callGAPI(threadDrive.files(), u'patch',
+                        throw_reasons=GAPI.DRIVE_ACCESS_THROW_REASONS+[GAPI.FILE_OWNER_NOT_MEMBER_OF_WRITER_DOMAIN],
+                        fileId=fileMove[u'id'], addParents=fileMove[u'addParents'], removeParents=fileMove[u'removeParents'],
+                        body=fileMove[u'body'], fields=VX_ID_FILENAME)
+      entityModifierNewValueItemValueListActionPerformed([Ent.USER, user, Ent.DRIVE_FILE, childTitle],
+                                                         Act.MODIFIER_TO, result[VX_FILENAME],
+                                                         [Ent.DRIVE_FILE_ID, result[u'id']], k, kcount)
+      _incrStatistic(fileStatistics, STAT_FILE_COPIED_MOVED)
+      moved = True
+    except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
+            GAPI.fileOwnerNotMemberOfWriterDomain) as e:
+      entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE, childTitle], str(e), k, kcount)
+      _incrStatistic(fileStatistics, STAT_FILE_FAILED)
+      moved = False
+    Ind.SetLevel(indent)
+    return (moved, fileStatistics)
+
+# The files are moved, num_api_threads at a time, while the folders are still being created;
+# the source folders are deleted or retained when all of the files have been moved
+  def _moveFolderTree(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren, newParentId):
+    sourceFolders = []
+    for _, result in yieldThreadedCallsWithOutput(_moveFile,
+                                                  _recursiveFolderMove(drive, user, i, count, j, jcount, source, newFolderTitle, targetChildren,
+                                                                       True, newParentId, sourceFolders)):
+      moved, fileStatistics = result
+      _addStatistics(statistics, fileStatistics)
+      if not moved:
+        copyMoveOptions[u'retainSourceFolders'] = True
+    for folderTitle, folderId, atTop, k, kcount in sourceFolders:
+      if (atTop and copyMoveOptions[u'mergeWithParentRetain']) or copyMoveOptions[u'retainSourceFolders'] or folderTitle == MY_DRIVE:
+        Act.Set(Act.RETAIN)
+        entityActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, folderTitle, Ent.DRIVE_FOLDER_ID, folderId], i, count)
+      else:
+        Act.Set(Act.DELETE)
+        try:
+          callGAPI(drive.files(), u'delete',
+                   throw_reasons=GAPI.DRIVE_ACCESS_THROW_REASONS+[GAPI.FILE_NEVER_WRITABLE],
+                   fileId=folderId)
+          entityActionPerformed([Ent.USER, user, Ent.DRIVE_FOLDER, folderTitle, Ent.DRIVE_FOLDER_ID, folderId], i, count)
+        except (GAPI.fileNotFound, GAPI.forbidden, GAPI.internalError, GAPI.insufficientFilePermissions, GAPI.unknownError,
+                GAPI.fileNeverWritable) as e:
+          entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FOLDER_ID, folderId], str(e), k, kcount)
+        except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
+          userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
+      Act.Set(Act.MOVE)
 
   fileIdEntity = getDriveFileEntity()
   parentBody = {}
@@ -29922,15 +32495,19 @@ def moveDriveFile(users):
   copyMoveOptions = initCopyMoveOptions(True)
   newParentsSpecified = False
   movedFiles = {}
+  checkpointFile = None
   statistics = _initStatistics()
   while Cmd.ArgumentsRemaining():
     myarg = getArgument()
     if getCopyMoveOptions(myarg, copyMoveOptions, False):
       pass
+    elif myarg == u'checkpoint':
+      checkpointFile = getString(Cmd.OB_FILE_NAME)
     elif getDriveFileParentAttribute(myarg, parentParms):
       newParentsSpecified = True
     else:
       unknownArgumentExit()
+  checkpoint = CopyMoveCheckpoint(checkpointFile)
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -29939,6 +32516,7 @@ def moveDriveFile(users):
       continue
     if not _getDriveFileParentInfo(drive, user, i, count, parentBody, parentParms):
       continue
+    driveThreads = ThreadGAPIObjects(drive)
     Ind.Increment()
     j = 0
     for fileId in fileIdEntity[u'list']:
@@ -29990,7 +32568,7 @@ def moveDriveFile(users):
               (copyMoveOptions[u'copySubFileParents'] != COPY_NONPATH_PARENTS) or (copyMoveOptions[u'copySubFolderParents'] != COPY_NONPATH_PARENTS) or
               (copyMoveOptions[u'duplicateFolders'] == DUPLICATE_FOLDER_MERGE and _targetFilenameExists(destFilename, source[u'mimeType'], targetChildren))):
             source[u'oldparents'] = sourceParents
-            _recursiveFolderMove(drive, user, i, count, j, jcount, source, destFilename, targetChildren, True, newParentId)
+            _moveFolderTree(drive, user, i, count, j, jcount, source, destFilename, targetChildren, newParentId)
             continue
           body = {VX_FILENAME: destFilename}
         else:
@@ -30021,6 +32599,7 @@ def moveDriveFile(users):
     Ind.Decrement()
     if copyMoveOptions[u'summary']:
       _printStatistics(user, statistics, i, count, False)
+  checkpoint.Close()
 
 DELETE_DRIVEFILE_CHOICE_MAP = {u'purge': u'delete', u'trash': u'trash', u'untrash': u'untrash',}
 DELETE_DRIVEFILE_FUNCTION_TO_ACTION_MAP = {u'delete': Act.PURGE, u'trash': Act.TRASH, u'untrash': Act.UNTRASH,}
@@ -30200,10 +32779,11 @@ def getDriveFile(users):
         result = callGAPI(drive.files(), u'get',
                           throw_reasons=GAPI.DRIVE_GET_THROW_REASONS,
                           fileId=fileId, fields=VX_DOWNLOAD_FIELDS)
+        media = result
         if revisionId:
-          callGAPI(drive.revisions(), u'get',
-                   throw_reasons=GAPI.DRIVE_GET_THROW_REASONS+[GAPI.REVISION_NOT_FOUND],
-                   fileId=fileId, revisionId=revisionId, fields=u'id')
+          media = callGAPI(drive.revisions(), u'get',
+                           throw_reasons=GAPI.DRIVE_GET_THROW_REASONS+[GAPI.REVISION_NOT_FOUND],
+                           fileId=fileId, revisionId=revisionId, fields=u'id,{0},md5Checksum'.format(VX_SIZE))
         fileExtension = result.get(u'fileExtension')
         mimeType = result[u'mimeType']
         if mimeType == MIMETYPE_GA_FOLDER:
@@ -30237,7 +32817,7 @@ def getDriveFile(users):
             while True:
               if filename.lower()[-len(extension):] != extension.lower():
                 filename += extension
-              if overwrite or not os.path.isfile(filename):
+              if overwrite or not os.path.isfile(filename) or os.path.isfile(filename+DOWNLOAD_JOURNAL_SUFFIX):
                 break
               y += 1
               filename = os.path.join(targetFolder, u'({0})-{1}'.format(y, safe_file_title))
@@ -30269,21 +32849,31 @@ def getDriveFile(users):
               else:
                 request = drive.files().get_media(fileId=fileId)
             fh = None
-            fh = open(filename, u'wb') if not targetStdout else sys.stdout
-            if not spreadsheetUrl:
-              downloader = googleapiclient.http.MediaIoBaseDownload(fh, request)
-              done = False
-              while not done:
-                status, done = downloader.next_chunk()
-                if showProgress and not suppressStdoutMsgs:
-                  entityActionPerformedMessage(entityValueList, u'{0:>7.2%}'.format(status.progress()), j, jcount)
+            if not googleDoc and not targetStdout:
+              download = MediaDownload(request.uri, filename, int(media[VX_SIZE]) if VX_SIZE in media else None, media.get(u'md5Checksum'))
+              for _, finished in MediaDownloader(drive._http, [download]).Run():
+                if not finished and showProgress:
+                  entityActionPerformedMessage(entityValueList, u'{0:>7.2%}'.format(download.Progress()), j, jcount)
+              if download.error is not None:
+                raise IOError(download.error)
+              if not download.Verified():
+                raise IOError(Msg.DOWNLOAD_MD5_CHECKSUM_MISMATCH.format(download.md5.hexdigest(), download.md5Hash))
             else:
-              _, content = drive._http.request(uri=spreadsheetUrl, method='GET')
-              fh.write(content)
-              if targetStdout and content[-1] != u'\n':
-                fh.write(u'\n')
-            if not targetStdout:
-              closeFile(fh)
+              fh = open(filename, u'wb') if not targetStdout else sys.stdout
+              if not spreadsheetUrl:
+                downloader = googleapiclient.http.MediaIoBaseDownload(fh, request)
+                done = False
+                while not done:
+                  status, done = downloader.next_chunk()
+                  if showProgress and not suppressStdoutMsgs:
+                    entityActionPerformedMessage(entityValueList, u'{0:>7.2%}'.format(status.progress()), j, jcount)
+              else:
+                _, content = drive._http.request(uri=spreadsheetUrl, method='GET')
+                fh.write(content)
+                if targetStdout and content[-1] != u'\n':
+                  fh.write(u'\n')
+              if not targetStdout:
+                closeFile(fh)
             if not suppressStdoutMsgs:
               entityModifierNewValueKeyValueActionPerformed(entityValueList, Act.MODIFIER_TO, filename, my_line[0], my_line[1], j, jcount)
             fileDownloaded = True
@@ -30353,11 +32943,16 @@ def collectOrphans(users):
     userName, _ = splitEmailAddress(user)
     try:
       printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, Ent.TypeName(Ent.USER, user), i, count, query=query)
-      feed = callGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
-                           page_message=getPageMessageForWhom(),
-                           throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
-                           q=query, orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE,
-                           maxResults=GC.Values[GC.DRIVE_MAX_RESULTS])
+# Keep only the orphans from each page rather than the whole feed
+      orphanDriveFiles = []
+      for feed in yieldGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
+                                 page_message=getPageMessageForWhom(),
+                                 throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
+                                 q=query, orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE,
+                                 maxResults=GC.Values[GC.DRIVE_MAX_RESULTS]):
+        for fileEntry in feed:
+          if not fileEntry.get(u'parents'):
+            orphanDriveFiles.append(fileEntry)
       if targetUserFolderPattern:
         trgtUserFolderName = _substituteForUser(targetUserFolderPattern, user, userName)
         targetParms[DFA_PARENTQUERY] = VX_MY_NON_TRASHED_FOLDER_NAME.format(escapeDriveFileName(trgtUserFolderName))
@@ -30366,10 +32961,6 @@ def collectOrphans(users):
         trgtUserFolderName = targetUserFolderId
       if not _getDriveFileParentInfo(drive, user, i, count, targetParentBody, targetParms, True, False):
         continue
-      orphanDriveFiles = []
-      for fileEntry in feed:
-        if not fileEntry.get(u'parents'):
-          orphanDriveFiles.append(fileEntry)
       jcount = len(orphanDriveFiles)
       entityPerformActionNumItemsModifier([Ent.USER, user], jcount, Ent.DRIVE_ORPHAN_FILE_OR_FOLDER,
                                           u'{0} {1}: {2}'.format(Act.MODIFIER_INTO, Ent.Singular(Ent.DRIVE_FOLDER), trgtUserFolderName), i, count)
@@ -30497,8 +33088,7 @@ def transferDrive(users):
       return u'commenter'
     return permission[u'role']
 
-  def _transferFile(childEntry, i, count, j, jcount):
-    childEntryInfo = childEntry[u'info']
+  def _transferFile(childEntryInfo, i, count, j, jcount):
     childFileId = childEntryInfo[u'id']
     childFileName = childEntryInfo[VX_FILENAME]
     childFileType = _getEntityMimeType(childEntryInfo)
@@ -30631,7 +33221,7 @@ def transferDrive(users):
           return
       entityActionPerformed([Ent.USER, sourceUser, childFileType, childFileName], j, jcount)
 
-  def _manageRoleRetention(childEntry, i, count, j, jcount):
+  def _manageRoleRetention(childEntryInfo, i, count, j, jcount):
     def _setTargetInsertBody(permission):
       targetInsertBody = {u'role': permission[u'role'], u'type': u'user', u'value': targetUser}
       if u'additionalRoles' in permission:
@@ -30646,7 +33236,6 @@ def transferDrive(users):
         return False
       return True
 
-    childEntryInfo = childEntry[u'info']
     childFileId = childEntryInfo[u'id']
     childFileName = childEntryInfo[VX_FILENAME]
     childFileType = _getEntityMimeType(childEntryInfo)
@@ -30744,44 +33333,33 @@ def transferDrive(users):
       elif showRetentionMessages:
         entityActionPerformed([Ent.USER, targetUser, childFileType, childFileName, Ent.ROLE, childEntryInfo[u'targetPermission'][u'role']], j, jcount)
 
-  def _transferDriveFilesFromTree(fileEntry, i, count):
-    jcount = len(fileEntry[u'children'])
-    if jcount == 0:
-      return
-    j = 0
-    for childFileId in fileEntry[u'children']:
-      j += 1
-      childEntry = fileTree.get(childFileId)
-      if not childEntry or childFileId in filesTransferred:
-        continue
-      filesTransferred.add(childFileId)
-      _transferFile(childEntry, i, count, j, jcount)
-      if childEntry[u'info'][u'mimeType'] == MIMETYPE_GA_FOLDER:
-        Ind.Increment()
-        _transferDriveFilesFromTree(childEntry, i, count)
-        Ind.Decrement()
+# _transferFile and _manageRoleRetention save the source/target roles in the file info
+  def _transferTreeFile(function, childFileId, i, count, j, jcount):
+    childEntryInfo = fileTree.Info(childFileId)
+    function(childEntryInfo, i, count, j, jcount)
+    fileTree.UpdateInfo(childFileId, dict((key, childEntryInfo[key]) for key in [u'sourcePermission', u'targetPermission'] if key in childEntryInfo))
 
-  def _manageRoleRetentionDriveFilesFromTree(fileEntry, i, count):
-    jcount = len(fileEntry[u'children'])
+  def _transferDriveFilesFromTree(function, fileId, i, count):
+    children = fileTree.Children(fileId)
+    jcount = len(children)
     if jcount == 0:
       return
     j = 0
-    for childFileId in fileEntry[u'children']:
+    for childFileId in children:
       j += 1
-      childEntry = fileTree.get(childFileId)
-      if not childEntry or childFileId in filesTransferred:
+      if childFileId in filesTransferred:
         continue
       filesTransferred.add(childFileId)
-      _manageRoleRetention(childEntry, i, count, j, jcount)
-      if childEntry[u'info'][u'mimeType'] == MIMETYPE_GA_FOLDER:
+      _transferTreeFile(function, childFileId, i, count, j, jcount)
+      if fileTree.ChildrenKnown(childFileId):
         Ind.Increment()
-        _manageRoleRetentionDriveFilesFromTree(childEntry, i, count)
+        _transferDriveFilesFromTree(function, childFileId, i, count)
         Ind.Decrement()
 
   def _identifyDriveFileAndChildren(fileEntry, i, count):
     fileId = fileEntry[u'id']
     if fileId not in fileTree:
-      fileTree[fileId] = {u'info': fileEntry, u'children': []}
+      fileTree.SetInfo(fileEntry, True)
     if fileEntry[u'mimeType'] != MIMETYPE_GA_FOLDER:
       return
     try:
@@ -30794,46 +33372,25 @@ def transferDrive(users):
       return
     for childEntry in children:
       if not childEntry[u'labels'][u'trashed']:
-        childId = childEntry[u'id']
-        fileTree[fileId][u'children'].append(childId)
         _identifyDriveFileAndChildren(childEntry, i, count)
+        fileTree.AddChild(fileId, childEntry[u'id'])
 
-  def _transferDriveFileAndChildren(fileEntry, i, count, j, jcount):
-    fileId = fileEntry[u'info'][u'id']
-    if fileId in filesTransferred:
-      return
-    if fileEntry[u'info'][VX_FILENAME] != MY_DRIVE:
-      filesTransferred.add(fileId)
-      _transferFile(fileEntry, i, count, j, jcount)
-    kcount = len(fileEntry[u'children'])
-    if kcount == 0:
-      return
-    k = 0
-    for childFileId in fileEntry[u'children']:
-      k += 1
-      childEntry = fileTree.get(childFileId)
-      if childEntry:
-        Ind.Increment()
-        _transferDriveFileAndChildren(childEntry, i, count, k, kcount)
-        Ind.Decrement()
-
-  def _manageRoleRetentionDriveFileAndChildren(fileEntry, i, count, j, jcount):
-    fileId = fileEntry[u'info'][u'id']
+  def _transferDriveFileAndChildren(function, fileId, i, count, j, jcount):
     if fileId in filesTransferred:
       return
-    if fileEntry[u'info'][VX_FILENAME] != MY_DRIVE:
+    if fileTree.Info(fileId)[VX_FILENAME] != MY_DRIVE:
       filesTransferred.add(fileId)
-      _manageRoleRetention(fileEntry, i, count, j, jcount)
-    kcount = len(fileEntry[u'children'])
+      _transferTreeFile(function, fileId, i, count, j, jcount)
+    children = fileTree.Children(fileId)
+    kcount = len(children)
     if kcount == 0:
       return
     k = 0
-    for childFileId in fileEntry[u'children']:
+    for childFileId in children:
       k += 1
-      childEntry = fileTree.get(childFileId)
-      if childEntry:
+      if childFileId in fileTree:
         Ind.Increment()
-        _manageRoleRetentionDriveFileAndChildren(childEntry, i, count, k, kcount)
+        _transferDriveFileAndChildren(function, childFileId, i, count, k, kcount)
         Ind.Decrement()
 
   targetUser = getEmailAddress()
@@ -30996,30 +33553,31 @@ def transferDrive(users):
       if buildTree:
         parentIdMap = {sourceRootId: targetIds[TARGET_PARENT_ID]}
         printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, Ent.TypeName(Ent.SOURCE_USER, user), i, count)
-        sourceDriveFiles = callGAPIpages(sourceDrive.files(), u'list', VX_PAGES_FILES,
-                                         page_message=getPageMessageForWhom(),
-                                         throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
-                                         orderBy=orderBy[u'list'], q=NON_TRASHED,
-                                         fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_OWNERS_PERMISSIONS,
-                                         maxResults=GC.Values[GC.DRIVE_MAX_RESULTS])
-        fileTree = buildFileTree(sourceDriveFiles, sourceDrive)
+        fileTree = initFileTree(sourceDrive)
+        for sourceDriveFiles in yieldGAPIpages(sourceDrive.files(), u'list', VX_PAGES_FILES,
+                                               page_message=getPageMessageForWhom(),
+                                               throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
+                                               orderBy=orderBy[u'list'], q=NON_TRASHED,
+                                               fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_OWNERS_PERMISSIONS,
+                                               maxResults=GC.Values[GC.DRIVE_MAX_RESULTS]):
+          extendFileTree(fileTree, sourceDriveFiles)
         filesTransferred = set()
-        _transferDriveFilesFromTree(fileTree[sourceRootId], i, count)
-        if fileTree[u'Orphans'][u'children']:
+        _transferDriveFilesFromTree(_transferFile, sourceRootId, i, count)
+        if fileTree.Children(DriveFileTree.ORPHANS):
           if not csvFormat:
             _buildTargetUserOrphansFolder()
-          _transferDriveFilesFromTree(fileTree[u'Orphans'], i, count)
+          _transferDriveFilesFromTree(_transferFile, DriveFileTree.ORPHANS, i, count)
         if not csvFormat:
           Act.Set(Act.RETAIN)
           filesTransferred = set()
-          _manageRoleRetentionDriveFilesFromTree(fileTree[sourceRootId], i, count)
-          if fileTree[u'Orphans'][u'children']:
-            _manageRoleRetentionDriveFilesFromTree(fileTree[u'Orphans'], i, count)
+          _transferDriveFilesFromTree(_manageRoleRetention, sourceRootId, i, count)
+          if fileTree.Children(DriveFileTree.ORPHANS):
+            _transferDriveFilesFromTree(_manageRoleRetention, DriveFileTree.ORPHANS, i, count)
       else:
         j = 0
         for fileId in fileIdEntity[u'list']:
           j += 1
-          fileTree = {}
+          fileTree = DriveFileTree()
           parentIdMap = {sourceRootId: targetIds[TARGET_PARENT_ID]}
           try:
             fileEntry = callGAPI(sourceDrive.files(), u'get',
@@ -31031,11 +33589,11 @@ def transferDrive(users):
               parentIdMap[parent[u'id']] = targetIds[TARGET_PARENT_ID]
             _identifyDriveFileAndChildren(fileEntry, i, count)
             filesTransferred = set()
-            _transferDriveFileAndChildren(fileTree[fileEntry[u'id']], i, count, j, jcount)
+            _transferDriveFileAndChildren(_transferFile, fileEntry[u'id'], i, count, j, jcount)
             if not csvFormat:
               Act.Set(Act.RETAIN)
               filesTransferred = set()
-              _manageRoleRetentionDriveFileAndChildren(fileTree[fileEntry[u'id']], i, count, j, jcount)
+              _transferDriveFileAndChildren(_manageRoleRetention, fileEntry[u'id'], i, count, j, jcount)
           except GAPI.fileNotFound:
             entityActionFailedWarning([Ent.USER, sourceUser, Ent.DRIVE_FILE_OR_FOLDER, fileId], Msg.NOT_FOUND, j, jcount)
           except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
@@ -31044,6 +33602,7 @@ def transferDrive(users):
       Ind.Decrement()
     except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
       userSvcNotApplicableOrDriveDisabled(sourceUser, str(e), i, count)
+  saveDriveFolderInfoMap()
   if csvFormat:
     writeCSVfile(csvRows, titles, u'Files to Transfer', todrive)
 
@@ -31072,19 +33631,18 @@ def getPermissionIdForEmail(drive, user, i, count, email):
 #	(orderby <DriveFileOrderByFieldName> [ascending|descending])*
 #	[preview] [filepath] [buildtree] [todrive <ToDriveAttributes>*]
 def transferOwnership(users):
-  def _identifyFilesToTransfer(fileEntry):
-    for childFileId in fileEntry[u'children']:
+  def _identifyFilesToTransfer(fileId):
+    for childFileId in fileTree.Children(fileId):
       if childFileId in filesTransferred:
         continue
       filesTransferred.add(childFileId)
-      childEntry = fileTree.get(childFileId)
-      if childEntry:
-        childEntryInfo = childEntry[u'info']
+      childEntryInfo = fileTree.Info(childFileId)
+      if childEntryInfo:
         if trashed or not childEntryInfo[u'labels'][u'trashed']:
           if childEntryInfo[u'ownedByMe']:
             filesToTransfer[childFileId] = {VX_FILENAME: childEntryInfo[VX_FILENAME], u'type': _getEntityMimeType(childEntryInfo)}
           if childEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER:
-            _identifyFilesToTransfer(childEntry)
+            _identifyFilesToTransfer(childFileId)
 
   def _identifyChildrenToTransfer(fileEntry, user, i, count):
     try:
@@ -31098,7 +33656,7 @@ def transferOwnership(users):
     for childEntryInfo in children:
       childFileId = childEntryInfo[u'id']
       if filepath:
-        fileTree[childFileId] = {u'info': childEntryInfo}
+        fileTree.SetInfo(childEntryInfo)
       if childFileId in filesTransferred:
         continue
       filesTransferred.add(childFileId)
@@ -31155,27 +33713,28 @@ def transferOwnership(users):
     filesTransferred = set()
     if buildTree:
       printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, user, i, count)
+      fileTree = initFileTree(drive)
       try:
-        feed = callGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
-                             page_message=getPageMessageForWhom(),
-                             throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
-                             orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_TRASHED,
-                             maxResults=GC.Values[GC.DRIVE_MAX_RESULTS])
+        for files in yieldGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
+                                    page_message=getPageMessageForWhom(),
+                                    throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
+                                    orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_TRASHED,
+                                    maxResults=GC.Values[GC.DRIVE_MAX_RESULTS]):
+          extendFileTree(fileTree, files)
       except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
         userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
         continue
-      fileTree = buildFileTree(feed, drive)
     else:
-      fileTree = {}
+      fileTree = DriveFileTree()
     Ind.Increment()
     j = 0
     for fileId in fileIdEntity[u'list']:
       j += 1
       if buildTree:
-        fileEntry = fileTree.get(fileId)
-        if not fileEntry:
+        fileEntryInfo = fileTree.Info(fileId)
+        if not fileEntryInfo:
           entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE_OR_FOLDER, fileId], Msg.NOT_FOUND, j, jcount)
-        fileEntryInfo = fileEntry[u'info']
+          continue
       else:
         try:
           fileEntryInfo = callGAPI(drive.files(), u'get',
@@ -31188,7 +33747,7 @@ def transferOwnership(users):
           userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
           break
         if filepath:
-          fileTree[fileId] = {u'info': fileEntryInfo}
+          fileTree.SetInfo(fileEntryInfo)
       entityType = _getEntityMimeType(fileEntryInfo)
       entityPerformActionItemValue([Ent.USER, user], entityType, u'{0} ({1})'.format(fileEntryInfo[VX_FILENAME], fileId), j, jcount)
       if fileId in filesTransferred:
@@ -31200,14 +33759,14 @@ def transferOwnership(users):
           filesToTransfer[fileId] = {VX_FILENAME: fileEntryInfo[VX_FILENAME], u'type': entityType}
         if fileEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER:
           if buildTree:
-            _identifyFilesToTransfer(fileEntry)
+            _identifyFilesToTransfer(fileId)
           else:
             _identifyChildrenToTransfer(fileEntryInfo, user, i, count)
       if csvFormat:
         for xferFileId, fileInfo in iteritems(filesToTransfer):
           row = {u'OldOwner': user, u'NewOwner': newOwner, u'type': Ent.Singular(fileInfo[u'type']), u'id': xferFileId, VX_FILENAME: fileInfo[VX_FILENAME]}
           if filepath:
-            addFilePathsToRow(drive, fileTree, fileTree[xferFileId][u'info'], filePathInfo, row, titles)
+            addFilePathsToRow(drive, fileTree, fileTree.Info(xferFileId), filePathInfo, row, titles)
           csvRows.append(row)
         continue
       Ind.Increment()
@@ -31263,11 +33822,10 @@ def transferOwnership(users):
 #	[restricted [<Boolean>]] [writerscanshare|writerscantshare [<Boolean>]] [keepuser | (retainrole reader|commenter|writer|editor|none)] [noretentionmessages]
 #	[preview] [filepath] [buildtree] [todrive <ToDriveAttributes>*]d
 def claimOwnership(users):
-  def _identifyFilesToClaim(fileEntry, skipids):
-    for childFileId in fileEntry[u'children']:
-      childEntry = fileTree.get(childFileId)
-      if childEntry:
-        childEntryInfo = childEntry[u'info']
+  def _identifyFilesToClaim(fileId, skipids):
+    for childFileId in fileTree.Children(fileId):
+      childEntryInfo = fileTree.Info(childFileId)
+      if childEntryInfo:
         if childFileId not in skipids and (trashed or not childEntryInfo[u'labels'][u'trashed']):
           owner = childEntryInfo[u'owners'][0][u'emailAddress']
           if not childEntryInfo[u'ownedByMe'] and owner not in skipusers:
@@ -31276,7 +33834,7 @@ def claimOwnership(users):
             if childFileId not in filesToClaim[owner]:
               filesToClaim[owner][childFileId] = {VX_FILENAME: childEntryInfo[VX_FILENAME], u'type': _getEntityMimeType(childEntryInfo)}
           if childEntryInfo[u'mimeType'] == MIMETYPE_GA_FOLDER:
-            _identifyFilesToClaim(childEntry, skipids)
+            _identifyFilesToClaim(childFileId, skipids)
 
   def _identifyChildrenToClaim(fileEntry, skipIds, user, i, count):
     try:
@@ -31291,7 +33849,7 @@ def claimOwnership(users):
       childFileId = childEntryInfo[u'id']
       if childFileId not in skipIds and (trashed or not childEntryInfo[u'labels'][u'trashed']):
         if filepath:
-          fileTree[childFileId] = {u'info': childEntryInfo}
+          fileTree.SetInfo(childEntryInfo)
         owner = childEntryInfo[u'owners'][0][u'emailAddress']
         if not childEntryInfo[u'ownedByMe'] and owner not in skipusers:
           oldOwnerPermissionIds[owner] = childEntryInfo[u'owners'][0][u'permissionId']
@@ -31400,29 +33958,29 @@ def claimOwnership(users):
       _validateUserGetFileIDs(origUser, i, count, skipFileIdEntity, drive=drive)
     if buildTree:
       printGettingAllEntityItemsForWhom(Ent.DRIVE_FILE_OR_FOLDER, user, i, count)
+      fileTree = initFileTree(drive)
       try:
-        feed = callGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
-                             page_message=getPageMessageForWhom(),
-                             throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
-                             orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_TRASHED_OWNERS,
-                             maxResults=GC.Values[GC.DRIVE_MAX_RESULTS])
+        for files in yieldGAPIpages(drive.files(), u'list', VX_PAGES_FILES,
+                                    page_message=getPageMessageForWhom(),
+                                    throw_reasons=GAPI.DRIVE_USER_THROW_REASONS,
+                                    orderBy=orderBy[u'list'], fields=VX_NPT_FILES_ID_FILENAME_PARENTS_MIMETYPE_OWNEDBYME_TRASHED_OWNERS,
+                                    maxResults=GC.Values[GC.DRIVE_MAX_RESULTS]):
+          extendFileTree(fileTree, files)
       except (GAPI.serviceNotAvailable, GAPI.authError, GAPI.domainPolicy) as e:
         userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
         continue
-      fileTree = buildFileTree(feed, drive)
     else:
-      fileTree = {}
+      fileTree = DriveFileTree()
     Ind.Increment()
     j = 0
     for fileId in fileIdEntity[u'list']:
       j += 1
       filesToClaim = {}
       if buildTree:
-        fileEntry = fileTree.get(fileId)
-        if not fileEntry:
+        fileEntryInfo = fileTree.Info(fileId)
+        if not fileEntryInfo:
           entityActionFailedWarning([Ent.USER, user, Ent.DRIVE_FILE_OR_FOLDER, fileId], Msg.NOT_FOUND, j, jcount)
           continue
-        fileEntryInfo = fileEntry[u'info']
       else:
         try:
           fileEntryInfo = callGAPI(drive.files(), u'get',
@@ -31435,7 +33993,7 @@ def claimOwnership(users):
           userSvcNotApplicableOrDriveDisabled(user, str(e), i, count)
           break
         if filepath:
-          fileTree[fileId] = {u'info': fileEntryInfo}
+          fileTree.SetInfo(fileEntryInfo)
       entityType = _getEntityMimeType(fileEntryInfo)
       entityPerformActionItemValue([Ent.USER, user], entityType, u'{0} ({1})'.format(fileEntryInfo[VX_FILENAME], fileId), j, jcount)
       if fileId not in skipFileIdEntity[u'list'] and (trashed or not fileEntryInfo[u'labels'][u'trashed']):
@@ -31446,7 +34004,7 @@ def claimOwnership(users):
           if fileId not in filesToClaim[owner]:
             filesToClaim[owner][fileId] = {VX_FILENAME: fileEntryInfo[VX_FILENAME], u'type': entityType}
         if buildTree:
-          _identifyFilesToClaim(fileEntry, skipFileIdEntity[u'list'])
+          _identifyFilesToClaim(fileId, skipFileIdEntity[u'list'])
         else:
           _identifyChildrenToClaim(fileEntryInfo, skipFileIdEntity[u'list'], user, i, count)
       if csvFormat:
@@ -31454,7 +34012,7 @@ def claimOwnership(users):
           for claimFileId, fileInfo in iteritems(filesToClaim[oldOwner]):
             row = {u'NewOwner': user, u'OldOwner': oldOwner, u'type': Ent.Singular(fileInfo[u'type']), u'id': claimFileId, VX_FILENAME: fileInfo[VX_FILENAME]}
             if filepath:
-              addFilePathsToRow(drive, fileTree, fileTree[claimFileId][u'info'], filePathInfo, row, titles)
+              addFilePathsToRow(drive, fileTree, fileTree.Info(claimFileId), filePathInfo, row, titles)
             csvRows.append(row)
         continue
       Ind.Increment()
@@ -31529,6 +34087,7 @@ def claimOwnership(users):
       Ind.Decrement()
       Ind.Decrement()
     Ind.Decrement()
+  saveDriveFolderInfoMap()
   if csvFormat:
     writeCSVfile(csvRows, titles, u'Files to Claim Ownership', todrive)
 
@@ -31920,12 +34479,12 @@ def createDriveFilePermissions(users):
           continue
         dbatch.add(method(**svcparms), request_id=batchRequestID(fileId, j, jcount, k, kcount, permission))
         bcount += 1
-        if bcount >= GC.Values[GC.BATCH_SIZE]:
+        if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
           executeBatch(dbatch)
           dbatch = drive.new_batch_http_request(callback=_callbackCreatePermission)
           bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, final=True)
     Ind.Decrement()
 
 # gam <UserTypeEntity> delete drivefileacl <DriveFileEntity> <DriveFilePermissionIDorEmail> [showtitles]
@@ -32052,12 +34611,12 @@ def deletePermissions(users):
         svcparms[u'permissionId'] = permissionId
         dbatch.add(method(**svcparms), request_id=batchRequestID(fileId, j, jcount, k, kcount, permissionId))
         bcount += 1
-        if bcount >= GC.Values[GC.BATCH_SIZE]:
+        if bcount >= getBatchFlushSize(GC.Values[GC.BATCH_SIZE]):
           executeBatch(dbatch)
           dbatch = drive.new_batch_http_request(callback=_callbackDeletePermissionId)
           bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      executeBatch(dbatch, final=True)
     Ind.Decrement()
 
 # gam <UserTypeEntity> info drivefileacl <DriveFileEntity> <DriveFilePermissionIDorEmail> [showtitles] [formatjson]
@@ -32348,11 +34907,14 @@ def doPrintShowOwnership():
 # gam <UserTypeEntity> delete alias|aliases
 def deleteUsersAliases(users):
   cd = buildGAPIObject(API.DIRECTORY)
+  invalidateDirectoryCache()
   checkForExtraneousArguments()
+  changedUsers = []
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
     user = normalizeEmailAddressOrUID(user)
+    changedUsers.append(user)
     try:
       user_aliases = callGAPI(cd.users(), u'get',
                               throw_reasons=GAPI.USER_GET_THROW_REASONS,
@@ -32378,6 +34940,7 @@ def deleteUsersAliases(users):
       Ind.Decrement()
     except (GAPI.userNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.forbidden, GAPI.badRequest, GAPI.backendError, GAPI.systemError):
       entityUnknownWarning(Ent.USER, user, i, count)
+  invalidateUserMaps(changedUsers)
 
 # gam <UserTypeEntity> add group|groups [member|manager|owner] <GroupEntity>
 def addUserToGroups(users):
@@ -32386,6 +34949,7 @@ def addUserToGroups(users):
   groupKeys = getEntityList(Cmd.OB_GROUP_ENTITY)
   userGroupLists = groupKeys if isinstance(groupKeys, dict) else None
   checkForExtraneousArguments()
+  changedGroups = set()
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -32410,6 +34974,7 @@ def addUserToGroups(users):
                  retry_reasons=GAPI.MEMBERS_RETRY_REASONS,
                  groupKey=group, body=body, fields=u'')
         entityActionPerformed([Ent.GROUP, group, role, user], j, jcount)
+        changedGroups.add(group)
       except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden) as e:
         entityUnknownWarning(Ent.GROUP, group, j, jcount)
       except (GAPI.duplicate, GAPI.cyclicMembershipsNotAllowed, GAPI.conditionNotMet) as e:
@@ -32418,6 +34983,7 @@ def addUserToGroups(users):
         entityActionFailedWarning([Ent.USER, user], str(e), i, count)
         break
     Ind.Decrement()
+  invalidateGroupMembershipGraph(changedGroups)
 
 # gam <UserTypeEntity> delete group|groups [<GroupEntity>]
 def deleteUserFromGroups(users):
@@ -32428,7 +34994,9 @@ def deleteUserFromGroups(users):
     checkForExtraneousArguments()
   else:
     groupKeys = None
+    graph = getGroupMembershipGraph(cd)
   role = Ent.MEMBER
+  changedGroups = set()
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -32436,8 +35004,11 @@ def deleteUserFromGroups(users):
       user = checkUserExists(cd, user, i, count)
       if not user:
         continue
-      result = callGAPIpages(cd.groups(), u'list', u'groups',
-                             userKey=user, orderBy=u'email', fields=u'nextPageToken,groups(email)')
+      if graph is not None:
+        result = graph.GetMemberGroups(user)
+      else:
+        result = callGAPIpages(cd.groups(), u'list', u'groups',
+                               userKey=user, orderBy=u'email', fields=u'nextPageToken,groups(email)')
       userGroupKeys = [item[u'email'] for item in result]
     else:
       if userGroupLists:
@@ -32458,11 +35029,13 @@ def deleteUserFromGroups(users):
                  retry_reasons=GAPI.MEMBERS_RETRY_REASONS,
                  groupKey=group, memberKey=user)
         entityActionPerformed([Ent.GROUP, group, role, user], j, jcount)
+        changedGroups.add(group)
       except (GAPI.groupNotFound, GAPI.domainNotFound, GAPI.domainCannotUseApis, GAPI.invalid, GAPI.forbidden) as e:
         entityUnknownWarning(Ent.GROUP, group, j, jcount)
       except (GAPI.memberNotFound, GAPI.invalidMember, GAPI.conditionNotMet) as e:
         entityActionFailedWarning([Ent.USER, user], str(e), j, jcount)
     Ind.Decrement()
+  invalidateGroupMembershipGraph(changedGroups)
 
 # License command utilities
 LICENSE_SKUID = u'skuId'
@@ -32487,6 +35060,7 @@ def getLicenseParameters(operation):
 # gam <UserTypeEntity> create|add license <SKUID>
 def createLicense(users):
   lic, parameters = getLicenseParameters(u'insert')
+  invalidateDirectoryCache()
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -32504,6 +35078,7 @@ def createLicense(users):
 # gam <UserTypeEntity> update license <SKUID> [from] <SKUID>
 def updateLicense(users):
   lic, parameters = getLicenseParameters(u'patch')
+  invalidateDirectoryCache()
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -32522,6 +35097,7 @@ def updateLicense(users):
 # gam <UserTypeEntity> delete license <SKUID>
 def deleteLicense(users):
   lic, parameters = getLicenseParameters(u'delete')
+  invalidateDirectoryCache()
   i, count, users = getEntityArgument(users)
   for user in users:
     i += 1
@@ -33870,11 +36446,11 @@ def deleteLabel(users):
         dbatch.add(method(**svcparms), request_id=batchRequestID(user, i, count, j, jcount, del_me[u'id']))
         bcount += 1
         if bcount == 10:
-          executeBatch(dbatch)
+          executeBatch(dbatch, 10)
           dbatch = gmail.new_batch_http_request(callback=_callbackDeleteLabel)
           bcount = 0
       if bcount > 0:
-        dbatch.execute()
+        executeBatch(dbatch, 10, final=True)
       Ind.Decrement()
     except (GAPI.serviceNotAvailable, GAPI.badRequest):
       entityServiceNotApplicableWarning(Ent.USER, user, i, count)
@@ -34139,6 +36715,60 @@ def _finalizeMessageSelectParameters(parameters, queryOrIdsRequired):
     parameters[u'query'] = None
   parameters[u'maxItems'] = [0, parameters[u'maxToProcess']][parameters[u'quick']]
 
+# Gmail API quota units of the methods used to process messages and threads
+GMAIL_QUOTA_UNITS = {
+  u'getProfile': 1,
+  u'history.list': 2,
+  u'labels.list': 1,
+  u'messages.batchDelete': 50,
+  u'messages.batchModify': 50,
+  u'messages.delete': 10,
+  u'messages.get': 5,
+  u'messages.list': 5,
+  u'messages.modify': 5,
+  u'messages.trash': 5,
+  u'messages.untrash': 5,
+  u'threads.delete': 20,
+  u'threads.get': 10,
+  u'threads.list': 10,
+  u'threads.modify': 10,
+  u'threads.trash': 10,
+  u'threads.untrash': 10,
+  }
+
+# Each user has its own Gmail quota; calls for a user are paced so that they don't exceed gmail_user_quota units per second
+def getGmailUserRateLimiter():
+  if not GC.Values[GC.GMAIL_USER_QUOTA]:
+    return None
+  rateLimiter = glratelimit.GamRateLimiter()
+  rateLimiter.Initialize([], GC.Values[GC.GMAIL_USER_QUOTA]*rateLimiter.PERIOD)
+  return rateLimiter
+
+def checkGmailUserQuota(rateLimiter, method, count=1):
+  if rateLimiter is not None:
+    delta = rateLimiter.Acquire(rateLimiter.OTHER, GMAIL_QUOTA_UNITS[method]*count)
+    if delta > 0:
+      time.sleep(delta)
+
+# Yield the IDs of a user's messages/threads that match the query a page at a time
+def _yieldUserMessageIdPages(gmailObjects, parameters, includeSpamTrash, rateLimiter, page_message=None):
+  service = getattr(gmailObjects.Get().users(), parameters[u'listType'])()
+  method = u'{0}.list'.format(parameters[u'listType'])
+  checkGmailUserQuota(rateLimiter, method)
+  for page in yieldGAPIpages(service, u'list', parameters[u'listType'],
+                             page_message=page_message, maxItems=parameters[u'maxItems'],
+                             throw_reasons=GAPI.GMAIL_THROW_REASONS,
+                             userId=u'me', q=parameters[u'query'], fields=parameters[u'fields'], includeSpamTrash=includeSpamTrash,
+                             maxResults=GC.Values[GC.MESSAGE_MAX_RESULTS]):
+    yield [message[u'id'] for message in page]
+    checkGmailUserQuota(rateLimiter, method)
+
+def _getUserMessageIds(gmail, parameters, includeSpamTrash, rateLimiter):
+  messageIds = []
+  for pageIds in _yieldUserMessageIdPages(ThreadGAPIObjects(gmail), parameters, includeSpamTrash, rateLimiter, getPageMessage()):
+    messageIds.extend(pageIds)
+  return messageIds
+
 # gam <UserTypeEntity> archive messages <GroupItem> (((query <QueryGmail>) (matchlabel <LabelName>) [or|and])+ [quick|notquick] [doit] [max_to_archive <Number>])|(ids <MessageIDEntity>)
 def archiveMessages(users):
   gm = buildGAPIObject(API.GROUPSMIGRATION)
@@ -34218,11 +36848,12 @@ def archiveMessages(users):
       entityServiceNotApplicableWarning(Ent.USER, user, i, count)
 
 def _processMessagesThreads(users, entityType):
-  def _batchDeleteModifyMessages(gmail, function, user, jcount, messageIds, body):
+  def _batchDeleteModifyMessages(gmail, function, user, jcount, messageIds, body, rateLimiter):
     mcount = 0
     bcount = min(jcount-mcount, GC.Values[GC.MESSAGE_BATCH_SIZE])
     while bcount > 0:
       body[u'ids'] = messageIds[mcount:mcount+bcount]
+      checkGmailUserQuota(rateLimiter, u'messages.{0}'.format(function))
       try:
         callGAPI(gmail.users().messages(), function,
                  throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.INVALID_MESSAGE_ID],
@@ -34250,9 +36881,10 @@ def _processMessagesThreads(users, entityType):
     else:
       _handleProcessGmailError(exception, ri)
 
-  def _batchProcessMessagesThreads(service, function, user, jcount, messageIds, **kwargs):
+  def _batchProcessMessagesThreads(gmail, service, function, user, jcount, messageIds, rateLimiter, **kwargs):
     svcargs = dict([(u'userId', u'me'), (u'id', None), (u'fields', u'')]+kwargs.items()+GM.Globals[GM.EXTRA_ARGS_LIST])
     method = getattr(service, function)
+    quotaMethod = u'{0}.{1}'.format(parameters[u'listType'], function)
     dbatch = gmail.new_batch_http_request(callback=_callbackProcessMessage)
     bcount = 0
     j = 0
@@ -34262,62 +36894,39 @@ def _processMessagesThreads(users, entityType):
       svcparms[u'id'] = messageId
       dbatch.add(method(**svcparms), request_id=batchRequestID(user, 0, 0, j, jcount, svcparms[u'id']))
       bcount += 1
-      if bcount == GC.Values[GC.EMAIL_BATCH_SIZE]:
-        executeBatch(dbatch)
+      if bcount == getBatchFlushSize(GC.Values[GC.EMAIL_BATCH_SIZE]):
+        checkGmailUserQuota(rateLimiter, quotaMethod, bcount)
+        executeBatch(dbatch, GC.Values[GC.EMAIL_BATCH_SIZE])
         dbatch = gmail.new_batch_http_request(callback=_callbackProcessMessage)
         bcount = 0
     if bcount > 0:
-      dbatch.execute()
+      checkGmailUserQuota(rateLimiter, quotaMethod, bcount)
+      executeBatch(dbatch, GC.Values[GC.EMAIL_BATCH_SIZE], final=True)
 
-  parameters = _initMessageThreadParameters(entityType, False, 1)
-  includeSpamTrash = False
-  function = {Act.DELETE: u'delete', Act.MODIFY: u'modify', Act.SPAM: u'spam', Act.TRASH: u'trash', Act.UNTRASH: u'untrash'}[Act.Get()]
-  labelNameMap = {}
-  addLabelNames = []
-  addLabelIds = []
-  removeLabelNames = []
-  removeLabelIds = []
-  while Cmd.ArgumentsRemaining():
-    myarg = getArgument()
-    if _getMessageSelectParameters(myarg, parameters):
-      pass
-    elif (function == u'modify') and (myarg == u'addlabel'):
-      addLabelNames.append(getString(Cmd.OB_LABEL_NAME))
-    elif (function == u'modify') and (myarg == u'removelabel'):
-      removeLabelNames.append(getString(Cmd.OB_LABEL_NAME))
-    else:
-      unknownArgumentExit()
-  _finalizeMessageSelectParameters(parameters, True)
-  includeSpamTrash = Act.Get() in [Act.DELETE, Act.MODIFY, Act.UNTRASH]
-  if function == u'spam':
-    function = u'modify'
-    addLabelIds = [u'SPAM',]
-    removeLabelIds = [u'INBOX',]
-  i, count, users = getEntityArgument(users)
-  for user in users:
-    i += 1
+  def _processUserMessagesThreads(task):
+    i, user = task
     user, gmail, messageIds = _validateUserGetMessageIds(user, i, count, parameters[u'messageEntity'])
     if not gmail:
-      continue
+      return
     service = [gmail.users().threads(), gmail.users().messages()][entityType == Ent.MESSAGE]
+    rateLimiter = getGmailUserRateLimiter()
+    userAddLabelIds = addLabelIds
+    userRemoveLabelIds = removeLabelIds
     try:
       if addLabelNames or removeLabelNames:
+        checkGmailUserQuota(rateLimiter, u'labels.list')
         userGmailLabels = _getUserGmailLabels(gmail, user, i, count, fields=u'labels(id,name,type)')
         if not userGmailLabels:
-          continue
+          return
         labelNameMap = _initLabelNameMap(userGmailLabels)
-        addLabelIds = _convertLabelNamesToIds(gmail, addLabelNames, labelNameMap, True)
-        removeLabelIds = _convertLabelNamesToIds(gmail, removeLabelNames, labelNameMap, False)
+        userAddLabelIds = _convertLabelNamesToIds(gmail, addLabelNames, labelNameMap, True)
+        userRemoveLabelIds = _convertLabelNamesToIds(gmail, removeLabelNames, labelNameMap, False)
       if parameters[u'messageEntity'] is None:
         printGettingAllEntityItemsForWhom(Ent.MESSAGE, user, i, count)
-        listResult = callGAPIpages(service, u'list', parameters[u'listType'],
-                                   page_message=getPageMessage(), maxItems=parameters[u'maxItems'],
-                                   throw_reasons=GAPI.GMAIL_THROW_REASONS,
-                                   userId=u'me', q=parameters[u'query'], fields=parameters[u'fields'], includeSpamTrash=includeSpamTrash,
-                                   maxResults=GC.Values[GC.MESSAGE_MAX_RESULTS])
-        messageIds = [message[u'id'] for message in listResult]
+        messageIds = _getUserMessageIds(gmail, parameters, includeSpamTrash, rateLimiter)
       else:
         # Need to get authorization set up for batch
+        checkGmailUserQuota(rateLimiter, u'getProfile')
         callGAPI(gmail.users(), u'getProfile',
                  throw_reasons=GAPI.GMAIL_THROW_REASONS,
                  userId=u'me', fields=u'')
@@ -34325,30 +36934,58 @@ def _processMessagesThreads(users, entityType):
       if jcount == 0:
         entityNumEntitiesActionNotPerformedWarning([Ent.USER, user], entityType, jcount, Msg.NO_ENTITIES_MATCHED.format(Ent.Plural(entityType)), i, count)
         setSysExitRC(NO_ENTITIES_FOUND)
-        continue
+        return
       if parameters[u'messageEntity'] is None:
         if parameters[u'maxToProcess'] and jcount > parameters[u'maxToProcess']:
           entityNumEntitiesActionNotPerformedWarning([Ent.USER, user], entityType, jcount, Msg.COUNT_N_EXCEEDS_MAX_TO_PROCESS_M.format(jcount, Act.ToPerform(), parameters[u'maxToProcess']), i, count)
-          continue
+          return
         if not parameters[u'doIt']:
           entityNumEntitiesActionNotPerformedWarning([Ent.USER, user], entityType, jcount, Msg.USE_DOIT_ARGUMENT_TO_PERFORM_ACTION, i, count)
-          continue
+          return
       entityPerformActionNumItems([Ent.USER, user], jcount, entityType, i, count)
       Ind.Increment()
       if function == u'delete' and entityType == Ent.MESSAGE:
-        _batchDeleteModifyMessages(gmail, u'batchDelete', user, jcount, messageIds, {u'ids': []})
+        _batchDeleteModifyMessages(gmail, u'batchDelete', user, jcount, messageIds, {u'ids': []}, rateLimiter)
       elif function == u'modify' and entityType == Ent.MESSAGE:
-        _batchDeleteModifyMessages(gmail, u'batchModify', user, jcount, messageIds, {u'ids': [], u'addLabelIds': addLabelIds, u'removeLabelIds': removeLabelIds})
+        _batchDeleteModifyMessages(gmail, u'batchModify', user, jcount, messageIds, {u'ids': [], u'addLabelIds': userAddLabelIds, u'removeLabelIds': userRemoveLabelIds}, rateLimiter)
       else:
-        if addLabelIds or removeLabelIds:
-          kwargs = {u'body': {u'addLabelIds': addLabelIds, u'removeLabelIds': removeLabelIds}}
+        if userAddLabelIds or userRemoveLabelIds:
+          kwargs = {u'body': {u'addLabelIds': userAddLabelIds, u'removeLabelIds': userRemoveLabelIds}}
         else:
           kwargs = {}
-        _batchProcessMessagesThreads(service, function, user, jcount, messageIds, **kwargs)
+        _batchProcessMessagesThreads(gmail, service, function, user, jcount, messageIds, rateLimiter, **kwargs)
       Ind.Decrement()
     except (GAPI.serviceNotAvailable, GAPI.badRequest):
       entityServiceNotApplicableWarning(Ent.USER, user, i, count)
 
+  parameters = _initMessageThreadParameters(entityType, False, 1)
+  includeSpamTrash = False
+  function = {Act.DELETE: u'delete', Act.MODIFY: u'modify', Act.SPAM: u'spam', Act.TRASH: u'trash', Act.UNTRASH: u'untrash'}[Act.Get()]
+  addLabelNames = []
+  addLabelIds = []
+  removeLabelNames = []
+  removeLabelIds = []
+  while Cmd.ArgumentsRemaining():
+    myarg = getArgument()
+    if _getMessageSelectParameters(myarg, parameters):
+      pass
+    elif (function == u'modify') and (myarg == u'addlabel'):
+      addLabelNames.append(getString(Cmd.OB_LABEL_NAME))
+    elif (function == u'modify') and (myarg == u'removelabel'):
+      removeLabelNames.append(getString(Cmd.OB_LABEL_NAME))
+    else:
+      unknownArgumentExit()
+  _finalizeMessageSelectParameters(parameters, True)
+  includeSpamTrash = Act.Get() in [Act.DELETE, Act.MODIFY, Act.UNTRASH]
+  if function == u'spam':
+    function = u'modify'
+    addLabelIds = [u'SPAM',]
+    removeLabelIds = [u'INBOX',]
+  i, count, users = getEntityArgument(users)
+# Users are processed concurrently, their output is in the order of the users
+  for _ in yieldThreadedCallsWithOutput(_processUserMessagesThreads, enumerate(users, i+1)):
+    pass
+
 # gam <UserTypeEntity> delete message|messages (((query <QueryGmail>) (matchlabel <LabelName>) [or|and])+ [quick|notquick] [doit] [max_to_delete <Number>])|(ids <MessageIDEntity>)
 # gam <UserTypeEntity> modify message|messages (((query <QueryGmail>) (matchlabel <LabelName>) [or|and])+ [quick|notquick] [doit] [max_to_modify <Number>])|(ids <MessageIDEntity>)
 #	(addlabel <LabelName>)* (removelabel <LabelName>)*
@@ -34717,7 +37354,7 @@ def printShowMessagesThreads(users, entityType):
                 attachmentName = mg.group(1)
               if (not attachmentNamePattern) or attachmentNamePattern.match(attachmentName):
                 try:
-                  result = callGAPI(gmail.users().messages().attachments(), u'get',
+                  result = callGAPI(userGmail.gmail.users().messages().attachments(), u'get',
                                     throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.NOT_FOUND],
                                     messageId=messageId, id=part[u'body'][u'attachmentId'], userId=u'me')
                   if u'data' in result:
@@ -34749,7 +37386,7 @@ def printShowMessagesThreads(users, entityType):
     if show_labels:
       messageLabels = []
       for labelId in result.get(u'labelIds', []):
-        for label in labels[u'labels']:
+        for label in userGmail.labels[u'labels']:
           if label[u'id'] == labelId:
             messageLabels.append(label[u'name'])
             break
@@ -34791,7 +37428,7 @@ def printShowMessagesThreads(users, entityType):
     if show_labels:
       messageLabels = []
       for labelId in result.get(u'labelIds', []):
-        for label in labels[u'labels']:
+        for label in userGmail.labels[u'labels']:
           if label[u'id'] == labelId:
             messageLabels.append(label[u'name'])
             break
@@ -34801,7 +37438,7 @@ def printShowMessagesThreads(users, entityType):
         row[u'Body'] = _getMessageBody(result[u'payload'])
       else:
         row[u'Body'] = escapeCRsNLs(_getMessageBody(result[u'payload']))
-    addRowTitlesToCSVfile(row, csvRows, titles)
+    userGmail.rows.append(row)
 
   def _showThread(result, j, jcount):
     printEntity([Ent.THREAD, result[u'id']], j, jcount)
@@ -34809,7 +37446,7 @@ def printShowMessagesThreads(users, entityType):
     if show_snippet and u'snippet' in result:
       printKeyValueList([u'Snippet', dehtml(result[u'snippet']).replace(u'\n', u' ')])
     try:
-      result = callGAPI(service, u'get',
+      result = callGAPI(userGmail.service, u'get',
                         throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.NOT_FOUND],
                         id=result[u'id'], userId=u'me', format=u'metadata')
       kcount = len(result[u'messages'])
@@ -34823,7 +37460,7 @@ def printShowMessagesThreads(users, entityType):
 
   def _printThread(user, result):
     try:
-      result = callGAPI(service, u'get',
+      result = callGAPI(userGmail.service, u'get',
                         throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.NOT_FOUND],
                         id=result[u'id'], userId=u'me', format=u'metadata')
       for message in result[u'messages']:
@@ -34844,9 +37481,9 @@ def printShowMessagesThreads(users, entityType):
         entityActionFailedWarning([Ent.USER, ri[RI_ENTITY], entityType, ri[RI_ITEM]], errMsg, int(ri[RI_J]), int(ri[RI_JCOUNT]))
       return
     try:
-      response = callGAPI(service, u'get',
+      response = callGAPI(userGmail.service, u'get',
                           throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.NOT_FOUND, GAPI.INVALID_MESSAGE_ID],
-                          userId=u'me', id=ri[RI_ITEM], format=[u'metadata', u'full'][show_body or show_attachments])
+                          userId=u'me', id=ri[RI_ITEM], format=messageFormat)
       if not csvFormat:
         if entityType == Ent.MESSAGE:
           _showMessage(response, int(ri[RI_J]), int(ri[RI_JCOUNT]))
@@ -34893,31 +37530,183 @@ def printShowMessagesThreads(users, entityType):
       _handleGmailError(exception, ri)
 
   def _batchPrintShowMessagesThreads(service, user, jcount, messageIds, callback):
-    svcargs = dict([(u'userId', u'me'), (u'id', None), (u'format', [u'metadata', u'full'][show_body or show_attachments])]+GM.Globals[GM.EXTRA_ARGS_LIST])
+    def _callbackCacheMessage(request_id, response, exception):
+      if exception is None:
+        messageCache[u'messages'][response[u'id']] = response
+      responses[request_id] = (response, exception)
+
+# Cached messages and fetched messages are passed to callback in the order of messageIds
+    def _executeBatch(dbatch, bcount, requests, final):
+      if bcount > 0:
+        checkGmailUserQuota(userGmail.rateLimiter, quotaMethod, bcount)
+        executeBatch(dbatch, GC.Values[GC.EMAIL_BATCH_SIZE], final=final)
+      for requestId, response in requests:
+        if response is not None:
+          callback(requestId, response, None)
+        else:
+          callback(requestId, *responses.pop(requestId))
+
+    svcargs = dict([(u'userId', u'me'), (u'id', None), (u'format', messageFormat)]+GM.Globals[GM.EXTRA_ARGS_LIST])
     method = getattr(service, u'get')
-    dbatch = gmail.new_batch_http_request(callback=callback)
+    quotaMethod = u'{0}.get'.format(parameters[u'listType'])
+    messageCache = userGmail.messageCache
+    batchCallback = callback if messageCache is None else _callbackCacheMessage
+    responses = {}
+    requests = []
+    dbatch = userGmail.gmail.new_batch_http_request(callback=batchCallback)
     bcount = 0
     j = 0
     for messageId in messageIds:
       j += 1
-      svcparms = svcargs.copy()
-      svcparms[u'id'] = messageId
-      dbatch.add(method(**svcparms), request_id=batchRequestID(user, 0, 0, j, jcount, svcparms[u'id']))
-      bcount += 1
+      requestId = batchRequestID(user, 0, 0, j, jcount, messageId)
+      response = messageCache[u'messages'].get(messageId) if messageCache is not None else None
+      if response is None:
+        svcparms = svcargs.copy()
+        svcparms[u'id'] = messageId
+        dbatch.add(method(**svcparms), request_id=requestId)
+        bcount += 1
+      if messageCache is not None:
+        requests.append((requestId, response))
       if parameters[u'maxToProcess'] and j == parameters[u'maxToProcess']:
         break
-      if bcount == GC.Values[GC.EMAIL_BATCH_SIZE]:
-        executeBatch(dbatch)
-        dbatch = gmail.new_batch_http_request(callback=callback)
+      if getBatchFlushSize(GC.Values[GC.EMAIL_BATCH_SIZE]) in [bcount, len(requests)]:
+        _executeBatch(dbatch, bcount, requests, False)
+        dbatch = userGmail.gmail.new_batch_http_request(callback=batchCallback)
         bcount = 0
-    if bcount > 0:
-      dbatch.execute()
+        requests = []
+    if bcount > 0 or requests:
+      _executeBatch(dbatch, bcount, requests, True)
+    return j
+
+# Messages are cached in <FilePath>/<User>.json; message IDs and contents don't change, the labels of the cached messages
+# are updated from the user's history since the previous run so that unchanged messages don't have to be fetched again.
+# Deleted messages are dropped from the cache; the files hold message bodies so they are only readable by the user
+  def _getUserMessageCache(user):
+    fileName = os.path.join(messageCacheFolder, u'{0}.json'.format(user))
+    data = readFile(fileName, continueOnError=True, displayError=False) if os.path.isfile(fileName) else None
+    try:
+      messageCache = json.loads(data) if data else {}
+      if not isinstance(messageCache, dict):
+        raise ValueError
+    except ValueError:
+      systemErrorExit(INVALID_JSON_RC, Msg.DOES_NOT_EXIST_OR_HAS_INVALID_FORMAT.format(Ent.Singular(Ent.FILE), fileName))
+    if messageCache.get(u'format') != messageFormat or not messageCache.get(u'historyId'):
+      messageCache = {u'format': messageFormat, u'historyId': None, u'messages': {}}
+    messages = messageCache[u'messages']
+    if messageCache[u'historyId']:
+      pageToken = None
+      try:
+        while True:
+          checkGmailUserQuota(userGmail.rateLimiter, u'history.list')
+          result = callGAPI(userGmail.gmail.users().history(), u'list',
+                            throw_reasons=GAPI.GMAIL_THROW_REASONS+[GAPI.NOT_FOUND],
+                            userId=u'me', startHistoryId=messageCache[u'historyId'], pageToken=pageToken, maxResults=500,
+                            fields=u'nextPageToken,historyId,history(messagesDeleted/message/id,labelsAdded(message/id,labelIds),labelsRemoved(message/id,labelIds))')
+          for history in result.get(u'history', []):
+            for item in history.get(u'messagesDeleted', []):
+              messages.pop(item[u'message'][u'id'], None)
+            for item in history.get(u'labelsAdded', []):
+              message = messages.get(item[u'message'][u'id'])
+              if message is not None:
+                labelIds = message.get(u'labelIds', [])
+                message[u'labelIds'] = labelIds+[labelId for labelId in item[u'labelIds'] if labelId not in labelIds]
+            for item in history.get(u'labelsRemoved', []):
+              message = messages.get(item[u'message'][u'id'])
+              if message is not None:
+                message[u'labelIds'] = [labelId for labelId in message.get(u'labelIds', []) if labelId not in item[u'labelIds']]
+          pageToken = result.get(u'nextPageToken')
+          if not pageToken:
+            messageCache[u'historyId'] = result[u'historyId']
+            return messageCache
+      except GAPI.notFound:
+        # The history has expired, the cached messages can't be revalidated
+        messages.clear()
+    checkGmailUserQuota(userGmail.rateLimiter, u'getProfile')
+    messageCache[u'historyId'] = callGAPI(userGmail.gmail.users(), u'getProfile',
+                                          throw_reasons=GAPI.GMAIL_THROW_REASONS,
+                                          userId=u'me', fields=u'historyId')[u'historyId']
+    return messageCache
+
+  def _saveUserMessageCache(user):
+    if userGmail.messageCache is not None:
+      writeFileAtomic(os.path.join(messageCacheFolder, u'{0}.json'.format(user)), json.dumps(userGmail.messageCache)+u'\n')
+
+# The IDs of the next page of the list are fetched while the messages/threads of the current page are fetched;
+# the total number of messages/threads isn't known while they are being printed so errors don't show counts
+  def _yieldPrefetchedMessageIds():
+    for pageIds in yieldPrefetched(_yieldUserMessageIdPages(ThreadGAPIObjects(userGmail.gmail), parameters, includeSpamTrash,
+                                                            userGmail.rateLimiter, getPageMessage())):
+      for messageId in pageIds:
+        yield messageId
+
+# Users are processed concurrently; the gmail service, labels and CSV rows for a user are local to its thread
+  def _printShowUserMessagesThreads(task):
+    i, user = task
+    userGmail.rows = []
+    userGmail.messageCache = None
+    user, userGmail.gmail, messageIds = _validateUserGetMessageIds(user, i, count, parameters[u'messageEntity'])
+    if not userGmail.gmail:
+      return userGmail.rows
+    userGmail.service = service = [userGmail.gmail.users().threads(), userGmail.gmail.users().messages()][entityType == Ent.MESSAGE]
+    userGmail.rateLimiter = getGmailUserRateLimiter()
+    try:
+      if show_labels:
+        checkGmailUserQuota(userGmail.rateLimiter, u'labels.list')
+        userGmail.labels = _getUserGmailLabels(userGmail.gmail, user, i, count, fields=u'labels(id,name)')
+        if not userGmail.labels:
+          return userGmail.rows
+      if messageCacheFolder and not countsOnly:
+        userGmail.messageCache = _getUserMessageCache(user)
+      if parameters[u'messageEntity'] is None:
+        printGettingAllEntityItemsForWhom(entityType, user, i, count)
+        if csvFormat and not countsOnly:
+          if _batchPrintShowMessagesThreads(service, user, 0, _yieldPrefetchedMessageIds(), [_callbackPrintThread, _callbackPrintMessage][entityType == Ent.MESSAGE]) == 0:
+            setSysExitRC(NO_ENTITIES_FOUND)
+          _saveUserMessageCache(user)
+          return userGmail.rows
+        messageIds = _getUserMessageIds(userGmail.gmail, parameters, includeSpamTrash, userGmail.rateLimiter)
+      else:
+        # Need to get authorization set up for batch
+        checkGmailUserQuota(userGmail.rateLimiter, u'getProfile')
+        callGAPI(userGmail.gmail.users(), u'getProfile',
+                 throw_reasons=GAPI.GMAIL_THROW_REASONS,
+                 userId=u'me', fields=u'')
+      jcount = len(messageIds)
+      if jcount == 0:
+        setSysExitRC(NO_ENTITIES_FOUND)
+      if countsOnly:
+        if not csvFormat:
+          printEntityKVList([Ent.USER, user], [parameters[u'listType'], jcount], i, count)
+        else:
+          userGmail.rows.append({u'User': user, parameters[u'listType']: jcount})
+        return userGmail.rows
+      if jcount == 0:
+        if not csvFormat:
+          entityNumEntitiesActionNotPerformedWarning([Ent.USER, user], entityType, jcount, Msg.NO_ENTITIES_MATCHED.format(Ent.Plural(entityType)), i, count)
+        return userGmail.rows
+      if not csvFormat:
+        if parameters[u'messageEntity'] is not None or parameters[u'maxToProcess'] == 0 or jcount <= parameters[u'maxToProcess']:
+          entityPerformActionNumItems([Ent.USER, user], jcount, entityType, i, count)
+        else:
+          entityPerformActionNumItemsModifier([Ent.USER, user], parameters[u'maxToProcess'], entityType, u'of {0} Total {1}'.format(jcount, Ent.Plural(entityType)), i, count)
+      if parameters[u'messageEntity'] is None and parameters[u'maxToProcess'] and (jcount > parameters[u'maxToProcess']):
+        jcount = parameters[u'maxToProcess']
+      if not csvFormat:
+        Ind.Increment()
+        _batchPrintShowMessagesThreads(service, user, jcount, messageIds, [_callbackShowThread, _callbackShowMessage][entityType == Ent.MESSAGE])
+        Ind.Decrement()
+      else:
+        _batchPrintShowMessagesThreads(service, user, jcount, messageIds, [_callbackPrintThread, _callbackPrintMessage][entityType == Ent.MESSAGE])
+      _saveUserMessageCache(user)
+    except (GAPI.serviceNotAvailable, GAPI.badRequest):
+      entityServiceNotApplicableWarning(Ent.USER, user, i, count)
+    return userGmail.rows
 
   parameters = _initMessageThreadParameters(entityType, True, 0)
   convertCRNL = GC.Values[GC.CSV_OUTPUT_CONVERT_CR_NL]
   delimiter = GC.Values[GC.CSV_OUTPUT_FIELD_DELIMITER]
   countsOnly = includeSpamTrash = show_all_headers = show_attachments = show_body = show_labels = show_size = show_snippet = False
-  attachmentNamePattern = None
+  attachmentNamePattern = messageCacheFolder = None
   defaultHeaders = [u'Date', u'Subject', u'From', u'Reply-To', u'To', u'Delivered-To', u'Content-Type', u'Message-ID']
   headersToShow = [header.lower() for header in defaultHeaders]
   csvFormat = Act.csvFormat()
@@ -34952,9 +37741,18 @@ def printShowMessagesThreads(users, entityType):
       delimiter = getCharacter()
     elif myarg == u'countsonly':
       countsOnly = True
+    elif entityType == Ent.MESSAGE and myarg == u'cache':
+      messageCacheFolder = os.path.expanduser(getString(Cmd.OB_FILE_PATH))
+      if not os.path.isdir(messageCacheFolder):
+        try:
+          os.makedirs(messageCacheFolder, 0o700)
+        except OSError as e:
+          if not os.path.isdir(messageCacheFolder):
+            systemErrorExit(FILE_ERROR_RC, e)
     else:
       unknownArgumentExit()
   _finalizeMessageSelectParameters(parameters, False)
+  messageFormat = [u'metadata', u'full'][show_body or show_attachments]
   if csvFormat:
     if countsOnly:
       sortTitles = [u'User', parameters[u'listType']]
@@ -34963,59 +37761,12 @@ def printShowMessagesThreads(users, entityType):
       sortTitles = [u'User', u'threadId', u'id']
       titles, csvRows = initializeTitlesCSVfile(sortTitles)
       sortTitles.extend(defaultHeaders)
+  userGmail = threading.local()
   i, count, users = getEntityArgument(users)
-  for user in users:
-    i += 1
-    user, gmail, messageIds = _validateUserGetMessageIds(user, i, count, parameters[u'messageEntity'])
-    if not gmail:
-      continue
-    service = [gmail.users().threads(), gmail.users().messages()][entityType == Ent.MESSAGE]
-    try:
-      if show_labels:
-        labels = _getUserGmailLabels(gmail, user, i, count, fields=u'labels(id,name)')
-        if not labels:
-          continue
-      if parameters[u'messageEntity'] is None:
-        printGettingAllEntityItemsForWhom(entityType, user, i, count)
-        listResult = callGAPIpages(service, u'list', parameters[u'listType'],
-                                   page_message=getPageMessage(), maxItems=parameters[u'maxItems'],
-                                   throw_reasons=GAPI.GMAIL_THROW_REASONS,
-                                   userId=u'me', q=parameters[u'query'], fields=parameters[u'fields'], includeSpamTrash=includeSpamTrash,
-                                   maxResults=GC.Values[GC.MESSAGE_MAX_RESULTS])
-        messageIds = [message[u'id'] for message in listResult]
-      else:
-        # Need to get authorization set up for batch
-        callGAPI(gmail.users(), u'getProfile',
-                 throw_reasons=GAPI.GMAIL_THROW_REASONS,
-                 userId=u'me', fields=u'')
-      jcount = len(messageIds)
-      if jcount == 0:
-        setSysExitRC(NO_ENTITIES_FOUND)
-      if countsOnly:
-        if not csvFormat:
-          printEntityKVList([Ent.USER, user], [parameters[u'listType'], jcount], i, count)
-        else:
-          csvRows.append({u'User': user, parameters[u'listType']: jcount})
-        continue
-      if jcount == 0:
-        if not csvFormat:
-          entityNumEntitiesActionNotPerformedWarning([Ent.USER, user], entityType, jcount, Msg.NO_ENTITIES_MATCHED.format(Ent.Plural(entityType)), i, count)
-        continue
-      if not csvFormat:
-        if parameters[u'messageEntity'] is not None or parameters[u'maxToProcess'] == 0 or jcount <= parameters[u'maxToProcess']:
-          entityPerformActionNumItems([Ent.USER, user], jcount, entityType, i, count)
-        else:
-          entityPerformActionNumItemsModifier([Ent.USER, user], parameters[u'maxToProcess'], entityType, u'of {0} Total {1}'.format(jcount, Ent.Plural(entityType)), i, count)
-      if parameters[u'messageEntity'] is None and parameters[u'maxToProcess'] and (jcount > parameters[u'maxToProcess']):
-        jcount = parameters[u'maxToProcess']
-      if not csvFormat:
-        Ind.Increment()
-        _batchPrintShowMessagesThreads(service, user, jcount, messageIds, [_callbackShowThread, _callbackShowMessage][entityType == Ent.MESSAGE])
-        Ind.Decrement()
-      else:
-        _batchPrintShowMessagesThreads(service, user, jcount, messageIds, [_callbackPrintThread, _callbackPrintMessage][entityType == Ent.MESSAGE])
-    except (GAPI.serviceNotAvailable, GAPI.badRequest):
-      entityServiceNotApplicableWarning(Ent.USER, user, i, count)
+  for _, rows in yieldThreadedCallsWithOutput(_printShowUserMessagesThreads, enumerate(users, i+1)):
+    if csvFormat:
+      for row in rows:
+        addRowTitlesToCSVfile(row, csvRows, titles)
   if csvFormat:
     if not countsOnly:
       removeTitlesFromCSVfile([u'Snippet', u'SizeEstimate', u'Labels', u'Body'], titles)
@@ -35031,8 +37782,10 @@ def printShowMessagesThreads(users, entityType):
 
 # gam <UserTypeEntity> print message|messages (((query <QueryGmail>) (matchlabel <LabelName>) [or|and])* [quick|notquick] [max_to_print <Number>] [includespamtrash])|(ids <MessageIDEntity>)
 #	[countsonly] [headers all|<SMTPHeaderList>] [showlabels] [showbody] [showsize] [showsnippet] [convertcrnl] [delimiter <Character>] [todrive <ToDriveAttributes>*]
+#	[cache <FilePath>]
 # gam <UserTypeEntity> show message|messages (((query <QueryGmail>) (matchlabel <LabelName>) [or|and])* [quick|notquick] [max_to_show <Number>] [includespamtrash])|(ids <MessageIDEntity>)
 #	[countsonly] [headers all|<SMTPHeaderList>] [showlabels] [showbody] [showsize] [showsnippet] [showattachments [attachmentnamepattern <RegularExpression>]]
+#	[cache <FilePath>]
 def printShowMessages(users):
   printShowMessagesThreads(users, Ent.MESSAGE)
 
@@ -36825,6 +39578,7 @@ MAIN_COMMANDS_WITH_OBJECTS = {
       Cmd.ARG_GAL:		doPrintShowGAL,
       Cmd.ARG_GROUPMEMBERS:	doPrintGroupMembers,
       Cmd.ARG_GROUP:		doPrintGroups,
+      Cmd.ARG_GROUPGRAPH:	doPrintGroupGraph,
       Cmd.ARG_GUARDIAN: 	doPrintShowGuardians,
       Cmd.ARG_LICENSE:		doPrintLicenses,
       Cmd.ARG_MOBILE:		doPrintMobileDevices,
@@ -36895,6 +39649,7 @@ MAIN_COMMANDS_WITH_OBJECTS = {
       Cmd.ARG_DOMAIN:		doUpdateDomain,
       Cmd.ARG_FEATURE:		doUpdateFeature,
       Cmd.ARG_GROUP:		doUpdateGroups,
+      Cmd.ARG_GROUPGRAPH:	doUpdateGroupGraph,
       Cmd.ARG_MOBILE:		doUpdateMobileDevices,
       Cmd.ARG_NOTIFICATION:	doUpdateNotification,
       Cmd.ARG_ORG:		doUpdateOrg,
@@ -37570,7 +40325,7 @@ def adjustRedirectedSTDFilesIfNotMultiprocessing():
         rdMultiFd.close()
         GM.Globals[stdtype][GM.REDIRECT_MULTI_FD] = rdFd
         if (stdtype == GM.STDOUT) and (GM.Globals.get(GM.SAVED_STDOUT) is not None):
-          sys.stdout = rdFd
+          setSysStdout(rdFd)
       except IOError as e:
         systemErrorExit(FILE_ERROR_RC, e)
 
@@ -37587,7 +40342,7 @@ def closeSTDFilesIfNotMultiprocessing():
     if rdFd and rdMultiFd and (rdFd == rdMultiFd) and (rdFd != stdfile):
       rdFd.close()
 
-  closeSTDFile(GM.STDOUT, sys.stdout)
+  closeSTDFile(GM.STDOUT, getSysStdout())
   if GM.Globals[GM.STDERR].get(GM.REDIRECT_NAME) != u'stdout':
     closeSTDFile(GM.STDERR, sys.stderr)
 
@@ -37642,8 +40397,12 @@ def ProcessGAMCommand(args, processGamCfg=True):
       if (CL_command != u'list') and (GC.Values[GC.AUTO_BATCH_MIN] > 0):
         _, count, entityList = getEntityArgument(entityList)
         if count > GC.Values[GC.AUTO_BATCH_MIN]:
-          doAutoBatch(Cmd.ENTITY_USER, entityList, CL_command)
-          sys.exit(GM.Globals[GM.SYSEXITRC])
+# Auto batch starts gam batch processes, this is not done for a command running in a thread of gam tbatch
+          if not isMainThread():
+            stderrWarningMsg(Msg.AUTO_BATCH_NOT_PERFORMED_IN_THREAD.format(count, Ent.Choose(Ent.USER, count)))
+          else:
+            doAutoBatch(Cmd.ENTITY_USER, entityList, CL_command)
+            sys.exit(GM.Globals[GM.SYSEXITRC])
       adjustRedirectedSTDFilesIfNotMultiprocessing()
       if CL_command in USER_COMMANDS:
         Act.Set(USER_COMMANDS[CL_command][CMD_ACTION])
@@ -37658,8 +40417,12 @@ def ProcessGAMCommand(args, processGamCfg=True):
       if (CL_command != u'list') and (GC.Values[GC.AUTO_BATCH_MIN] > 0):
         _, count, entityList = getEntityArgument(entityList)
         if count > GC.Values[GC.AUTO_BATCH_MIN]:
-          doAutoBatch(Cmd.ENTITY_CROS, entityList, CL_command)
-          sys.exit(GM.Globals[GM.SYSEXITRC])
+# Auto batch starts gam batch processes, this is not done for a command running in a thread of gam tbatch
+          if not isMainThread():
+            stderrWarningMsg(Msg.AUTO_BATCH_NOT_PERFORMED_IN_THREAD.format(count, Ent.Choose(Ent.CROS_DEVICE, count)))
+          else:
+            doAutoBatch(Cmd.ENTITY_CROS, entityList, CL_command)
+            sys.exit(GM.Globals[GM.SYSEXITRC])
       adjustRedirectedSTDFilesIfNotMultiprocessing()
       if CL_command in CROS_COMMANDS:
         Act.Set(CROS_COMMANDS[CL_command][CMD_ACTION])
@@ -37694,9 +40457,10 @@ def ProcessGAMCommand(args, processGamCfg=True):
     setSysExitRC(UNKNOWN_ERROR_RC)
     showAPICallsRetryData()
     adjustRedirectedSTDFilesIfNotMultiprocessing()
+  completeDirectoryCacheInvalidation()
   if processGamCfg:
     if GM.Globals.get(GM.SAVED_STDOUT) is not None:
-      sys.stdout = GM.Globals[GM.SAVED_STDOUT]
+      setSysStdout(GM.Globals[GM.SAVED_STDOUT])
     closeSTDFilesIfNotMultiprocessing()
   return GM.Globals[GM.SYSEXITRC]
 
@@ -37722,7 +40486,8 @@ def doLoop():
   GAM_argv, subFields = getSubFields([Cmd.GAM_CMD,], csvFile.fieldnames)
   multi = GM.Globals[GM.CSVFILE][GM.REDIRECT_MULTIPROCESS]
   if multi:
-    mpQueue, mpQueueHandler = initializeCSVFileQueueHandler(None)
+    mpQueue = multiprocessing.Queue()
+    mpQueueHandler = initializeCSVFileQueueHandler(mpQueue, None, GM.Globals, GC.Values)
   else:
     mpQueue = None
   GM.Globals[GM.CSVFILE][GM.REDIRECT_QUEUE] = mpQueue
@@ -388,6 +388,9 @@ def getVersion(api):
     api = DRIVE
   return (api, version, u'{0}-{1}'.format(api, version), cred_family)
 
+def getAPIversionList():
+  return sorted(set([getVersion(api)[2] for api in _INFO]))
+
 def getClientScopesSet(api):
   return set([scope[u'scope'] for scope in OAUTH2_SCOPES if scope[u'api'] == api])
 
@@ -30,9 +30,14 @@ NEVER = u'Never'
 
 FN_CACERTS_PEM = u'cacerts.pem'
 FN_CLIENT_SECRETS_JSON = u'client_secrets.json'
+FN_DIRECTORY_CACHE_JSON = u'directorycache.json'
+FN_DRIVE_PATH_CACHE_JSON = u'drivepathcache.json'
 FN_EXTRA_ARGS_TXT = u'extra-args.txt'
+FN_GROUP_GRAPH_CACHE_JSON = u'groupgraphcache.json'
 FN_OAUTH2SERVICE_JSON = u'oauth2service.json'
 FN_OAUTH2_TXT = u'oauth2.txt'
+FN_OAUTH2SERVICE_TOKENS = u'oauth2service.tokens'
+FN_USER_MAP_CACHE_JSON = u'usermapcache.json'
 
 # Global variables defined in gam.cfg
 
@@ -45,7 +50,10 @@ API_CALLS_RATE_CHECK = u'api_calls_rate_check'
 API_CALLS_RATE_LIMIT = u'api_calls_rate_limit'
 # Automatically generate gam batch command if number of users specified in gam users xxx command exceeds this number
 # Default: 0, don't automatically generate gam batch commands
+# Not applied to commands run by gam tbatch as they run in threads of the gam tbatch process
 AUTO_BATCH_MIN = u'auto_batch_min'
+# gam batch/csv: how many commands should be sent to a process at a time
+BATCH_CHUNK_SIZE = u'batch_chunk_size'
 # When processing items in batches, how many should be processed in each batch
 BATCH_SIZE = u'batch_size'
 # Location of cacerts.pem for API calls
@@ -86,12 +94,20 @@ CUSTOMER_ID = u'customer_id'
 DEBUG_LEVEL = u'debug_level'
 # When retrieving lists of ChromeOS/Mobile devices from API, how many should be retrieved in each chunk
 DEVICE_MAX_RESULTS = u'device_max_results'
+# Minutes that the snapshot of users and CrOS devices saved in a file next to oauth2.txt is used to resolve entities; 0 means not used
+DIRECTORY_CACHE_MINUTES = u'directory_cache_minutes'
 # Domain obtained from gam.cfg or oauth2.txt
 DOMAIN = u'domain'
+# Size in megabytes of the byte ranges in which large files are downloaded
+DOWNLOAD_CHUNK_SIZE = u'download_chunk_size'
 # Google Drive download directory
 DRIVE_DIR = u'drive_dir'
 # When retrieving lists of Drive files/folders from API, how many should be retrieved in each chunk
 DRIVE_MAX_RESULTS = u'drive_max_results'
+# Save the names and parents of shared drive folders in a file next to oauth2.txt for reuse by subsequent commands
+DRIVE_PATH_CACHE = u'drive_path_cache'
+# Minutes after it is created that the saved shared drive folder names and parents are used by subsequent commands
+DRIVE_PATH_CACHE_MINUTES = u'drive_path_cache_minutes'
 # Use Drive V3 ntive names
 DRIVE_V3_NATIVE_NAMES = u'drive_v3_native_names'
 # When processing email messages in batches, how many should be processed in each batch
@@ -100,8 +116,18 @@ EMAIL_BATCH_SIZE = u'email_batch_size'
 EVENT_MAX_RESULTS = u'event_max_results'
 # Path to extra_args.txt
 EXTRA_ARGS = u'extra_args'
+# Gmail API quota units per second used for each user; 0 disables pacing
+GMAIL_USER_QUOTA = u'gmail_user_quota'
+# Save the group membership graph in a file next to oauth2.txt; minutes before the graph is refreshed, 0 disables use of the graph
+GROUP_GRAPH_CACHE_MINUTES = u'group_graph_cache_minutes'
+# Number of persistent HTTP objects per process for service account API calls; 0 disables pooling
+HTTP_POOL_SIZE = u'http_pool_size'
 # When processing items in batches, how many seconds should GAM wait between batches
 INTER_BATCH_WAIT = u'inter_batch_wait'
+# Number of users at which the licenses are listed once rather than getting the licenses of each user; 0 disables listing
+LICENSE_MAP_THRESHOLD = u'license_map_threshold'
+# When retrieving lists of licenses from API, how many should be retrieved in each chunk
+LICENSE_MAX_RESULTS = u'license_max_results'
 # When retrieving lists of Google Group members from API, how many should be retrieved in each chunk
 MEMBER_MAX_RESULTS = u'member_max_results'
 # When deleting or modifying Gmail messages, how many should be processed in each batch
@@ -119,6 +145,12 @@ NO_CACHE = u'no_cache'
 NO_UPDATE_CHECK = u'no_update_check'
 # Disable SSL certificate validation
 NO_VERIFY_SSL = u'no_verify_ssl'
+# Number of threads for commands that make API calls concurrently
+NUM_API_THREADS = u'num_api_threads'
+# Number of parts of a batch request to send concurrently
+NUM_BATCH_THREADS = u'num_batch_threads'
+# Number of byte ranges of files to download concurrently
+NUM_DOWNLOAD_THREADS = u'num_download_threads'
 # Number of threads for gam tbatch
 NUM_TBATCH_THREADS = u'num_tbatch_threads'
 # Number of threads for gam batch/csv
@@ -143,6 +175,8 @@ SHOW_GETTINGS = u'show_gettings'
 SHOW_GETTINGS_GOT_NL = u'show_gettings_got_nl'
 # Enable/disable showing multiprocess info in redirected stdout/stderr
 SHOW_MULTIPROCESS_INFO = u'show_multiprocess_info'
+# Save service account access tokens in a directory next to oauth2.txt for reuse by subsequent commands
+SVCACCT_TOKEN_CACHE = u'svcacct_token_cache'
 # Time Zone
 TIMEZONE = u'timezone'
 # Enable conversion to Google Sheets when uploading todrive files
@@ -161,12 +195,17 @@ TODRIVE_TIMESTAMP = u'todrive_timestamp'
 TODRIVE_USER = u'todrive_user'
 # When retrieving lists of Users from API, how many should be retrieved in each chunk
 USER_MAX_RESULTS = u'user_max_results'
+# Minutes that the user ID/email address map saved in a file next to oauth2.txt is used by subsequent commands; 0 means not saved
+USER_MAP_CACHE_MINUTES = u'user_map_cache_minutes'
+# Number of user ID/email address lookups after which the IDs/email addresses of all users are gotten with users.list; 0 means never
+USER_MAP_PREFETCH_THRESHOLD = u'user_map_prefetch_threshold'
 
 Defaults = {
   ACTIVITY_MAX_RESULTS: u'100',
   API_CALLS_RATE_CHECK: FALSE,
   API_CALLS_RATE_LIMIT: u'100',
   AUTO_BATCH_MIN: u'0',
+  BATCH_CHUNK_SIZE: u'1',
   BATCH_SIZE: u'50',
   CACERTS_PEM: u'',
   CACHE_DIR: u'',
@@ -187,14 +226,23 @@ Defaults = {
   CUSTOMER_ID: MY_CUSTOMER,
   DEBUG_LEVEL: u'0',
   DEVICE_MAX_RESULTS: u'500',
+  DIRECTORY_CACHE_MINUTES: u'0',
   DOMAIN: u'',
+  DOWNLOAD_CHUNK_SIZE: u'32',
   DRIVE_DIR: u'',
   DRIVE_MAX_RESULTS: u'1000',
+  DRIVE_PATH_CACHE: FALSE,
+  DRIVE_PATH_CACHE_MINUTES: u'60',
   DRIVE_V3_NATIVE_NAMES: TRUE,
   EMAIL_BATCH_SIZE: u'50',
   EVENT_MAX_RESULTS: u'250',
   EXTRA_ARGS: u'',
+  GMAIL_USER_QUOTA: u'250',
+  GROUP_GRAPH_CACHE_MINUTES: u'0',
+  HTTP_POOL_SIZE: u'4',
   INTER_BATCH_WAIT: u'0',
+  LICENSE_MAP_THRESHOLD: u'100',
+  LICENSE_MAX_RESULTS: u'1000',
   MEMBER_MAX_RESULTS: u'200',
   MESSAGE_BATCH_SIZE: u'50',
   MESSAGE_MAX_RESULTS: u'500',
@@ -203,6 +251,9 @@ Defaults = {
   NO_CACHE: FALSE,
   NO_UPDATE_CHECK: TRUE,
   NO_VERIFY_SSL: FALSE,
+  NUM_API_THREADS: u'4',
+  NUM_BATCH_THREADS: u'4',
+  NUM_DOWNLOAD_THREADS: u'4',
   NUM_TBATCH_THREADS: u'2',
   NUM_THREADS: u'5',
   OAUTH2_TXT: FN_OAUTH2_TXT,
@@ -215,6 +266,7 @@ Defaults = {
   SHOW_GETTINGS: TRUE,
   SHOW_GETTINGS_GOT_NL: FALSE,
   SHOW_MULTIPROCESS_INFO: FALSE,
+  SVCACCT_TOKEN_CACHE: FALSE,
   TIMEZONE: u'utc',
   TODRIVE_CONVERSION: TRUE,
   TODRIVE_NOBROWSER: u'',
@@ -224,6 +276,8 @@ Defaults = {
   TODRIVE_TIMESTAMP: FALSE,
   TODRIVE_USER: u'',
   USER_MAX_RESULTS: u'500',
+  USER_MAP_CACHE_MINUTES: u'0',
+  USER_MAP_PREFETCH_THRESHOLD: u'0',
   }
 
 Values = {DEBUG_LEVEL: 0}
@@ -255,6 +309,7 @@ VAR_INFO = {
   API_CALLS_RATE_CHECK: {VAR_TYPE: TYPE_BOOLEAN},
   API_CALLS_RATE_LIMIT: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (50, None)},
   AUTO_BATCH_MIN: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_AUTOBATCH', VAR_LIMITS: (0, 100)},
+  BATCH_CHUNK_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 100)},
   BATCH_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_BATCH_SIZE', VAR_LIMITS: (1, 1000)},
   CACERTS_PEM: {VAR_TYPE: TYPE_FILE, VAR_ACCESS: os.R_OK},
   CACHE_DIR: {VAR_TYPE: TYPE_DIRECTORY, VAR_ENVVAR: u'GAMCACHEDIR'},
@@ -275,14 +330,23 @@ VAR_INFO = {
   CUSTOMER_ID: {VAR_TYPE: TYPE_STRING, VAR_ENVVAR: u'CUSTOMER_ID', VAR_LIMITS: (0, None)},
   DEBUG_LEVEL: {VAR_TYPE: TYPE_INTEGER, VAR_SIGFILE: u'debug.gam', VAR_LIMITS: (0, None), VAR_SFFT: (u'0', u'4')},
   DEVICE_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_DEVICE_MAX_RESULTS', VAR_LIMITS: (1, 1000)},
+  DIRECTORY_CACHE_MINUTES: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, 1440)},
   DOMAIN: {VAR_TYPE: TYPE_STRING, VAR_ENVVAR: u'GA_DOMAIN', VAR_LIMITS: (0, None)},
+  DOWNLOAD_CHUNK_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 1024)},
   DRIVE_DIR: {VAR_TYPE: TYPE_DIRECTORY, VAR_ENVVAR: u'GAMDRIVEDIR'},
   DRIVE_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_DRIVE_MAX_RESULTS', VAR_LIMITS: (1, 1000)},
+  DRIVE_PATH_CACHE: {VAR_TYPE: TYPE_BOOLEAN},
+  DRIVE_PATH_CACHE_MINUTES: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 1440)},
   DRIVE_V3_NATIVE_NAMES: {VAR_TYPE: TYPE_BOOLEAN},
   EMAIL_BATCH_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 100)},
   EVENT_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 2500)},
   EXTRA_ARGS: {VAR_TYPE: TYPE_FILE, VAR_SIGFILE: FN_EXTRA_ARGS_TXT, VAR_SFFT: (u'', FN_EXTRA_ARGS_TXT), VAR_ACCESS: os.R_OK},
+  GMAIL_USER_QUOTA: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, 10000)},
+  GROUP_GRAPH_CACHE_MINUTES: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, 10080)},
+  HTTP_POOL_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, 100)},
   INTER_BATCH_WAIT: {VAR_TYPE: TYPE_FLOAT, VAR_LIMITS: (0.0, 60.0)},
+  LICENSE_MAP_THRESHOLD: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, None)},
+  LICENSE_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (10, 1000)},
   MEMBER_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 10000)},
   MESSAGE_BATCH_SIZE: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 1000)},
   MESSAGE_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 10000)},
@@ -291,6 +355,9 @@ VAR_INFO = {
   NO_CACHE: {VAR_TYPE: TYPE_BOOLEAN, VAR_SIGFILE: u'nocache.txt', VAR_SFFT: (FALSE, TRUE)},
   NO_UPDATE_CHECK: {VAR_TYPE: TYPE_BOOLEAN, VAR_SIGFILE: u'noupdatecheck.txt', VAR_SFFT: (FALSE, TRUE)},
   NO_VERIFY_SSL: {VAR_TYPE: TYPE_BOOLEAN, VAR_SIGFILE: u'noverifyssl.txt', VAR_SFFT: (FALSE, TRUE)},
+  NUM_API_THREADS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 100)},
+  NUM_BATCH_THREADS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 16)},
+  NUM_DOWNLOAD_THREADS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 32)},
   NUM_TBATCH_THREADS: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (1, 100)},
   NUM_THREADS: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_THREADS', VAR_LIMITS: (1, 100)},
   OAUTH2_TXT: {VAR_TYPE: TYPE_FILE, VAR_ENVVAR: u'OAUTHFILE', VAR_ACCESS: os.R_OK | os.W_OK},
@@ -303,6 +370,7 @@ VAR_INFO = {
   SHOW_GETTINGS: {VAR_TYPE: TYPE_BOOLEAN},
   SHOW_GETTINGS_GOT_NL: {VAR_TYPE: TYPE_BOOLEAN},
   SHOW_MULTIPROCESS_INFO: {VAR_TYPE: TYPE_BOOLEAN},
+  SVCACCT_TOKEN_CACHE: {VAR_TYPE: TYPE_BOOLEAN},
   TIMEZONE: {VAR_TYPE: TYPE_TIMEZONE},
   TODRIVE_CONVERSION: {VAR_TYPE: TYPE_BOOLEAN},
   TODRIVE_NOBROWSER: {VAR_TYPE: TYPE_BOOLEAN, VAR_SIGFILE: u'nobrowser.txt', VAR_SFFT: (FALSE, TRUE)},
@@ -312,4 +380,6 @@ VAR_INFO = {
   TODRIVE_TIMESTAMP: {VAR_TYPE: TYPE_BOOLEAN},
   TODRIVE_USER: {VAR_TYPE: TYPE_STRING, VAR_LIMITS: (0, None)},
   USER_MAX_RESULTS: {VAR_TYPE: TYPE_INTEGER, VAR_ENVVAR: u'GAM_USER_MAX_RESULTS', VAR_LIMITS: (1, 500)},
+  USER_MAP_CACHE_MINUTES: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, 1440)},
+  USER_MAP_PREFETCH_THRESHOLD: {VAR_TYPE: TYPE_INTEGER, VAR_LIMITS: (0, None)},
   }
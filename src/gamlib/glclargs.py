@@ -346,6 +346,7 @@ class GamCLArgs(object):
   ARG_GMAILPROFILE = u'gmailprofile'
   ARG_GPLUSPROFILE = u'gplusprofile'
   ARG_GROUP = u'group'
+  ARG_GROUPGRAPH = u'groupgraph'
   ARG_GROUPS = u'groups'
   ARG_GROUPMEMBERS = u'groupmembers'
   ARG_GROUPSMEMBERS = u'groupsmembers'
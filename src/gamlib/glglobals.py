@@ -75,6 +75,8 @@ REDIRECT_COLUMN_DELIMITER = u'rddl'
 REDIRECT_QUOTE_CHAR = u'rdqc'
 REDIRECT_WRITE_HEADER = u'rdwh'
 REDIRECT_MULTIPROCESS = u'rdmp'
+REDIRECT_STREAMING = u'rdsm'
+REDIRECT_STREAMING_COLUMNS = u'rdsc'
 REDIRECT_QUEUE = u'rdqu'
 REDIRECT_QUEUE_NAME = u'name'
 REDIRECT_QUEUE_TODRIVE = u'todrive'
@@ -110,6 +112,16 @@ MAP_ROLE_ID_TO_NAME = u'ri2n'
 MAP_ROLE_NAME_TO_ID = u'rn2i'
 # Dictionary mapping User ID to Name
 MAP_USER_ID_TO_NAME = u'ui2n'
+# Dictionary mapping User primary email address/alias to ID
+MAP_USER_NAME_TO_ID = u'un2i'
+# Number of user ID/email address lookups and whether the maps hold all of the users; shared by the threads of gam tbatch
+USER_MAP_STATE = u'umst'
+# Names and parents of shared drive folders, shared by the users of a command; None until first used
+MAP_DRIVE_FOLDER_ID_TO_INFO = u'df2i'
+# Group membership graph, None until first used
+GROUP_MEMBERSHIP_GRAPH = u'gmgr'
+# The command has invalidated the directory snapshot, invalidate it again when the command completes
+DIRECTORY_CACHE_INVALIDATED = u'dcin'
 # oauth2.txt.lock lockfile
 OAUTH2_TXT_LOCK = u'oalk'
 # GAM cache directory. If no_cache is True, this variable will be set to None
@@ -128,9 +140,9 @@ TBATCH_QUEUE = u'batq'
 DATETIME_NOW = u'dtno'
 # Convert to local time
 CONVERT_TO_LOCAL_TIME = u'ctlt'
-# Check API calls rate
-RATE_CHECK_COUNT = u'rccn'
-RATE_CHECK_START = u'rcst'
+# Directory of service account access tokens; persistent, from gam.cfg svcacct_token_cache, or temporary, for the processes of gam batch/csv
+SVCACCT_TOKEN_DIR = u'satd'
+SVCACCT_TOKEN_BATCH_DIR = u'satb'
 # Number/length of API call retries
 API_CALLS_RETRY_DATA = u'rtry'
 #
@@ -170,6 +182,11 @@ Globals = {
   MAP_ROLE_ID_TO_NAME: {},
   MAP_ROLE_NAME_TO_ID: {},
   MAP_USER_ID_TO_NAME: {},
+  MAP_USER_NAME_TO_ID: {},
+  USER_MAP_STATE: {u'lookups': 0, u'loaded': False, u'prefetched': False, u'complete': False},
+  MAP_DRIVE_FOLDER_ID_TO_INFO: None,
+  GROUP_MEMBERSHIP_GRAPH: None,
+  DIRECTORY_CACHE_INVALIDATED: False,
   OAUTH2_TXT_LOCK: None,
   CACHE_DIR: None,
   CACHE_DISCOVERY_ONLY: True,
@@ -179,7 +196,7 @@ Globals = {
   TBATCH_QUEUE: None,
   DATETIME_NOW: None,
   CONVERT_TO_LOCAL_TIME: False,
-  RATE_CHECK_COUNT: 0,
-  RATE_CHECK_START: 0,
+  SVCACCT_TOKEN_DIR: None,
+  SVCACCT_TOKEN_BATCH_DIR: None,
   API_CALLS_RETRY_DATA: {}
   }
@@ -36,6 +36,12 @@ class GamIndent(object):
   def Decrement(self):
     self.indent -= 1
 
+  def GetLevel(self):
+    return self.indent
+
+  def SetLevel(self, indent):
+    self.indent = indent
+
   def Spaces(self):
     return self.INDENT_SPACES_PER_LEVEL*self.indent
 
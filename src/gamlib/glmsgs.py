@@ -25,6 +25,7 @@ ACCESS_FORBIDDEN = u'Access Forbidden'
 ACTION_APPLIED = u'Action Applied'
 ADMIN_STATUS_CHANGED_TO = u'Admin Status Changed to'
 ALL = u'All'
+ALREADY_COPIED = u'Already copied'
 ALREADY_EXISTS_USE_MERGE_ARGUMENT = u'Already exists; use the "merge" argument to merge the labels'
 API_ACCESS_DENIED = u'API access Denied'
 API_CHECK_CLIENT_AUTHORIZATION = u'Please make sure the Client ID: {0} is authorized for the appropriate scopes:\n{1}\n\nRun: gam oauth info\n'
@@ -33,6 +34,7 @@ API_ERROR_SETTINGS = u'API error, some settings not set'
 API_CALLS_RETRY_DATA = u'API calls retry data\n'
 ARE_MUTUALLY_EXCLUSIVE = u'arguments {0} and {1} are mutually exclusive'
 AS = u'as'
+AUTO_BATCH_NOT_PERFORMED_IN_THREAD = u'auto_batch_min is not applied to commands run in a thread by gam tbatch; the {0} {1} are processed by this command'
 BAD_ENTITIES_IN_SOURCE = u'{0} {1} {2} in source marked >>> <<< above'
 BAD_REQUEST = u'Bad Request'
 BATCH = u'Batch'
@@ -53,6 +55,8 @@ DOES_NOT_EXIST = u'Does not exist'
 DOES_NOT_EXIST_OR_HAS_INVALID_FORMAT = u'{0}: {1}, Does not exist or has invalid format'
 DOMAIN_NOT_FOUND_IN_DNS = u'Domain not found in DNS!'
 DOMAIN_NOT_VERIFIED_SECONDARY = u'Domain is not a verified secondary domain'
+DOWNLOAD_MD5_CHECKSUM_MISMATCH = u'MD5 checksum {0} does not match {1}'
+DOWNLOAD_RANGE_SIZE_MISMATCH = u'Bytes {0}-{1}: received {2} bytes'
 DO_NOT_EXIST = u'Do not exist'
 DUPLICATE = u'Duplicate'
 DUPLICATE_ALREADY_A_ROLE = u'Duplicate, already a {0}'
@@ -193,15 +197,17 @@ SERVICE_NOT_APPLICABLE = u'Service not applicable/Does not exist'
 SKU_PRODUCT_MISMATCH = u'Product {0} of old SKU does not match product {1} of new SKU'
 STARTING_THREAD = u'Starting thread'
 STATISTICS_COPY_FOLDER = u'Total: {0}, Copied: {1}, Duplicate: {2}, Merged: {3}, Copy Failed: {4}, Not writable: {5}, Permissions Failed: {6}'
-STATISTICS_COPY_FILE = u'Total: {0}, Copied: {1}, Duplicate: {2}, Copy Failed: {3}, Not copyable: {4}, Permissions Failed: {5}'
+STATISTICS_COPY_FILE = u'Total: {0}, Copied: {1}, Duplicate: {2}, Copy Failed: {3}, Not copyable: {4}, Permissions Failed: {5}, Already copied: {6}'
 STATISTICS_MOVE_FOLDER = u'Total: {0}, Moved: {1}, Duplicate: {2}, Merged: {3}, Move Failed: {4}, Not writable: {5}'
 STATISTICS_MOVE_FILE = u'Total: {0}, Moved: {1}, Duplicate: {2}, Move Failed: {3}, Not movable: {4}'
+STREAMING_COLUMNS_ROWS_NOT_POST_PROCESSED = u'redirect csv streaming columns: rows have already been written, sorting/post-processing skipped'
 STRING_LENGTH = u'string length'
 SUBKEY_FIELD_MISMATCH = u'subkeyfield {0} does not match saved subkeyfield {1}'
 SUBSCRIPTION_NOT_FOUND = u'Could not find subscription'
 THREAD = u'thread'
 THREADS = u'threads'
 TO = u'To'
+TODRIVE_NOT_SUPPORTED_WITH_STREAMING_COLUMNS = u'todrive is not supported with redirect csv streaming columns'
 TOTAL_ITEMS_IN_ENTITY = u'Total {0} in {1}'
 UNABLE_TO_GET_PERMISSION_ID = u'Unable to get Permission ID for <{0}>'
 UNAVAILABLE = u'Unavailable'
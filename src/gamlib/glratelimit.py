@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 Ross Scroggs All Rights Reserved.
+#
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""GAM API calls rate limiting
+
+A token bucket per API; the buckets can be shared by the processes of gam batch/csv.
+"""
+
+import multiprocessing
+import threading
+import time
+
+class GamRateLimiter(object):
+
+# Quota period, seconds
+  PERIOD = 100.0
+# Bucket capacity, seconds of refill
+  BURST = 10.0
+# When a rate limit is exceeded, the refill rate is multiplied by DECREASE
+  DECREASE = 0.75
+# Refill rate never drops below MINIMUM*limit/PERIOD
+  MINIMUM = 0.1
+# Fraction of the configured refill rate recovered per second
+  RECOVERY = 0.01
+# Bucket fields
+  TOKENS = 0
+  TIMESTAMP = 1
+  RATE = 2
+  NUM_FIELDS = 3
+# Bucket for APIs not in keys
+  OTHER = u'other'
+
+  def __init__(self):
+    self.limit = 0
+    self.keys = {}
+    self.buckets = None
+    self.sharedBuckets = None
+    self.lock = None
+    self.shared = False
+
+  def _initBucket(self, slot, now):
+    base = self.limit/self.PERIOD
+    self.buckets[slot+self.TOKENS] = base*self.BURST
+    self.buckets[slot+self.TIMESTAMP] = now
+    self.buckets[slot+self.RATE] = base
+
+# keys: list of API names, e.g. admin-directory_v1, gmail-v1
+  def Initialize(self, keys, limit):
+    self.limit = float(limit)
+    if self.shared:
+      return
+    self.keys = {}
+    for key in sorted(set(keys+[self.OTHER])):
+      self.keys[key] = len(self.keys)*self.NUM_FIELDS
+    self.buckets = [0.0]*(len(self.keys)*self.NUM_FIELDS)
+    self.lock = threading.Lock()
+    now = time.time()
+    for slot in self.keys.values():
+      self._initBucket(slot, now)
+
+# Move buckets to shared memory so that they can be inherited by multiprocessing.Pool processes
+  def Share(self):
+    if self.shared or self.buckets is None:
+      return
+    self.sharedBuckets = multiprocessing.Array('d', self.buckets)
+    self.buckets = self.sharedBuckets.get_obj()
+    self.lock = self.sharedBuckets.get_lock()
+    self.shared = True
+
+# Called in each multiprocessing.Pool process with the values from Share
+  def Attach(self, keys, limit, sharedBuckets):
+    self.keys = keys
+    self.limit = float(limit)
+    self.sharedBuckets = sharedBuckets
+    self.buckets = sharedBuckets.get_obj()
+    self.lock = sharedBuckets.get_lock()
+    self.shared = True
+
+  def SharedState(self):
+    return (self.keys, self.limit, self.sharedBuckets)
+
+  def _getSlot(self, key):
+    slot = self.keys.get(key)
+    if slot is None:
+      slot = self.keys[self.OTHER]
+    return slot
+
+  def _refill(self, slot, now):
+    base = self.limit/self.PERIOD
+    elapsed = max(now-self.buckets[slot+self.TIMESTAMP], 0.0)
+    rate = min(self.buckets[slot+self.RATE]+base*self.RECOVERY*elapsed, base)
+    self.buckets[slot+self.RATE] = rate
+    self.buckets[slot+self.TOKENS] = min(self.buckets[slot+self.TOKENS]+rate*elapsed, base*self.BURST)
+    self.buckets[slot+self.TIMESTAMP] = now
+    return rate
+
+# Take tokens from the bucket for key; return the number of seconds to wait before making the call(s)
+# A token is reserved even if it is not yet available so waiting callers are served in order
+  def Acquire(self, key, count=1):
+    if self.buckets is None:
+      return 0.0
+    slot = self._getSlot(key)
+    with self.lock:
+      rate = self._refill(slot, time.time())
+      self.buckets[slot+self.TOKENS] -= count
+      tokens = self.buckets[slot+self.TOKENS]
+    if tokens >= 0.0:
+      return 0.0
+    return -tokens/rate
+
+# Google reported that a rate limit/quota was exceeded for key; slow down
+  def Penalize(self, key):
+    if self.buckets is None:
+      return
+    slot = self._getSlot(key)
+    base = self.limit/self.PERIOD
+    with self.lock:
+      self._refill(slot, time.time())
+      self.buckets[slot+self.RATE] = max(self.buckets[slot+self.RATE]*self.DECREASE, base*self.MINIMUM)
+      self.buckets[slot+self.TOKENS] = min(self.buckets[slot+self.TOKENS], 0.0)
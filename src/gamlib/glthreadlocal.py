@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2019 Ross Scroggs All Rights Reserved.
+#
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""GAM per thread state
+
+Used by gam tbatch to give each thread its own GM.Globals, GC.Values, Cmd, Act, Ent and Ind.
+Threads that haven't set a value see the default value, i.e., the value of the main thread.
+"""
+
+import threading
+
+class GamThreadLocal(object):
+
+  def __init__(self, default):
+    object.__setattr__(self, u'_default', default)
+    object.__setattr__(self, u'_local', threading.local())
+
+  def __getattr__(self, name):
+    return getattr(GetThreadValue(self), name)
+
+  def __setattr__(self, name, value):
+    setattr(GetThreadValue(self), name, value)
+
+class GamThreadLocalDict(GamThreadLocal):
+
+  def __getitem__(self, key):
+    return GetThreadValue(self)[key]
+
+  def __setitem__(self, key, value):
+    GetThreadValue(self)[key] = value
+
+  def __delitem__(self, key):
+    del GetThreadValue(self)[key]
+
+  def __contains__(self, key):
+    return key in GetThreadValue(self)
+
+  def __iter__(self):
+    return iter(GetThreadValue(self))
+
+  def __len__(self):
+    return len(GetThreadValue(self))
+
+def GetThreadValue(threadLocal):
+  return getattr(object.__getattribute__(threadLocal, u'_local'), u'value', object.__getattribute__(threadLocal, u'_default'))
+
+def SetThreadValue(threadLocal, value):
+  object.__getattribute__(threadLocal, u'_local').value = value
+
+def GetDefaultValue(threadLocal):
+  return object.__getattribute__(threadLocal, u'_default')